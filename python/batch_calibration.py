@@ -0,0 +1,210 @@
+"""
+Per-machine batch size calibration.
+
+Times the DINOv3 feature extractor at increasing batch sizes for an input
+resolution, within a memory budget, and keeps the size with the best
+throughput. Results are stored in ~/.ml4sg-care/machine_profile.json, keyed by
+backbone, device, precision, autocast dtype and resolution. Measure once per
+machine with `python main.py calibrate`; jobs only read the profile, unless
+AUTO_CALIBRATE_BATCH_SIZE makes an uncalibrated job measure first:
+
+    {"batch_sizes": {"dinov3_vith16plus/cpu:16t/fp32/bfloat16/224x224":
+        {"batch_size": 16, "images_per_second": 9.8, "measured": "2025-01-01T12:00:00"}}}
+
+Calibration always times eager execution; compiled modes use the same size.
+
+Usage:
+    batch_size = batch_calibration.get_batch_size(device, (224, 224), default=4)
+
+    # Re-measure and save, e.g. after a hardware or driver change
+    python main.py calibrate [device] [precision]
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import torch
+
+import execution_plan
+import mixed_precision
+import model_registry
+from config.config import AUTO_CALIBRATE_BATCH_SIZE
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROFILE_PATH = os.path.join(Path.home(), ".ml4sg-care", "machine_profile.json")
+BACKBONE = 'dinov3_vith16plus'
+CANDIDATE_BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128)
+# Stop growing the batch once a single batch takes this long.
+MAX_SECONDS_PER_BATCH = 30
+# A bigger batch must beat the current best by this factor to be preferred.
+MIN_IMPROVEMENT = 1.02
+EMBED_DIM = 1280
+NUM_HEADS = 20
+PATCH_SIZE = 16
+
+
+def estimate_bytes_per_image(input_size) -> int:
+    """Rough peak activation memory of one image through the backbone (fp32, no grad)."""
+    tokens = (input_size[0] // PATCH_SIZE) * (input_size[1] // PATCH_SIZE) + 5  # CLS + 4 registers
+    return tokens * EMBED_DIM * 4 * 16 + tokens * tokens * NUM_HEADS * 4 * 2
+
+
+def memory_budget(device: torch.device) -> int:
+    """Bytes calibration may use for activations on device."""
+    if device.type == 'cuda':
+        free, _ = torch.cuda.mem_get_info(device)
+        return int(free * 0.8)
+    if psutil:
+        return int(psutil.virtual_memory().available * 0.5)
+    return 4 * 2**30
+
+
+def device_id(device: torch.device) -> str:
+    if device.type == 'cuda':
+        return f"cuda:{torch.cuda.get_device_name(device)}"
+    if device.type == 'cpu':
+        # The optimum depends on how many threads share the work.
+        return f"cpu:{torch.get_num_threads()}t"
+    return device.type
+
+
+def profile_key(device, input_size, precision, gpu_fp16) -> str:
+    dtype = mixed_precision.autocast_dtype(device, gpu_fp16, precision)
+    dtype_name = str(dtype).replace("torch.", "") if dtype else "fp32"
+    return f"{BACKBONE}/{device_id(device)}/{precision}/{dtype_name}/{input_size[0]}x{input_size[1]}"
+
+
+def load_profile():
+    try:
+        with open(PROFILE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_profile(profile):
+    os.makedirs(os.path.dirname(PROFILE_PATH), exist_ok=True)
+    with open(PROFILE_PATH + ".tmp", "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(PROFILE_PATH + ".tmp", PROFILE_PATH)
+
+
+def _synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    elif device.type == 'mps':
+        torch.mps.synchronize()
+
+
+def calibrate(device, input_size, precision='fp32', gpu_fp16=True):
+    """
+    Find the throughput-optimal batch size for the backbone at input_size.
+
+    Batch sizes are tried in increasing order until one would exceed the
+    memory budget, runs out of memory, takes longer than
+    MAX_SECONDS_PER_BATCH, or is clearly slower than the best so far.
+
+    Returns:
+        Tuple of (batch size, images per second).
+    """
+    device = torch.device(device)
+    extractor = model_registry.get_feature_extractor(BACKBONE, device, precision=precision)
+    budget = memory_budget(device)
+    best_batch_size, best_throughput = 1, 0.0
+
+    for batch_size in CANDIDATE_BATCH_SIZES:
+        if batch_size > 1 and batch_size * estimate_bytes_per_image(input_size) > budget:
+            break
+        images = torch.randn(batch_size, 3, input_size[0], input_size[1], device=device)
+        try:
+            with torch.no_grad(), mixed_precision.inference_autocast(device, gpu_fp16, precision):
+                extractor(images)  # warm-up
+                _synchronize(device)
+                start_time = time.perf_counter()
+                extractor(images)
+                _synchronize(device)
+                elapsed = time.perf_counter() - start_time
+        except RuntimeError as e:
+            # Includes torch.cuda.OutOfMemoryError.
+            print(f"CALIBRATE: batch {batch_size} failed, stopping: {e}", flush=True)
+            if device.type == 'cuda':
+                torch.cuda.empty_cache()
+            break
+        finally:
+            del images
+
+        throughput = batch_size / elapsed
+        print(f"CALIBRATE: {input_size[0]}x{input_size[1]} batch {batch_size}: {throughput:.2f} images/s",
+              flush=True)
+        if throughput > best_throughput * MIN_IMPROVEMENT:
+            best_batch_size, best_throughput = batch_size, throughput
+        elif throughput < best_throughput * 0.9:
+            break
+        if elapsed > MAX_SECONDS_PER_BATCH:
+            break
+
+    return best_batch_size, best_throughput
+
+
+def calibrate_and_save(device, input_size, precision='fp32', gpu_fp16=True) -> int:
+    """Calibrate and record the result in the machine profile. Returns the batch size."""
+    device = torch.device(device)
+    batch_size, throughput = calibrate(device, input_size, precision, gpu_fp16)
+    profile = load_profile()
+    profile.setdefault("batch_sizes", {})[profile_key(device, input_size, precision, gpu_fp16)] = {
+        "batch_size": batch_size,
+        "images_per_second": round(throughput, 3),
+        "measured": datetime.now().isoformat(timespec="seconds"),
+    }
+    save_profile(profile)
+    print(f"Calibrated batch size {batch_size} for {input_size[0]}x{input_size[1]} on {device} "
+          f"({throughput:.2f} images/s)", flush=True)
+    return batch_size
+
+
+def get_batch_size(device, input_size, precision='fp32', gpu_fp16=True, default=4) -> int:
+    """
+    Batch size for the backbone on this machine.
+
+    Uses the machine profile; when it has no entry, calibrates first if
+    AUTO_CALIBRATE_BATCH_SIZE is set, otherwise returns default.
+    """
+    device = torch.device(device)
+    entry = load_profile().get("batch_sizes", {}).get(profile_key(device, input_size, precision, gpu_fp16))
+    if entry:
+        return int(entry["batch_size"])
+    if not AUTO_CALIBRATE_BATCH_SIZE:
+        return default
+    print(f"No calibrated batch size for {input_size[0]}x{input_size[1]} on {device}, calibrating...", flush=True)
+    try:
+        return calibrate_and_save(device, input_size, precision, gpu_fp16)
+    except Exception as e:
+        print(f"Warning: batch size calibration failed, using {default}: {e}", flush=True)
+        return default
+
+
+def run(device=None, precision='fp32'):
+    """Re-measure the detection (224px) and ReID (256px) batch sizes."""
+    import detection_dino
+    from config import cfg
+    from reid_v2 import load_reid_config
+
+    print("STATUS: BEGIN", flush=True)
+    device = torch.device(device) if device else detection_dino.select_device()
+    precision = model_registry.resolve_precision(precision, device)
+    # Same thread settings as the pipelines, which the profile key depends on.
+    execution_plan.apply(execution_plan.plan_for('detection_dino', device))
+    load_reid_config()
+    # Detection runs fp32 on GPUs, ReID under fp16 autocast.
+    calibrate_and_save(device, (224, 224), precision, gpu_fp16=False)
+    print("PROCESS: 1/2", flush=True)
+    calibrate_and_save(device, tuple(cfg.INPUT.SIZE), precision, gpu_fp16=True)
+    print("PROCESS: 2/2", flush=True)
+    print("STATUS: DONE", flush=True)
@@ -0,0 +1,65 @@
+"""
+Backbone throughput benchmark.
+
+Times the DINOv3 CLS feature extractor in each requested execution mode at
+the detection (224px) and ReID (256px) input sizes, and reports throughput
+relative to the first mode listed (normally 'eager').
+
+Usage:
+    python main.py benchmark [executions] [batch_size] [iterations] [device]
+
+    python main.py benchmark eager,compile,export,onnx 4 10 cpu
+"""
+
+import time
+
+import torch
+
+import model_registry
+
+INPUT_SIZES = ((224, 224), (256, 256))
+
+
+def time_extractor(extractor, images, iterations):
+    """
+    Returns:
+        Tuple of (first call seconds, images per second over the timed iterations).
+        The first call includes any compilation or artifact loading.
+    """
+    with torch.no_grad():
+        start_time = time.perf_counter()
+        extractor(images)
+        first_call = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            extractor(images)
+        if images.device.type == 'cuda':
+            torch.cuda.synchronize()
+        elapsed = time.perf_counter() - start_time
+    return first_call, images.shape[0] * iterations / elapsed
+
+
+def run(executions='eager,compile', batch_size=4, iterations=10, device='cpu'):
+    print("STATUS: BEGIN", flush=True)
+    executions = [e.strip() for e in executions.split(',') if e.strip()]
+    batch_size = int(batch_size)
+    iterations = int(iterations)
+    device = torch.device(device)
+
+    total = len(INPUT_SIZES) * len(executions)
+    done = 0
+    for input_size in INPUT_SIZES:
+        images = torch.randn(batch_size, 3, *input_size, device=device)
+        baseline = None
+        for execution in executions:
+            extractor = model_registry.get_feature_extractor(
+                'dinov3_vith16plus', device, execution=execution, input_size=input_size, batch_size=batch_size
+            )
+            first_call, throughput = time_extractor(extractor, images, iterations)
+            baseline = baseline or throughput
+            print(f"BENCHMARK: {input_size[0]}x{input_size[1]} {execution}: {throughput:.2f} images/s "
+                  f"({throughput / baseline:.2f}x), first call {first_call:.2f} seconds", flush=True)
+            done += 1
+            print(f"PROCESS: {done}/{total}", flush=True)
+    print("STATUS: DONE", flush=True)
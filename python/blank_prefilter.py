@@ -0,0 +1,123 @@
+"""
+Background-difference blank prefilter ahead of detection.
+
+Most camera trap images are blanks triggered by wind or sun. This stage
+groups images into sequences per folder and camera (see capture_info in
+burst_dedup.py), ordered by capture time and split where consecutive frames
+are more than BLANK_SEQUENCE_GAP_SECONDS apart. Each frame is decoded as a
+small grayscale thumbnail (the JPEG at 1/8 scale), normalized by its mean
+brightness, and compared to the sequence's background: the per-pixel median
+of its first BLANK_MIN_HISTORY frames, then updated with an exponential
+moving average (weight BLANK_EMA_ALPHA) of the blanks found. A frame where at
+most BLANK_CHANGE_FRACTION of the pixels differ from the background by more
+than BLANK_PIXEL_DELTA is a probable blank; MegaDetector is skipped for it
+and it is written out as a blank result.
+
+The filter is conservative: the first BLANK_MIN_HISTORY frames of a sequence
+are never skipped, an animal in a minority of them is voted out by the
+median, frames with foreground are not blended into the background, and a
+frame that differs almost everywhere (day/night switch, moved camera)
+restarts the sequence instead of counting as a blank.
+
+Usage:
+    blanks = set(find_probable_blanks(image_paths))
+    image_paths = [path for path in image_paths if path not in blanks]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+import PIL.Image
+
+from burst_dedup import capture_info
+from config.config import (BLANK_CHANGE_FRACTION, BLANK_EMA_ALPHA, BLANK_MIN_HISTORY, BLANK_PIXEL_DELTA,
+                           BLANK_SEQUENCE_GAP_SECONDS)
+from crop_loader import prefetch_map
+
+THUMBNAIL_SIZE = (96, 72)
+# A frame differing from the background over more than this fraction is a
+# new scene (lighting switch, camera moved), not foreground.
+SCENE_CHANGE_FRACTION = 0.5
+
+
+def thumbnail(image_path: str) -> np.ndarray:
+    """Brightness-normalized grayscale thumbnail, float32 of shape (72, 96)."""
+    with PIL.Image.open(image_path) as image:
+        image.draft('L', (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+        pixels = np.asarray(image.convert('L').resize(THUMBNAIL_SIZE, PIL.Image.BILINEAR), dtype=np.float32)
+    return pixels / max(float(pixels.mean()), 1.0)
+
+
+def _capture_info(image_path):
+    try:
+        return capture_info(image_path)
+    except Exception as e:
+        print(f"Warning: Could not read {image_path}: {e}", flush=True)
+        return None
+
+
+def _thumbnail(item):
+    path, source, timestamp = item
+    try:
+        return path, source, timestamp, thumbnail(path)
+    except Exception as e:
+        print(f"Warning: Could not decode {path}: {e}", flush=True)
+        return path, source, timestamp, None
+
+
+def find_probable_blanks(image_paths: List[str], pixel_delta: float = BLANK_PIXEL_DELTA,
+                         change_fraction: float = BLANK_CHANGE_FRACTION,
+                         gap_seconds: float = BLANK_SEQUENCE_GAP_SECONDS,
+                         min_history: int = BLANK_MIN_HISTORY, alpha: float = BLANK_EMA_ALPHA,
+                         workers: int = 4) -> List[str]:
+    """
+    Find images without significant change against their sequence's background.
+
+    Args:
+        image_paths: Images to check.
+        pixel_delta: Minimum difference of a normalized pixel to count as changed.
+        change_fraction: Maximum fraction of changed pixels of a probable blank.
+        gap_seconds: Time between frames that starts a new sequence.
+        min_history: Frames of a sequence seen before any can be a blank.
+        alpha: Weight of a blank frame in the background average.
+        workers: Threads reading headers and thumbnails.
+
+    Returns:
+        The probable blanks, in input order. Images that can't be read are
+        never blanks.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="blank_prefilter") as executor:
+        infos = list(executor.map(_capture_info, image_paths))
+    sequence_order = sorted(((path, info[0], info[1]) for path, info in zip(image_paths, infos) if info),
+                            key=lambda item: (item[1], item[2], item[0]))
+
+    blanks = set()
+    source = last_timestamp = background = None
+    history = 0
+    warmup = []  # First frames of the sequence; the background is their median
+    # Thumbnails are decoded ahead in sequence order, with few held at a time.
+    for path, frame_source, timestamp, frame in prefetch_map(_thumbnail, sequence_order, workers, workers * 4):
+        if frame is None:
+            continue
+        new_sequence = frame_source != source or timestamp - last_timestamp > gap_seconds
+        source, last_timestamp = frame_source, timestamp
+        if new_sequence:
+            background, warmup, history = frame, [frame], 1
+            continue
+
+        changed = float(np.mean(np.abs(frame - background) > pixel_delta))
+        if changed > SCENE_CHANGE_FRACTION:
+            background, warmup, history = frame, [frame], 1
+        elif history < min_history:
+            # Still learning the background; the median keeps out foreground
+            # that isn't in most of the warm-up frames.
+            warmup.append(frame)
+            history += 1
+            background = np.median(warmup, axis=0)
+            if history == min_history:
+                warmup = []
+        elif changed <= change_fraction:
+            blanks.add(path)
+            background = (1 - alpha) * background + alpha * frame
+    return [path for path in image_paths if path in blanks]
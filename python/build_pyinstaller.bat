@@ -31,6 +31,18 @@ if not exist "%SCRIPT_DIR%dinov3" (
     exit /b 1
 )
 
+:: Memory-mapped weights from `python main.py convert_weights` are optional.
+set "EXTRA_DATA="
+if exist "%SCRIPT_DIR%models\mmap" (
+    set "EXTRA_DATA=--add-data models\mmap;models\mmap"
+)
+
+:: Cascade backbones and heads (see `python main.py train_cascade_head`) are optional.
+for %%W in (dinov3_vits16_pretrain_lvd1689m-08c60483.pth dino_binary_classifier_vits16.pt ^
+        dinov3_vitb16_pretrain_lvd1689m-73cec8be.pth dino_binary_classifier_vitb16.pt) do (
+    if exist "%SCRIPT_DIR%models\%%W" call set "EXTRA_DATA=%%EXTRA_DATA%% --add-data models\%%W;models"
+)
+
 :: Don't use Conda; it's multiprocessing implementation is broken.
 where conda >nul 2>&1
 if not errorlevel 1 (
@@ -50,6 +62,21 @@ pyinstaller ^
     --add-data models\dino_species_classifier.pt;models ^
     --add-data models\dinov3_vith16plus_pretrain_lvd1689m-7c1da9a5.pth;models ^
     --add-data dinov3;dinov3 ^
+    %EXTRA_DATA% ^
+    --hidden-import detection_dino ^
+    --hidden-import reid_dino_adapter ^
+    --hidden-import reid_v2 ^
+    --hidden-import inference_server ^
+    --hidden-import weight_store ^
+    --hidden-import benchmark ^
+    --hidden-import validate_precision ^
+    --hidden-import validate_resolution ^
+    --hidden-import train_cascade_head ^
+    --hidden-import onnx_backend ^
+    --hidden-import batch_calibration ^
+    --hidden-import image_metadata ^
+    --hidden-import burst_dedup ^
+    --hidden-import blank_prefilter ^
     main.py
 
 endlocal
\ No newline at end of file
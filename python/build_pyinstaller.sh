@@ -29,6 +29,20 @@ if [ ! -d "${SCRIPT_DIR}/dinov3" ]; then
     exit 1
 fi
 
+# Memory-mapped weights from `python main.py convert_weights` are optional.
+extra_data=()
+if [ -d "${SCRIPT_DIR}/models/mmap" ]; then
+    extra_data+=(--add-data models/mmap:models/mmap)
+fi
+
+# Cascade backbones and heads (see `python main.py train_cascade_head`) are optional.
+for weights in dinov3_vits16_pretrain_lvd1689m-08c60483.pth dino_binary_classifier_vits16.pt \
+        dinov3_vitb16_pretrain_lvd1689m-73cec8be.pth dino_binary_classifier_vitb16.pt; do
+    if [ -f "${SCRIPT_DIR}/models/${weights}" ]; then
+        extra_data+=(--add-data "models/${weights}:models")
+    fi
+done
+
 # Don't use Conda; it's multiprocessing impelementation is broken.
 conda info &> /dev/null && (echo "DO NOT REDISTRIBUTE CONDA PYTHON" ; exit 1)
 
@@ -43,4 +57,19 @@ pyinstaller \
     --add-data dinov3:dinov3 \
     --add-data models/DinoAdapter_Stoat_day_night_mixed_precision.pth.tar25:models \
     --add-data models/dinoadapter_inference.yaml:models \
+    "${extra_data[@]}" \
+    --hidden-import detection_dino \
+    --hidden-import reid_dino_adapter \
+    --hidden-import reid_v2 \
+    --hidden-import inference_server \
+    --hidden-import weight_store \
+    --hidden-import benchmark \
+    --hidden-import validate_precision \
+    --hidden-import validate_resolution \
+    --hidden-import train_cascade_head \
+    --hidden-import onnx_backend \
+    --hidden-import batch_calibration \
+    --hidden-import image_metadata \
+    --hidden-import burst_dedup \
+    --hidden-import blank_prefilter \
     main.py
@@ -0,0 +1,110 @@
+"""
+Burst deduplication ahead of detection.
+
+Camera traps fire bursts of nearly identical frames. This stage computes a
+difference hash (dHash) of each image from a tiny thumbnail (the JPEG is
+decoded at 1/8 scale), and groups consecutive images from the same folder
+and camera, taken within BURST_WINDOW_SECONDS of each other, whose hash is
+within BURST_HASH_THRESHOLD bits of the first image of the group. Only that
+first image (the representative) goes through MegaDetector and DINOv3; the
+other members get a copy of its results, marked with 'duplicate_of'.
+
+Usage:
+    bursts = group_bursts(image_paths)     # representative -> [members]
+    representatives = list(bursts)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+import PIL.Image
+
+from config.config import BURST_HASH_THRESHOLD, BURST_WINDOW_SECONDS
+from db_utils import read_image_meta
+
+HASH_SIZE = 8  # 64-bit hash
+
+
+def dhash(image_path: str, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a (hash_size + 1) x hash_size thumbnail."""
+    with PIL.Image.open(image_path) as image:
+        # Decode at the smallest DCT scale; only a 9 x 8 thumbnail is needed.
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        pixels = np.asarray(image.convert('L').resize((hash_size + 1, hash_size), PIL.Image.BILINEAR),
+                            dtype=np.int16)
+    # Row by row, most significant bit first; packbits pads the last byte with zeros.
+    bits = (pixels[:, :-1] > pixels[:, 1:]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big') >> (-len(bits) % 8)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def capture_info(image_path: str):
+    """
+    (source, timestamp) of an image from its header: source is (folder,
+    (camera make, model, serial)), timestamp is EXIF DateTimeOriginal in
+    seconds, falling back to the file mtime. Missing camera tags are '', so
+    sources of images with and without EXIF still sort.
+    """
+    meta = read_image_meta(image_path)
+    timestamp = meta['file_mtime']
+    if meta['datetime_original']:
+        try:
+            timestamp = datetime.strptime(meta['datetime_original'], "%Y:%m:%d %H:%M:%S").timestamp()
+        except ValueError:
+            pass
+    camera = tuple(meta[key] or '' for key in ('camera_make', 'camera_model', 'camera_serial'))
+    return (os.path.dirname(image_path), camera), timestamp
+
+
+def _signature(image_path):
+    """(path, (folder, camera), capture timestamp, hash), or None if the image can't be read."""
+    try:
+        source, timestamp = capture_info(image_path)
+        return image_path, source, timestamp, dhash(image_path)
+    except Exception as e:
+        print(f"Warning: Could not hash {image_path}: {e}", flush=True)
+        return None
+
+
+def group_bursts(image_paths: List[str], threshold: int = BURST_HASH_THRESHOLD,
+                 window_seconds: float = BURST_WINDOW_SECONDS, workers: int = 4) -> Dict[str, List[str]]:
+    """
+    Group near-duplicate images.
+
+    Args:
+        image_paths: Images to group.
+        threshold: Maximum Hamming distance (of 64 bits) to the group's representative.
+        window_seconds: Maximum time between consecutive frames of a group.
+        workers: Threads reading headers and thumbnails.
+
+    Returns:
+        Dict of representative path -> other member paths, in input order of
+        the representatives. Every input image is either a key or a member;
+        images that can't be hashed are their own representative.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="burst_dedup") as executor:
+        signatures = list(executor.map(_signature, image_paths))
+
+    members_of = {}
+    representative = None  # (source key, hash, path) of the open group
+    last_timestamp = None
+    for signature in sorted((s for s in signatures if s), key=lambda s: (s[1], s[2], s[0])):
+        path, source, timestamp, image_hash = signature
+        if (representative is not None and source == representative[0]
+                and timestamp - last_timestamp <= window_seconds
+                and hamming(image_hash, representative[1]) <= threshold):
+            members_of[representative[2]].append(path)
+        else:
+            representative = (source, image_hash, path)
+            members_of[path] = []
+        last_timestamp = timestamp
+
+    # Keep the caller's order, and pass unreadable images through on their own.
+    unreadable = {path for path, signature in zip(image_paths, signatures) if signature is None}
+    return {path: members_of.get(path, []) for path in image_paths if path in members_of or path in unreadable}
@@ -0,0 +1,183 @@
+"""
+Compiled execution modes for the DINOv3 feature extractor.
+
+Both detection (224px crops) and ReID (256px crops) only need the CLS token of
+the last block, so that is the graph worth compiling. Modes:
+
+    eager    plain PyTorch (default)
+    compile  torch.compile (inductor); inductor's FX graph cache is kept under
+             ~/.ml4sg-care/compile_cache so later runs skip most of the work
+    export   torch.export + AOTInductor package with the weights frozen in,
+             one artifact per (torch version, model hash, precision, device,
+             input resolution, batch size) under ~/.ml4sg-care/compile_cache
+    onnx     ONNX Runtime on CPU (see onnx_backend), one export per (torch
+             version, model hash, input resolution) with a dynamic batch axis
+
+Any failure to compile, load or run a compiled artifact falls back to eager
+execution with a warning rather than failing the job.
+
+The classifier heads are deliberately left out and always run eagerly. They
+are applied in a separate step to rows of the FeatureStore, which also holds
+features read back from the embedding cache, so they cannot be part of the
+backbone graph, which must emit the features the cache stores. On their own
+they are one fused [1280 -> 26] matmul per batch (see FusedClassifier in
+detection_dino.py): there is nothing for inductor to win, and an exported
+artifact per batch size would cost more to load than it saves.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+EXECUTION_MODES = ('eager', 'compile', 'export', 'onnx')
+CACHE_DIR = os.path.join(Path.home(), ".ml4sg-care", "compile_cache")
+
+
+class ClsTokenExtractor(nn.Module):
+    """Backbone -> CLS token of the last block, i.e. create_linear_input(..., 1, False)."""
+
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+
+    def forward(self, images):
+        x_tokens_list = self.backbone.get_intermediate_layers(images, n=1, return_class_token=True)
+        return torch.cat([class_token for _, class_token in x_tokens_list], dim=-1)
+
+
+class EagerFallback(nn.Module):
+    """Runs a compiled callable, switching to the eager module for good on the first failure."""
+
+    def __init__(self, compiled, eager, label):
+        super().__init__()
+        self.eager = eager
+        self.label = label
+        self._compiled = compiled
+
+    def forward(self, images):
+        if self._compiled is not None:
+            try:
+                return self._compiled(images)
+            except Exception as e:
+                print(f"Warning: {self.label} failed, falling back to eager execution: {e}", flush=True)
+                self._compiled = None
+        return self.eager(images)
+
+
+class FixedShapeRunner:
+    """
+    Adapts an artifact compiled for one input shape to arbitrary batch sizes.
+
+    Batches are split into chunks of the compiled batch size; the last chunk is
+    zero-padded and its padding rows dropped from the output.
+    """
+
+    def __init__(self, runner, input_shape):
+        self.runner = runner
+        self.input_shape = tuple(input_shape)
+
+    def __call__(self, images):
+        batch_size = self.input_shape[0]
+        if tuple(images.shape[1:]) != self.input_shape[1:]:
+            raise ValueError(f"compiled for input {self.input_shape[1:]}, got {tuple(images.shape[1:])}")
+        outputs = []
+        for start in range(0, images.shape[0], batch_size):
+            chunk = images[start:start + batch_size]
+            padding = batch_size - chunk.shape[0]
+            if padding:
+                chunk = torch.cat([chunk, chunk.new_zeros((padding,) + tuple(chunk.shape[1:]))])
+            output = self.runner(chunk)
+            if isinstance(output, (list, tuple)):
+                output = output[0]
+            outputs.append(output[:batch_size - padding])
+        return torch.cat(outputs)
+
+
+def model_hash(name: str, weights_path: str, precision: str) -> str:
+    """
+    Cheap identity of a backbone's weights: name, file name and size.
+
+    Hashing gigabytes of weights on every start would cost more than it saves.
+    """
+    size = os.path.getsize(weights_path) if os.path.exists(weights_path) else 0
+    key = f"{name}:{os.path.basename(weights_path)}:{size}:{precision}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+def artifact_path(name: str, weights_hash: str, precision: str, device: torch.device,
+                  input_size: Tuple[int, int], batch_size: Optional[int], suffix: str = ".pt2") -> str:
+    torch_version = torch.__version__.replace("+", "_")
+    filename = (f"{name}-{weights_hash}-{precision}-{device.type}-torch{torch_version}"
+                f"-{input_size[0]}x{input_size[1]}")
+    if batch_size is not None:
+        filename += f"-b{batch_size}"
+    return os.path.join(CACHE_DIR, filename + suffix)
+
+
+def compile_extractor(extractor: nn.Module) -> nn.Module:
+    """torch.compile the extractor with inductor's on-disk FX graph cache enabled."""
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(CACHE_DIR, "inductor"))
+    import torch._inductor.config as inductor_config
+    inductor_config.fx_graph_cache = True
+    # Static shapes: one graph per (batch size, resolution), each cached separately.
+    compiled = torch.compile(extractor, dynamic=False)
+    return EagerFallback(compiled, extractor, "torch.compile")
+
+
+def export_extractor(extractor: nn.Module, device: torch.device, path: str,
+                     input_size: Tuple[int, int], batch_size: int) -> nn.Module:
+    """
+    Load (building it first if needed) an AOTInductor package of the extractor.
+
+    Compilation happens once per artifact path; the package is written to a
+    temporary file and renamed so an interrupted build is never picked up.
+    """
+    input_shape = (batch_size, 3, input_size[0], input_size[1])
+    try:
+        if not os.path.exists(path):
+            print(f"Compiling backbone for input {input_shape}, this may take a few minutes...", flush=True)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            example = torch.randn(input_shape, device=device)
+            with torch.no_grad():
+                program = torch.export.export(extractor, (example,))
+                tmp_path = path + ".tmp.pt2"
+                torch._inductor.aoti_compile_and_package(program, package_path=tmp_path)
+            os.replace(tmp_path, path)
+            print(f"Saved compiled backbone to {path}", flush=True)
+        runner = torch._inductor.aoti_load_package(path)
+    except Exception as e:
+        print(f"Warning: could not build compiled backbone, using eager execution: {e}", flush=True)
+        return extractor
+    return EagerFallback(FixedShapeRunner(runner, input_shape), extractor, f"compiled backbone {path}")
+
+
+def build_extractor(backbone: nn.Module, execution: str, device: torch.device, weights_hash: str,
+                    name: str, precision: str, input_size: Tuple[int, int], batch_size: int) -> nn.Module:
+    """
+    Wrap a backbone as a CLS feature extractor in the requested execution mode.
+    """
+    if execution not in EXECUTION_MODES:
+        raise ValueError(f"Unsupported execution mode '{execution}', expected one of {EXECUTION_MODES}")
+
+    extractor = ClsTokenExtractor(backbone).eval()
+    if execution == 'compile':
+        return compile_extractor(extractor)
+    if execution == 'export':
+        path = artifact_path(name, weights_hash, precision, device, input_size, batch_size)
+        return export_extractor(extractor, device, path, input_size, batch_size)
+    if execution == 'onnx':
+        if device.type != 'cpu' or precision != 'fp32':
+            print(f"Warning: ONNX execution supports fp32 on CPU only, using eager execution on "
+                  f"{device} ({precision})", flush=True)
+            return extractor
+        import onnx_backend
+        export_dir = artifact_path(name, weights_hash, precision, device, input_size, None, suffix=".onnx")
+        runner = onnx_backend.build_extractor(extractor, export_dir, input_size)
+        if runner is None:
+            return extractor
+        return EagerFallback(runner, extractor, f"ONNX backbone {export_dir}")
+    return extractor
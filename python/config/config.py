@@ -12,3 +12,120 @@ REID_EMBEDDING_PREFIX = 'dinov3_reid_'
 # The adapter-only approach produces slightly different results than full model
 # Set this to RAW_EMBEDDING_TYPE to re-enable if backbones are updated
 RAW_FOR_ADAPTER_TYPE = 'dinov3_raw_disabled'  # Non-existent, forces full model
+
+# DINOv3 backbone execution mode (see compiled_backbone.py):
+# 'eager', 'compile' (torch.compile), 'export' (AOTInductor package) or 'onnx'
+# (ONNX Runtime on CPU, needs onnxruntime installed).
+# Detection manifests and ReID input JSON can override it with an 'execution' key.
+BACKBONE_EXECUTION = 'eager'
+
+# DINOv3 backbone precision: 'fp32', or 'int8' for dynamically quantized CPU
+# inference (ignored on GPU). Detection manifests and ReID input JSON can
+# override it with a 'precision' key; check accuracy with validate_precision.
+BACKBONE_PRECISION = 'fp32'
+
+# bfloat16 autocast on CPU (see mixed_precision.py): 'auto' enables it when the
+# CPU has native bf16 support (AVX512-BF16/AMX, ARM BF16), 'off' keeps fp32.
+CPU_BF16 = 'auto'
+
+# Batch sizes measured by `python main.py calibrate` are kept in
+# ~/.ml4sg-care/machine_profile.json (see batch_calibration.py) and used by
+# detection/ReID; without a measurement the fixed defaults are used. With
+# True, a job on an uncalibrated machine first runs the sweep itself, which
+# can take minutes before its first image.
+AUTO_CALIBRATE_BATCH_SIZE = False
+
+# Batch size of the binary/species heads, which only see 1280-dim features.
+CLASSIFICATION_BATCH_SIZE = 256
+
+# Budget for decoded images kept in memory by detection (see frame_cache.py),
+# so each image is decoded once for all of its crops and its annotated copy.
+FRAME_CACHE_BYTES = 512 * 2**20
+
+# How many batches of crops the loader threads prepare ahead of the backbone
+# (see crop_loader.py). Overridable per job with a 'prefetch_batches' key in
+# the detection manifest or ReID input JSON.
+CROP_PREFETCH_BATCHES = 2
+
+# Stream MegaDetector results image by image into classification instead of
+# detecting every image into detection_results.json first. Classification and
+# output then proceed in chunks of DETECTION_STREAM_CHUNK_IMAGES images.
+# Overridable per job with a 'streaming' key in the detection manifest.
+DETECTION_STREAMING = True
+DETECTION_STREAM_CHUNK_IMAGES = 64
+# Also write detection_results.json in streaming mode (debugging only).
+KEEP_DETECTION_RESULTS = False
+
+# Detection output: append one compact JSON line per image to
+# detection_results.ndjson in the JSON output dir as each image finishes (see
+# result_sink.py), and/or write the legacy pretty-printed JSON file per image.
+# Overridable per job with 'results_ndjson' / 'per_image_json' manifest keys.
+RESULTS_NDJSON = True
+PER_IMAGE_JSON = True
+
+# Checkpoint interval (images) of MegaDetector in non-streaming detection, for
+# resuming with --resume; streaming detection journals every image.
+DETECTION_CHECKPOINT_IMAGES = 500
+
+# Annotated copies of detection images (see AnnotationRenderer in
+# detection_utils.py): 'full' resolution, a 'preview' scaled to at most
+# ANNOTATION_PREVIEW_MAX_EDGE pixels, or 'off'. Overridable per job with an
+# 'annotation' key in the detection manifest. ANNOTATION_FORMAT None keeps each
+# image's own format, or e.g. 'jpg'/'webp'/'png' changes the file extension.
+# They are written by ANNOTATION_WRITERS threads with at most ANNOTATION_QUEUE
+# images waiting.
+ANNOTATION_MODE = 'full'
+ANNOTATION_PREVIEW_MAX_EDGE = 1280
+ANNOTATION_FORMAT = None
+ANNOTATION_QUALITY = 95
+ANNOTATION_WRITERS = 2
+ANNOTATION_QUEUE = 16
+
+# Burst deduplication before detection (see burst_dedup.py): consecutive
+# frames from the same folder and camera, at most BURST_WINDOW_SECONDS apart,
+# whose 64-bit dHash differs from the burst's first frame in at most
+# BURST_HASH_THRESHOLD bits, reuse that frame's results. Off by default;
+# enable per job with a 'burst_dedup' key in the detection manifest.
+BURST_DEDUP = False
+BURST_HASH_THRESHOLD = 4
+BURST_WINDOW_SECONDS = 10
+
+# Blank prefilter before detection (see blank_prefilter.py): frames where at
+# most BLANK_CHANGE_FRACTION of a brightness-normalized thumbnail differs by
+# more than BLANK_PIXEL_DELTA from their camera sequence's background average
+# skip MegaDetector and are written as blanks. Sequences split at gaps over
+# BLANK_SEQUENCE_GAP_SECONDS; their first BLANK_MIN_HISTORY frames always go
+# through detection. Off by default; enable per job with a 'blank_prefilter'
+# key in the detection manifest.
+BLANK_PREFILTER = False
+BLANK_PIXEL_DELTA = 0.25
+BLANK_CHANGE_FRACTION = 0.001
+BLANK_SEQUENCE_GAP_SECONDS = 3600
+BLANK_MIN_HISTORY = 3
+BLANK_EMA_ALPHA = 0.2
+
+# Crop features of a detection chunk are kept in one [N, D] float32 matrix
+# (see feature_store.py); past FEATURE_STORE_MEMMAP_BYTES it is memory-mapped
+# on a temporary file in FEATURE_STORE_DIR (None: the system temp dir).
+FEATURE_STORE_MEMMAP_BYTES = 1024 * 2**20
+FEATURE_STORE_DIR = None
+
+# Two-tier detection cascade: a small backbone (CASCADE_BACKBONE) with its own
+# animal/blank head (CASCADE_HEAD, see HEADS in model_registry.py) sees every
+# crop first; only crops it gives at least CASCADE_ANIMAL_THRESHOLD animal
+# probability go on to the ViT-H+ binary and species heads, the rest are
+# blanks. Off by default, and skipped when the weights are missing (train the
+# head with `python main.py train_cascade_head`); enable per job with a
+# 'cascade' key in the detection manifest.
+CASCADE = False
+CASCADE_BACKBONE = 'dinov3_vits16'
+CASCADE_HEAD = 'binary_vits16'
+CASCADE_ANIMAL_THRESHOLD = 0.1
+
+# Adaptive crop input size: with RESOLUTION_BUCKETS, e.g. (112, 160, 224),
+# each crop is resized to the smallest bucket at least the side of a square
+# of its pixel area instead of always 224x224, and batched per bucket. Check
+# agreement on your data first with `python main.py validate_resolution`.
+# None keeps every crop at 224. Overridable per job with a
+# 'resolution_buckets' key in the detection manifest.
+RESOLUTION_BUCKETS = None
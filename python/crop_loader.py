@@ -0,0 +1,55 @@
+"""
+Prefetching crop loader.
+
+Preparing a crop (JPEG decode, crop, resize, normalize) used to happen on the
+main thread between backbone calls, so decoding and inference strictly
+alternated. prefetch_map runs the preparation in a thread pool ahead of the
+consumer: while the backbone works on batch k, the workers prepare the
+crops of the next `prefetch_batches` batches. PIL decoding and torch
+transforms release the GIL, so threads run them in parallel.
+
+Usage:
+    crops = prefetch_map(prepare_crop, items, num_workers=4, max_pending=2 * batch_size)
+    for batch_start in range(0, len(items), batch_size):
+        batch = [next(crops) for _ in items[batch_start:batch_start + batch_size]]
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+
+def prefetch_map(fn: Callable, items: Iterable, num_workers: int, max_pending: int) -> Iterator:
+    """
+    map(fn, items) evaluated ahead of the consumer in a thread pool.
+
+    Results are yielded in order. At most max_pending items are being
+    prepared or waiting to be consumed at any time, which bounds the memory
+    held by prepared crops. Exceptions raised by fn are re-raised when the
+    corresponding result is reached.
+
+    Args:
+        fn: Preparation function, called with one item.
+        items: Items to prepare.
+        num_workers: Worker threads. 0 prepares items lazily on the calling thread.
+        max_pending: Prefetch depth in items.
+    """
+    if num_workers <= 0:
+        yield from map(fn, items)
+        return
+
+    items = iter(items)
+    max_pending = max(1, max_pending)
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="crop_loader") as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(fn, item))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Consumer stopped early (or fn failed): drop work not yet started.
+            for future in pending:
+                future.cancel()
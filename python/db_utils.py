@@ -1,12 +1,16 @@
 """
-Database utilities for embedding cache.
+Database utilities for embedding cache and image metadata.
 
 This module provides the EmbeddingCache class for storing and retrieving
-DINOv3 embeddings from the SQLite database.
+DINOv3 embeddings from the SQLite database, and the ImageMetadataStore class
+for per-image header metadata (dimensions, EXIF orientation, capture time,
+camera), so pipelines need not open an image just to read its header.
 """
 
+import os
 import sqlite3
 import numpy as np
+import PIL.Image
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
@@ -224,6 +228,188 @@ class EmbeddingCache:
             conn.close()
 
 
+# EXIF tags read by read_image_meta().
+EXIF_IFD = 0x8769
+EXIF_ORIENTATION = 0x0112
+EXIF_MAKE = 0x010F
+EXIF_MODEL = 0x0110
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_BODY_SERIAL_NUMBER = 0xA431
+
+IMAGE_META_FIELDS = (
+    'width', 'height', 'orientation', 'datetime_original',
+    'camera_make', 'camera_model', 'camera_serial', 'file_size', 'file_mtime',
+)
+
+
+def _exif_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='replace')
+    value = str(value).strip('\x00 ')
+    return value or None
+
+
+def read_image_meta(image_path: str) -> Dict:
+    """
+    Read an image's metadata from its header and EXIF block, without decoding pixels.
+    
+    Args:
+        image_path: Path to the image.
+        
+    Returns:
+        Dict with the IMAGE_META_FIELDS. width/height are as stored, before
+        applying the EXIF orientation.
+    """
+    stat = os.stat(image_path)
+    with PIL.Image.open(image_path) as image:
+        width, height = image.size
+        exif = image.getexif()
+        exif_ifd = exif.get_ifd(EXIF_IFD)
+    return {
+        'width': width,
+        'height': height,
+        'orientation': exif.get(EXIF_ORIENTATION),
+        'datetime_original': _exif_text(exif_ifd.get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)),
+        'camera_make': _exif_text(exif.get(EXIF_MAKE)),
+        'camera_model': _exif_text(exif.get(EXIF_MODEL)),
+        'camera_serial': _exif_text(exif_ifd.get(EXIF_BODY_SERIAL_NUMBER)),
+        'file_size': stat.st_size,
+        'file_mtime': int(stat.st_mtime),
+    }
+
+
+class ImageMetadataStore:
+    """Per-image header metadata, keyed by images.id."""
+    
+    def __init__(self, db_path: str):
+        """
+        Initialize the metadata store.
+        
+        Args:
+            db_path: Path to the SQLite database file.
+        """
+        self.db_path = db_path
+        self._init_table()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get a database connection."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _init_table(self):
+        """Create image_metadata table if it doesn't exist."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS image_metadata (
+                    image_id INTEGER PRIMARY KEY,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    orientation INTEGER,
+                    datetime_original TEXT,
+                    camera_make TEXT,
+                    camera_model TEXT,
+                    camera_serial TEXT,
+                    file_size INTEGER,
+                    file_mtime INTEGER,
+                    extracted_at INTEGER NOT NULL,
+                    FOREIGN KEY(image_id) REFERENCES images(id) ON DELETE CASCADE
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def list_images(self) -> List[Tuple[int, str, Optional[int], Optional[int]]]:
+        """
+        All library images with their stored file size and mtime.
+        
+        Returns:
+            List of (image_id, original_path, file_size, file_mtime); the last
+            two are None for images without metadata.
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT images.id, images.original_path, image_metadata.file_size, image_metadata.file_mtime
+                FROM images LEFT JOIN image_metadata ON image_metadata.image_id = images.id
+            """)
+            return [tuple(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def get_image_meta(self, image_id: int) -> Optional[Dict]:
+        """
+        Get the metadata of one image.
+        
+        Args:
+            image_id: Database image ID.
+            
+        Returns:
+            Dict with the IMAGE_META_FIELDS, or None if not extracted yet.
+        """
+        return self.get_image_meta_batch([image_id]).get(image_id)
+    
+    def get_image_meta_batch(self, image_ids: List[int]) -> Dict[int, Dict]:
+        """
+        Batch lookup of image metadata.
+        
+        Args:
+            image_ids: Database image IDs.
+            
+        Returns:
+            Dict keyed by image_id; images without metadata are missing.
+        """
+        result = {}
+        image_ids = list(image_ids)
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(image_ids), 500):
+                chunk = image_ids[start:start + 500]
+                cursor.execute(f"""
+                    SELECT image_id, {', '.join(IMAGE_META_FIELDS)} FROM image_metadata
+                    WHERE image_id IN ({', '.join('?' * len(chunk))})
+                """, chunk)
+                for row in cursor.fetchall():
+                    result[row['image_id']] = {field: row[field] for field in IMAGE_META_FIELDS}
+            return result
+        finally:
+            conn.close()
+    
+    def store_image_meta_batch(self, items: List[Tuple[int, Dict]]):
+        """
+        Batch store image metadata.
+        
+        Args:
+            items: List of (image_id, metadata) tuples, metadata as from read_image_meta().
+        """
+        if not items:
+            return
+            
+        import time
+        now = int(time.time() * 1000)
+        
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(f"""
+                INSERT OR REPLACE INTO image_metadata
+                (image_id, {', '.join(IMAGE_META_FIELDS)}, extracted_at)
+                VALUES (?, {', '.join('?' * len(IMAGE_META_FIELDS))}, ?)
+            """, [(image_id, *(meta[field] for field in IMAGE_META_FIELDS), now) for image_id, meta in items])
+            conn.commit()
+        finally:
+            conn.close()
+
+
 # Convenience function for quick cache creation
 def create_cache(db_path: str) -> EmbeddingCache:
     """Create an EmbeddingCache instance from database path."""
@@ -7,14 +7,17 @@ import time
 import signal
 
 from datetime import datetime
-from ultralytics import YOLO
 from pathlib import Path
 
+import execution_plan
+
 
 yolo_model = None    # global variable
 
-def init_process(yolo_model_path):
+def init_process(yolo_model_path, plan):
     global yolo_model
+    from ultralytics import YOLO
+    execution_plan.apply(plan, execution_plan.pool_worker_index())
     DEVICE = "cpu"
     yolo_model = YOLO(yolo_model_path).to(DEVICE)
 
@@ -197,11 +200,13 @@ def process_images_with_pool(yolo_model_path, original_images_dir, output_dir, j
     for img_path in image_files:
         args_list.append((img_path, output_dir, json_output_dir, original_images_dir, log_file, counter, total_images, lock))
 
-    num_processes = max(1, min(mp.cpu_count() // 2, 12))
+    plan = execution_plan.plan_for('detection_cpu')
+    print(execution_plan.describe(plan), flush=True)
+    log_message(log_file, execution_plan.describe(plan))
     with mp.Pool(
-        processes=num_processes,
+        processes=plan['processes'],
         initializer=init_process,
-        initargs=(yolo_model_path,),
+        initargs=(yolo_model_path, plan),
     ) as pool:
         result = pool.map_async(worker_process, args_list)
         while not result.ready():
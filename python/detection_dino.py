@@ -1,21 +1,73 @@
 import json
+import math
 import sys
+import numpy as np
 import PIL.Image
+import PIL.ImageOps
 import torch
 from torchvision import transforms
 from torchvision.ops import box_convert
 from torchvision.ops import nms
 import torch.nn.functional as F
 import os
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Iterable, Iterator
 import time
+import itertools
 import torch.nn as nn
 from pathlib import Path
-from megadetector.detection.run_detector_batch import load_and_run_detector_batch, write_results_to_file
-from megadetector.utils import path_utils
-from detection_utils import convert_bbox_normalized_to_absolute, create_log_file, log_message, save_detection_results
+from detection_utils import (AnnotationRenderer, convert_bbox_normalized_to_absolute, create_log_file, log_message,
+                             save_detection_results)
+import batch_calibration
+import execution_plan
+import mixed_precision
+import model_registry
+from config.config import (BACKBONE_EXECUTION, BACKBONE_PRECISION, BLANK_PREFILTER, BURST_DEDUP, BURST_HASH_THRESHOLD,
+                           BURST_WINDOW_SECONDS, CASCADE, CASCADE_ANIMAL_THRESHOLD, CASCADE_BACKBONE, CASCADE_HEAD,
+                           CLASSIFICATION_BATCH_SIZE, CROP_PREFETCH_BATCHES,
+                           DETECTION_CHECKPOINT_IMAGES, DETECTION_STREAM_CHUNK_IMAGES, DETECTION_STREAMING,
+                           FRAME_CACHE_BYTES,
+                           KEEP_DETECTION_RESULTS, PER_IMAGE_JSON, RESOLUTION_BUCKETS, RESULTS_NDJSON)
+from crop_loader import prefetch_map
+from feature_store import FeatureStore
+from frame_cache import FrameCache, draft_reduction, oriented_size
+from job_journal import DETECTION_JOURNAL_NAME, JobJournal
+from result_sink import RESULTS_NDJSON_NAME, NdjsonResultSink
 
-def md_detection(image_folder: str, output_file: str, logfile, image_file_list: List[str] = None) -> None:
+MD_DETECTOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models/md_v1000.0.0-redwood.pt')
+
+def find_detection_images(image_folder: str, logfile, image_file_list: List[str] = None) -> List[str]:
+    """
+    The images MegaDetector should run on.
+    
+    Args:
+        image_folder (str): Path to the folder containing images (or dummy path if list provided).
+        logfile: Log file handle.
+        image_file_list (List[str], optional): List of absolute image paths to process.
+    
+    Returns:
+        List of image paths, empty if the folder does not exist or has no images.
+    """
+    # If a specific list is provided, use it
+    if image_file_list:
+        return image_file_list
+
+    # megadetector pulls in ultralytics/yolo; only import it once detection actually runs.
+    from megadetector.utils import path_utils
+
+    # Ensure the image folder exists
+    if not os.path.exists(image_folder):
+        print(f"Error: The specified image folder '{image_folder}' does not exist.")
+        log_message(logfile, f"The path '{image_folder}' does not exist.")
+        return []
+        
+    # Pick a folder to run MD on recursively
+    image_folder = os.path.expanduser(image_folder)
+    
+    # Recursively find images
+    return path_utils.find_images(image_folder, recursive=True)
+
+def md_detection(image_folder: str, output_file: str, logfile, image_file_list: List[str] = None,
+                 resume: bool = False) -> None:
     """
     Run MegaDetector on a folder of images and save results to a JSON file.
     
@@ -24,29 +76,16 @@ def md_detection(image_folder: str, output_file: str, logfile, image_file_list:
         output_file (str): Path to save the detection results JSON file.
         logfile: Log file handle.
         image_file_list (List[str], optional): List of absolute image paths to process.
+        resume: Continue from the checkpoint MegaDetector writes next to output_file.
     """
-    detector_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models/md_v1000.0.0-redwood.pt')
+    from megadetector.detection.run_detector_batch import load_and_run_detector_batch, write_results_to_file
 
     # Ensure the output directory exists
     output_dir = os.path.dirname(output_file)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
-    # If a specific list is provided, use it
-    if image_file_list:
-        image_file_names = image_file_list
-    else:
-        # Ensure the image folder exists
-        if not os.path.exists(image_folder):
-            print(f"Error: The specified image folder '{image_folder}' does not exist.")
-            log_message(logfile, f"The path '{image_folder}' does not exist.")
-            return
-            
-        # Pick a folder to run MD on recursively, and an output file
-        image_folder = os.path.expanduser(image_folder)
-        
-        # Recursively find images
-        image_file_names = path_utils.find_images(image_folder, recursive=True)
+    image_file_names = find_detection_images(image_folder, logfile, image_file_list)
 
     output_file = os.path.expanduser(output_file)
 
@@ -56,12 +95,71 @@ def md_detection(image_folder: str, output_file: str, logfile, image_file_list:
         return
 
 
-    results = load_and_run_detector_batch(detector_filename, image_file_names)
+    # MegaDetector checkpoints its own progress; a resumed run passes the
+    # checkpointed results back in and only detects the remaining images.
+    checkpoint_path = output_file + ".checkpoint"
+    previous_results = None
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            previous_results = json.load(f)["images"]
+        print(f"Resuming MegaDetector from {len(previous_results)} checkpointed images", flush=True)
+
+    results = load_and_run_detector_batch(MD_DETECTOR_PATH, image_file_names,
+                                          checkpoint_path=checkpoint_path,
+                                          checkpoint_frequency=DETECTION_CHECKPOINT_IMAGES,
+                                          results=previous_results)
 
     # Write results to a format that Timelapse and other downstream tools like.
     write_results_to_file(results,
                           output_file,
-                          detector_file=detector_filename)
+                          detector_file=MD_DETECTOR_PATH)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+def md_detection_stream(image_file_names: List[str], logfile, max_pending: int = DETECTION_STREAM_CHUNK_IMAGES,
+                        journal: JobJournal = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run MegaDetector image by image, ahead of the consumer.
+    
+    The detector runs on a background thread and stays at most max_pending
+    images ahead, so classification of the first images starts while later
+    ones are still being detected.
+    
+    Args:
+        image_file_names: Images to run on.
+        logfile: Log file handle.
+        max_pending: How many detected images may wait for the consumer.
+        journal: Optional JobJournal; results it already holds are reused
+            instead of detected again, and new results are recorded in it.
+    
+    Yields:
+        Per-image results in input order, in the format of the "images"
+        entries of detection_results.json ({'file', 'detections'} or
+        {'file', 'failure'}).
+    """
+    from megadetector.detection.run_detector import DEFAULT_OUTPUT_CONFIDENCE_THRESHOLD, load_detector
+    from megadetector.visualization import visualization_utils as vis_utils
+
+    detector = load_detector(MD_DETECTOR_PATH)
+    detected = journal.entries('detection') if journal else {}
+
+    def detect(image_path):
+        if image_path in detected:
+            return detected[image_path]
+        try:
+            image = vis_utils.load_image(image_path)
+            result = detector.generate_detections_one_image(
+                image, image_path, detection_threshold=DEFAULT_OUTPUT_CONFIDENCE_THRESHOLD)
+        except Exception as e:
+            print(f"Warning: MegaDetector failed on {image_path}: {e}", flush=True)
+            log_message(logfile, f"MegaDetector failed on '{image_path}': {e}")
+            return {'file': image_path, 'failure': str(e)}
+        if journal:
+            journal.record('detection', image_path, result)
+        return result
+
+    # One detector thread, so the detector is never called concurrently.
+    yield from prefetch_map(detect, image_file_names, 1, max_pending)
 
 class LinearClassifier(nn.Module):
     """Linear layer to train on top of frozen features"""
@@ -79,6 +177,29 @@ class LinearClassifier(nn.Module):
         return self.linear(x)
 
 
+class FusedClassifier(nn.Module):
+    """The binary and species LinearClassifier heads stacked into one projection"""
+    def __init__(self, binary_classifier: LinearClassifier, species_classifier: LinearClassifier):
+        super().__init__()
+        self.num_binary = binary_classifier.num_classes
+        self.num_species = species_classifier.num_classes
+        weight = torch.cat([binary_classifier.linear.weight, species_classifier.linear.weight]).detach()
+        bias = torch.cat([binary_classifier.linear.bias, species_classifier.linear.bias]).detach()
+        self.linear = nn.Linear(weight.shape[1], weight.shape[0]).to(weight.device)
+        with torch.no_grad():
+            self.linear.weight.copy_(weight)
+            self.linear.bias.copy_(bias)
+
+    def forward(self, x):
+        # [N, out_dim] -> [N, num_binary + num_species] logits
+        return self.linear(x)
+
+
+def fuse_classifiers(binary_classifier: LinearClassifier, species_classifier: LinearClassifier) -> FusedClassifier:
+    """Both heads as one [out_dim -> 2 + 24] layer, so classification is a single matmul per batch."""
+    return FusedClassifier(binary_classifier, species_classifier).eval()
+
+
 def create_linear_input(x_tokens_list, use_n_blocks, use_avgpool):
     """Create linear input from DINO intermediate layers"""
     intermediate_output = x_tokens_list[-use_n_blocks:]
@@ -96,18 +217,88 @@ def create_linear_input(x_tokens_list, use_n_blocks, use_avgpool):
 
 
 def load_dino_model(device):
-    """Load DINO model for feature extraction"""
-    repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dinov3")
-    weights_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models/dinov3_vith16plus_pretrain_lvd1689m-7c1da9a5.pth")
-    model = torch.hub.load(
-        repo, 
-        'dinov3_vith16plus', 
-        source='local', 
-        weights=weights_path
+    """Get the shared DINO backbone for feature extraction"""
+    return model_registry.get_backbone('dinov3_vith16plus', device)
+
+def load_classifiers(device):
+    """
+    Get the binary (animal/blank) and species LinearClassifier heads.
+
+    Returns:
+        Tuple of (binary_classifier, species_classifier), both in eval mode on device.
+    """
+    return model_registry.get_head('binary', device), model_registry.get_head('species', device)
+
+def load_feature_extractor(device, execution='eager', batch_size=None, precision='fp32'):
+    """
+    Get the backbone's CLS feature extractor for 224x224 crops.
+
+    Args:
+        device: PyTorch device
+        execution: 'eager', 'compile', 'export' or 'onnx' (see compiled_backbone)
+        batch_size: Feature batch size, which 'export' compiles for
+        precision: 'fp32', or 'int8' for the quantized CPU backbone
+    """
+    return model_registry.get_feature_extractor(
+        'dinov3_vith16plus', device, precision=model_registry.resolve_precision(precision, device),
+        execution=execution, input_size=(224, 224), batch_size=batch_size
     )
-    model.eval()
-    model = model.to(device)
-    return model
+
+def load_cascade(device, execution='eager', batch_size=None, precision='fp32'):
+    """
+    Get the small first tier of the detection cascade (CASCADE_BACKBONE and
+    CASCADE_HEAD in config/config.py).
+
+    Returns:
+        Dict with 'name', 'feature_extractor', 'head', 'threshold' and the
+        running 'stats' of the job, or None when its weights are missing.
+    """
+    weights_paths = [
+        os.path.join(model_registry.MODELS_DIR, model_registry.BACKBONE_WEIGHTS[CASCADE_BACKBONE]),
+        os.path.join(model_registry.MODELS_DIR, model_registry.HEADS[CASCADE_HEAD][0]),
+    ]
+    missing = [path for path in weights_paths if not os.path.exists(path)]
+    if missing:
+        print(f"Warning: Cascade disabled, missing {', '.join(missing)}", flush=True)
+        return None
+    return {
+        'name': CASCADE_BACKBONE,
+        'feature_extractor': model_registry.get_feature_extractor(
+            CASCADE_BACKBONE, device, precision=model_registry.resolve_precision(precision, device),
+            execution=execution, input_size=(224, 224), batch_size=batch_size
+        ),
+        'head': model_registry.get_head(CASCADE_HEAD, device),
+        'threshold': CASCADE_ANIMAL_THRESHOLD,
+        'stats': {'crops': 0, 'rejected': 0, 'tier1_seconds': 0.0, 'tier2_seconds': 0.0},
+    }
+
+def load_detection_models(device):
+    """
+    Get every model the classification stage needs.
+
+    Models come from the process-wide registry, so repeated calls (and the
+    ReID adapters) share the same backbone instance.
+
+    Args:
+        device: PyTorch device
+
+    Returns:
+        Dict with 'dino_model', 'binary_classifier' and 'species_classifier'.
+    """
+    dino_binary_classifier, dino_species_classifier = load_classifiers(device)
+    return {
+        'dino_model': load_dino_model(device),
+        'binary_classifier': dino_binary_classifier,
+        'species_classifier': dino_species_classifier,
+    }
+
+def select_device():
+    """Pick the best available device: CUDA, then Apple MPS, then CPU."""
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    elif torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
 
 def filter_bboxes(detections, iou_threshold=0.3):
     """
@@ -148,7 +339,8 @@ def crop_image_from_bbox(filepath: str, bbox: List[float]) -> PIL.Image.Image:
         Cropped PIL Image
     """
     image_to_classify = PIL.Image.open(filepath)
-    image_to_classify = image_to_classify.convert('RGB')  # Ensure RGB format
+    # Display orientation, as MegaDetector's bboxes are
+    image_to_classify = PIL.ImageOps.exif_transpose(image_to_classify).convert('RGB')  # Ensure RGB format
     image_width, image_height = image_to_classify.size
     
     xmin_abs, ymin_abs, xmax_abs, ymax_abs = convert_bbox_normalized_to_absolute(bbox, image_width, image_height)
@@ -160,11 +352,19 @@ def crop_image_from_bbox(filepath: str, bbox: List[float]) -> PIL.Image.Image:
 def batch_dino_image_processing(image_bbox_pairs: List[Tuple[str, List[float]]], 
                               device: torch.device, 
                               img_transform: transforms.Compose, 
-                              dino_model: torch.nn.Module, 
+                              feature_extractor: torch.nn.Module, 
                               batch_size: int = 32,
                               cache = None,  # Optional EmbeddingCache
-                              image_id_map: Dict[str, int] = None  # Optional: filepath -> image_id mapping
-                            ) -> List[torch.Tensor]:
+                              image_id_map: Dict[str, int] = None,  # Optional: filepath -> image_id mapping
+                              precision: str = 'fp32',
+                              frame_cache: FrameCache = None,
+                              loader_threads: int = None,
+                              prefetch_batches: int = CROP_PREFETCH_BATCHES,
+                              crop_size: Tuple[int, int] = (224, 224),
+                              report_progress: bool = True,
+                              resolution_buckets: Tuple[int, ...] = None,
+                              full_frames: bool = False
+                            ) -> FeatureStore:
     """
     Process multiple image crops in batches for efficient inference.
     
@@ -172,15 +372,35 @@ def batch_dino_image_processing(image_bbox_pairs: List[Tuple[str, List[float]]],
         image_bbox_pairs: List of (filepath, bbox) tuples
         device: PyTorch device
         img_transform: Image transformation pipeline
-        dino_model: DINO model for feature extraction
+        feature_extractor: Maps an image batch to CLS features, from load_feature_extractor()
         batch_size: Batch size for processing
         cache: Optional EmbeddingCache for caching features
         image_id_map: Optional dict mapping filepath -> database image_id
+        precision: Backbone precision; fp32 backbones run under bf16 autocast on CPUs that support it
+        frame_cache: Optional FrameCache shared with the rest of the pipeline, so
+            each image is decoded once for all of its crops
+        loader_threads: Threads preparing crops ahead of the backbone; defaults
+            to the execution plan's decode threads, 0 prepares them inline
+        prefetch_batches: How many batches the loader may prepare ahead
+        crop_size: (height, width) img_transform resizes crops to; images are
+            decoded at reduced scale where all their crops stay at least this big
+        report_progress: Print PROCESS lines in crops; off when the caller
+            reports progress itself (streaming detection)
+        resolution_buckets: Optional square input sizes, e.g. (112, 160, 224);
+            each crop is resized to its resolution_bucket() instead of
+            crop_size and batched with crops of the same bucket. Features of
+            reduced buckets are not stored in the embedding cache.
+        full_frames: Decode every image at full resolution instead of a DCT
+            reduction, when the full frame is needed anyway (annotation mode
+            'full' draws on the same cached frame)
     
     Returns:
-        List of features for each crop
+        FeatureStore with the float32 features of each crop, in input order;
+        the caller closes it
     """
-    all_features = [None] * len(image_bbox_pairs)  # Pre-allocate to maintain order
+    all_features = FeatureStore(len(image_bbox_pairs))
+    if frame_cache is None:
+        frame_cache = FrameCache(FRAME_CACHE_BYTES)
     from config.config import RAW_EMBEDDING_TYPE
     embedding_type = RAW_EMBEDDING_TYPE
     
@@ -189,7 +409,8 @@ def batch_dino_image_processing(image_bbox_pairs: List[Tuple[str, List[float]]],
     
     # First pass: check cache and collect items that need processing
     to_process = []  # [(original_idx, filepath, bbox)]
-    cached_count = 0
+    cached_indices = []
+    cached_rows = []
     
     # Normalize image_id_map keys for consistent path comparison
     normalized_id_map = {}
@@ -207,9 +428,8 @@ def batch_dino_image_processing(image_bbox_pairs: List[Tuple[str, List[float]]],
             
             # Convert normalized bbox to pixel for cache lookup (must match store format)
             try:
-                pil_image = PIL.Image.open(filepath)
-                image_width, image_height = pil_image.size
-                pil_image.close()
+                # Header only (or an already decoded frame), no decode.
+                image_width, image_height = frame_cache.image_size(filepath)
                 from detection_utils import convert_bbox_normalized_to_absolute
                 pixel_bbox = convert_bbox_normalized_to_absolute(bbox, image_width, image_height)
             except:
@@ -217,242 +437,272 @@ def batch_dino_image_processing(image_bbox_pairs: List[Tuple[str, List[float]]],
             
             cached_emb = cache.get_embedding(image_id, pixel_bbox, embedding_type)
             if cached_emb is not None:
-                all_features[idx] = torch.from_numpy(cached_emb).to(device)
-                cached_count += 1
+                cached_indices.append(idx)
+                cached_rows.append(cached_emb)
                 continue
         
         to_process.append((idx, filepath, bbox, normalized_filepath))
     
+    cached_count = len(cached_indices)
     if cached_count > 0:
+        all_features.put(cached_indices, np.stack(cached_rows))
+        del cached_rows
         print(f"Found {cached_count} cached features, processing {len(to_process)} new ones")
     
-    # Second pass: process uncached items in batches
-    for batch_start in range(0, len(to_process), batch_size):
-        batch_items = to_process[batch_start:batch_start + batch_size]
+    # Decode each image at the smallest DCT scale that keeps all of its crops
+    # at least crop_size (header reads only; the cache keys stay full resolution)
+    image_sizes = {}     # filepath -> (width, height) at full resolution
+    image_crops = {}     # filepath -> [pixel_bbox]
+    pixel_bboxes = {}    # original_idx -> pixel_bbox
+    for original_idx, filepath, bbox, _ in to_process:
+        try:
+            if filepath not in image_sizes:
+                image_sizes[filepath] = frame_cache.image_size(filepath)
+            pixel_bboxes[original_idx] = convert_bbox_normalized_to_absolute(bbox, *image_sizes[filepath])
+            image_crops.setdefault(filepath, []).append(pixel_bboxes[original_idx])
+        except Exception:
+            pass  # Reported when the crop is prepared
+    reductions = {} if full_frames else {filepath: draft_reduction(crops, crop_size)
+                                         for filepath, crops in image_crops.items()}
+    
+    # Small crops may run at a smaller input size; crops are grouped by size
+    # so every batch has one shape.
+    transforms_by_bucket = {None: img_transform}
+    bucket_of = {}       # original_idx -> bucket, empty without buckets
+    if resolution_buckets:
+        transforms_by_bucket.update(bucket_transforms(img_transform, resolution_buckets))
+        for original_idx, _, _, _ in to_process:
+            bucket_of[original_idx] = (resolution_bucket(pixel_bboxes[original_idx], resolution_buckets)
+                                       if original_idx in pixel_bboxes else max(resolution_buckets))
+        to_process.sort(key=lambda item: bucket_of[item[0]])
+        bucket_counts = {bucket: list(bucket_of.values()).count(bucket) for bucket in sorted(resolution_buckets)}
+        print(f"Crops per input size: {bucket_counts}", flush=True)
+    batches = []
+    for _, items in itertools.groupby(to_process, key=lambda item: bucket_of.get(item[0])):
+        items = list(items)
+        batches.extend(items[start:start + batch_size] for start in range(0, len(items), batch_size))
+    
+    def prepare_crop(item):
+        """Decode (once per image), crop and transform one item; runs on loader threads."""
+        original_idx, filepath, bbox, normalized_filepath = item
+        bucket = bucket_of.get(original_idx)
+        try:
+            # Decoded once per image, shared by all of its crops
+            frame = frame_cache.get(filepath, reductions.get(filepath, 1))
+            
+            # Pixel coordinates at full resolution for caching
+            image_width, image_height = image_sizes.get(filepath) or frame_cache.image_size(filepath)
+            pixel_bbox = convert_bbox_normalized_to_absolute(bbox, image_width, image_height)
+            
+            # Crop (in the decoded frame's coordinates) and transform
+            xmin, ymin, xmax, ymax = convert_bbox_normalized_to_absolute(bbox, frame.shape[1], frame.shape[0])
+            cropped_image = PIL.Image.fromarray(frame[ymin:ymax, xmin:xmax])
+            cropped_image = transforms_by_bucket[bucket](cropped_image)
+            return cropped_image, (original_idx, filepath, bbox, normalized_filepath, pixel_bbox)
+        except Exception as e:
+            print(f"Warning: Failed to process {filepath} with bbox {bbox}: {e}")
+            # Add a dummy tensor to maintain batch consistency
+            input_size = (bucket, bucket) if bucket else crop_size
+            return torch.zeros(3, *input_size), (original_idx, filepath, bbox, normalized_filepath, [0, 0, 0, 0])
+    
+    # Second pass: process uncached items in batches, preparing the next
+    # batches on loader threads while the backbone runs
+    if loader_threads is None:
+        loader_threads = execution_plan.plan_for('detection_dino', device)['decode_threads']
+    prepared_crops = prefetch_map(prepare_crop, to_process, loader_threads, prefetch_batches * batch_size)
+    processed_crops = cached_count
+    for batch_items in batches:
         batch_crops = []
         batch_info = []  # (original_idx, filepath, bbox, normalized_filepath, pixel_bbox)
         
-        # Prepare batch of cropped images
-        for original_idx, filepath, bbox, normalized_filepath in batch_items:
-            try:
-                # Open image to get dimensions for bbox conversion
-                pil_image = PIL.Image.open(filepath)
-                pil_image = pil_image.convert('RGB')
-                image_width, image_height = pil_image.size
-                
-                # Convert normalized bbox to pixel coordinates for caching
-                from detection_utils import convert_bbox_normalized_to_absolute
-                pixel_bbox = convert_bbox_normalized_to_absolute(bbox, image_width, image_height)
-                
-                # Crop and transform
-                xmin, ymin, xmax, ymax = pixel_bbox
-                cropped_image = pil_image.crop((xmin, ymin, xmax, ymax))
-                cropped_image = img_transform(cropped_image)
-                batch_crops.append(cropped_image)
-                batch_info.append((original_idx, filepath, bbox, normalized_filepath, pixel_bbox))
-            except Exception as e:
-                print(f"Warning: Failed to process {filepath} with bbox {bbox}: {e}")
-                # Add a dummy tensor to maintain batch consistency
-                batch_crops.append(torch.zeros(3, 224, 224))
-                batch_info.append((original_idx, filepath, bbox, normalized_filepath, [0, 0, 0, 0]))
+        # Collect the prepared batch of cropped images
+        for _ in batch_items:
+            cropped_image, info = next(prepared_crops)
+            batch_crops.append(cropped_image)
+            batch_info.append(info)
         
         # Stack into batch tensor and process
         if batch_crops:
             batch_tensor = torch.stack(batch_crops).to(device)
             
             # Extract features for entire batch
-            with torch.no_grad():
-                x_tokens_list = dino_model.get_intermediate_layers(
-                    batch_tensor, n=1, return_class_token=True
-                )
-                features = create_linear_input(x_tokens_list, 1, False)
-                features = features.to(device)
-                
-                # Store individual features and cache them
-                items_to_cache = []
-                for k in range(features.shape[0]):
-                    original_idx, filepath, bbox, normalized_filepath, pixel_bbox = batch_info[k]
-                    all_features[original_idx] = features[k]
-                    
-                    # Prepare for caching with PIXEL bbox (to match ReID lookup)
-                    if cache and normalized_id_map and normalized_filepath in normalized_id_map:
-                        image_id = normalized_id_map[normalized_filepath]
-                        items_to_cache.append((image_id, pixel_bbox, features[k].cpu().numpy()))
-                
-                # Batch store in cache
-                if items_to_cache and cache:
-                    cache.store_embeddings_batch(items_to_cache, embedding_type)
-                    print(f"Cached {len(items_to_cache)} embeddings", flush=True)
+            # GPU detection stays fp32; features are cast back to float32 for the cache.
+            with torch.no_grad(), mixed_precision.inference_autocast(device, gpu_fp16=False, precision=precision):
+                features = feature_extractor(batch_tensor).float()
+            
+            # Copy the batch into its rows of the store in one transfer
+            batch_indices = [info[0] for info in batch_info]
+            all_features.put(batch_indices, features)
+            
+            # Cache row views of the store
+            items_to_cache = []
+            for original_idx, filepath, bbox, normalized_filepath, pixel_bbox in batch_info:
+                if bucket_of.get(original_idx, max(crop_size)) < max(crop_size):
+                    continue  # Reduced input size; the cache holds full size features
+                # Prepare for caching with PIXEL bbox (to match ReID lookup)
+                if cache and normalized_id_map and normalized_filepath in normalized_id_map:
+                    image_id = normalized_id_map[normalized_filepath]
+                    items_to_cache.append((image_id, pixel_bbox, all_features.array[original_idx]))
+            
+            # Batch store in cache
+            if items_to_cache and cache:
+                cache.store_embeddings_batch(items_to_cache, embedding_type)
+                print(f"Cached {len(items_to_cache)} embeddings", flush=True)
             
             # Clean up GPU memory
-            del batch_tensor, x_tokens_list, features
+            del batch_tensor, features
         
         # Report progress for frontend
-        processed_crops = min(batch_start + batch_size, len(to_process)) + cached_count
-        print(f"PROCESS: {processed_crops}/{total_crops}", flush=True)
+        processed_crops += len(batch_items)
+        if report_progress:
+            print(f"PROCESS: {processed_crops}/{total_crops}", flush=True)
     
     # If all items were cached, report 100%
-    if len(to_process) == 0 and cached_count > 0:
+    if report_progress and len(to_process) == 0 and cached_count > 0:
         print(f"PROCESS: {total_crops}/{total_crops}", flush=True)
     
+    if report_progress:
+        print(f"Frame cache: {frame_cache.stats()}", flush=True)
     return all_features
 
-def batch_check_animal(features_batch: List[torch.Tensor], 
-                      dino_binary_classifier: LinearClassifier,
-                      batch_size: int = 64) -> Tuple[List[int], List[float]]:
+def resolution_bucket(pixel_bbox: List[int], buckets: Tuple[int, ...]) -> int:
+    """
+    Input size of a crop: the smallest bucket at least the side of a square
+    of the crop's pixel area, or the largest bucket for bigger crops.
+    """
+    xmin, ymin, xmax, ymax = pixel_bbox
+    side = math.sqrt(max(xmax - xmin, 1) * max(ymax - ymin, 1))
+    for bucket in sorted(buckets):
+        if side <= bucket:
+            return bucket
+    return max(buckets)
+
+def bucket_transforms(img_transform: transforms.Compose, buckets: Tuple[int, ...]) -> Dict[int, transforms.Compose]:
+    """img_transform per bucket, with its Resize replaced by a resize to (bucket, bucket)."""
+    return {
+        bucket: transforms.Compose([
+            transforms.Resize((bucket, bucket)) if isinstance(t, transforms.Resize) else t
+            for t in img_transform.transforms
+        ])
+        for bucket in buckets
+    }
+
+def batch_classify(features: FeatureStore,
+                   classifier: FusedClassifier,
+                   device: torch.device,
+                   batch_size: int = 64) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Perform binary classification on a batch of features.
+    Run the fused binary + species head over a feature matrix.
     
     Args:
-        features_batch: List of DINO features
-        dino_binary_classifier: Binary classifier model
+        features: FeatureStore of [N, out_dim] float32 features
+        classifier: FusedClassifier from fuse_classifiers()
+        device: Device of the classifier, batches of rows are moved there
         batch_size: Batch size for classification
     
     Returns:
-        Tuple of (predictions, confidences) for the batch
+        Tuple of NumPy arrays (is_animal, species_idx, confidence) of length N;
+        confidence is the species confidence of animals and the binary
+        confidence of blanks
     """
-    all_predictions = []
-    all_confidences = []
+    n = len(features)
+    is_animal = torch.empty(n, dtype=torch.bool, device=device)
+    species_idx = torch.empty(n, dtype=torch.long, device=device)
+    confidence = torch.empty(n, dtype=torch.float32, device=device)
     
-    for i in range(0, len(features_batch), batch_size):
-        batch_end = min(i + batch_size, len(features_batch))
-        batch_features = features_batch[i:batch_end]
-        
-        # Stack features into batch tensor
-        features_tensor = torch.stack(batch_features)
-        
-        with torch.no_grad():
-            output = dino_binary_classifier(features_tensor)
-            _, predicted = torch.max(output, dim=1)
-            pred_probs = F.softmax(output, dim=1)
-            max_prob, _ = torch.max(pred_probs, dim=1)
-        
-        all_predictions.extend(predicted.cpu().tolist())
-        all_confidences.extend(max_prob.cpu().tolist())
-        
-        # Clean up
-        del features_tensor, output, pred_probs
+    with torch.no_grad():
+        for i in range(0, n, batch_size):
+            logits = classifier(features.tensor(i, i + batch_size, device))
+            binary_conf, binary_pred = F.softmax(logits[:, :classifier.num_binary], dim=1).max(dim=1)
+            species_conf, species_pred = F.softmax(logits[:, classifier.num_binary:], dim=1).max(dim=1)
+            animal = binary_pred == 1
+            is_animal[i:i + batch_size] = animal
+            species_idx[i:i + batch_size] = species_pred
+            confidence[i:i + batch_size] = torch.where(animal, species_conf, binary_conf)
     
-    return all_predictions, all_confidences
+    return is_animal.cpu().numpy(), species_idx.cpu().numpy(), confidence.cpu().numpy()
 
-def batch_predict_species(features_batch: List[torch.Tensor], 
-                         dino_species_classifier: LinearClassifier,
-                         batch_size: int = 64) -> Tuple[List[int], List[float]]:
+def cascade_animal_probabilities(image_bbox_pairs: List[Tuple[str, List[float]]],
+                                 cascade: Dict[str, Any],
+                                 device: torch.device,
+                                 img_transform: transforms.Compose,
+                                 feature_batch_size: int,
+                                 classification_batch_size: int,
+                                 **crop_kwargs) -> np.ndarray:
     """
-    Perform species classification on a batch of features.
+    Animal probability of each crop from the cascade's small backbone and head.
     
     Args:
-        features_batch: List of DINO features  
-        dino_species_classifier: Species classifier model
-        batch_size: Batch size for classification
+        image_bbox_pairs: List of (filepath, bbox) tuples
+        cascade: From load_cascade()
+        crop_kwargs: precision, frame_cache, loader_threads, prefetch_batches,
+            resolution_buckets and full_frames, as for batch_dino_image_processing()
     
     Returns:
-        Tuple of (predictions, confidences) for the batch
+        float32 array of P(animal), one per crop
     """
-    all_predictions = []
-    all_confidences = []
-    
-    for i in range(0, len(features_batch), batch_size):
-        batch_end = min(i + batch_size, len(features_batch))
-        batch_features = features_batch[i:batch_end]
-        
-        # Stack features into batch tensor
-        features_tensor = torch.stack(batch_features)
-        
+    # No embedding cache: it holds ViT-H+ features.
+    features = batch_dino_image_processing(
+        image_bbox_pairs, device, img_transform, cascade['feature_extractor'], feature_batch_size,
+        report_progress=False, **crop_kwargs
+    )
+    try:
+        animal_probs = np.empty(len(features), dtype=np.float32)
         with torch.no_grad():
-            output = dino_species_classifier(features_tensor)
-            _, predicted = torch.max(output, dim=1)
-            pred_probs = F.softmax(output, dim=1)
-            max_prob, _ = torch.max(pred_probs, dim=1)
-        
-        all_predictions.extend(predicted.cpu().tolist())
-        all_confidences.extend(max_prob.cpu().tolist())
-        
-        # Clean up
-        del features_tensor, output, pred_probs
-    
-    return all_predictions, all_confidences
+            for i in range(0, len(features), classification_batch_size):
+                logits = cascade['head'](features.tensor(i, i + classification_batch_size, device))
+                animal_probs[i:i + classification_batch_size] = F.softmax(logits, dim=1)[:, 1].cpu().numpy()
+    finally:
+        features.close()
+    return animal_probs
 
-def predict_multiple_species_batched(detection_filepath: str, 
-                                   json_output_dir: str = None,
-                                   image_output_dir: str = None,
-                                   original_images_dir: str = None,
-                                   device: torch.device = None,
-                                   feature_batch_size: int = 32,
-                                   classification_batch_size: int = 64,
-                                   log_file = None,
-                                   db_path: str = None,
-                                   image_id_map: Dict[str, int] = None) -> List[Dict[str, Any]]:
+def classify_detection_images(images: List[Dict[str, Any]],
+                              device: torch.device,
+                              feature_extractor,
+                              classifier: FusedClassifier,
+                              img_transform: transforms.Compose,
+                              feature_batch_size: int,
+                              classification_batch_size: int,
+                              cache=None,
+                              image_id_map: Dict[str, int] = None,
+                              precision: str = 'fp32',
+                              frame_cache: FrameCache = None,
+                              loader_threads: int = None,
+                              prefetch_batches: int = CROP_PREFETCH_BATCHES,
+                              report_progress: bool = True,
+                              cascade: Dict[str, Any] = None,
+                              resolution_buckets: Tuple[int, ...] = None,
+                              full_frames: bool = False) -> Tuple[List[Dict[str, Any]], int]:
     """
-    Process the classification results using batch processing for improved speed.
+    Classify the MegaDetector boxes of a list of images.
     
     Args:
-        detection_filepath (str): Path to the detection JSON file.
-        output_filepath (str): Path to save the prediction results JSON file.
-        device: PyTorch device to use
+        images: MegaDetector results, the "images" entries of detection_results.json
+        device: PyTorch device
+        feature_extractor: Maps an image batch to CLS features, from load_feature_extractor()
+        classifier: Animal / blank and species heads, from fuse_classifiers()
+        img_transform: Crop transform
         feature_batch_size: Batch size for feature extraction
         classification_batch_size: Batch size for classification
-        db_path: Optional path to SQLite database for embedding cache
-        image_id_map: Optional dict mapping filepath -> database image_id
-    """
-    start_time = time.time()
-    
-    # Initialize embedding cache if db_path provided
-    cache = None
-    if db_path:
-        try:
-            from db_utils import EmbeddingCache
-            cache = EmbeddingCache(db_path)
-            print(f"Embedding cache initialized: {db_path}", flush=True)
-        except Exception as e:
-            print(f"Warning: Could not initialize embedding cache: {e}", flush=True)
-            cache = None
+        cache, image_id_map, precision, frame_cache, loader_threads, prefetch_batches,
+        report_progress, resolution_buckets, full_frames: As for batch_dino_image_processing()
+        cascade: Optional first tier from load_cascade(); crops it rejects as
+            blank skip the ViT-H+ backbone, and its 'stats' are updated
     
+    Returns:
+        Tuple of (prediction results per image, number of crops classified)
+    """
     dino_class_to_idx = {'Hedgehog': 0, 'bird': 1, 'cat': 2, 'deer': 3, 'dog': 4, 'ferret': 5, 'goat': 6, 'kea': 7, 'kiwi': 8, 'lagomorph': 9, 'livestock': 10, 'parakeet': 11, 'pig': 12, 'possum': 13, 'pukeko': 14, 'rodent': 15, 'stoat': 16, 'takahe': 17, 'tomtit': 18, 'tui': 19, 'wallaby': 20, 'weasel': 21, 'weka': 22, 'yellow_eyed_penguin': 23}
     
     # Create reverse mapping for DINO predictions
     idx_to_dino_class = {v: k for k, v in dino_class_to_idx.items()}
 
-    # Initialize results list
-    prediction_results = []
-    
-    print("Loading models...")
-    # Load the state dictionary and create the linear classifier
-    species_classifier_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models/dino_species_classifier.pt')
-    binary_classifier_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models/dino_binary_classifier_v3.pt')
-    
-    dino_state_dict = torch.load(species_classifier_path, map_location=device)
-    
-    # Create the linear classifier with the correct dimensions (24 classes)
-    dino_species_classifier = LinearClassifier(1280, 1, False, 24)
-    dino_species_classifier.load_state_dict(dino_state_dict)
-    dino_species_classifier.to(device).eval()
-
-    dino_binary_classifier = LinearClassifier(1280, 1, False, 2)
-    dino_binary_classifier.load_state_dict(torch.load(binary_classifier_path, map_location=device))
-    dino_binary_classifier.to(device).eval()
-
-    img_transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Resize((224, 224)),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),  # ImageNet normalization
-    ])
-
-    # Load DINO model directly
-    print("Loading DINO model...")
-    dino_model = load_dino_model(device)
-
-    print("Loading detection data...")
-    # Read JSON data from the file
-    with open(detection_filepath, "r", encoding="utf-8") as file:
-        data = json.load(file)
-
     # Step 1: Collect all image-bbox pairs and create mapping
     print("Collecting image-bbox pairs...")
     all_image_bbox_pairs = []
     image_bbox_to_result_mapping = []  # (image_idx, bbox_idx, bbox, bbox_conf, filepath, filename, pair_idx)
     
-    for i, prediction in enumerate(data["images"]):
+    for i, prediction in enumerate(images):
         filepath = prediction["file"]
         filename = Path(filepath).name
         
@@ -478,62 +728,81 @@ def predict_multiple_species_batched(detection_filepath: str,
                         'pair_idx': len(all_image_bbox_pairs) - 1  # Index in all_image_bbox_pairs
                     })
 
-    print(f"Found {len(all_image_bbox_pairs)} crops to process from {len(data['images'])} images")
-    print(f"PROCESS: 0/{len(all_image_bbox_pairs)}", flush=True)
-    # os.remove(detection_filepath)  # Remove the detection file to save space
-    print(f"Removed detection file: {detection_filepath}")
-    log_message(log_file, f"Removed detection file: {detection_filepath}")
+    print(f"Found {len(all_image_bbox_pairs)} crops to process from {len(images)} images")
+    if report_progress:
+        print(f"PROCESS: 0/{len(all_image_bbox_pairs)}", flush=True)
     
     if not all_image_bbox_pairs:
         print("No valid crops found for processing.")
-        return []
+        return [{"filename": Path(p["file"]).name, "filepath": p["file"], "predictions": []} for p in images], 0
 
-    # Step 2: Batch process all crops for feature extraction
-    print("Extracting features in batches...")
-    feature_start_time = time.time()
-    all_features = batch_dino_image_processing(
-        all_image_bbox_pairs, device, img_transform, dino_model, feature_batch_size,
-        cache=cache, image_id_map=image_id_map
-    )
-    feature_time = time.time() - feature_start_time
-    print(f"Feature extraction completed in {feature_time:.2f} seconds")
-
-    # Step 3: Batch binary classification
-    print("Performing binary classification in batches...")
-    binary_start_time = time.time()
-    binary_predictions, binary_confidences = batch_check_animal(
-        all_features, dino_binary_classifier, classification_batch_size
-    )
-    binary_time = time.time() - binary_start_time
-    print(f"Binary classification completed in {binary_time:.2f} seconds")
-
-    # Step 4: Batch species classification (only for non-blank detections)
-    animal_features = [feat for i, feat in enumerate(all_features) if binary_predictions[i] == 1]
-    animal_indices = [i for i, pred in enumerate(binary_predictions) if pred == 1]
-    
-    species_predictions = [0] * len(all_features)  # Initialize with dummy values
-    species_confidences = [0.0] * len(all_features)
+    n_crops = len(all_image_bbox_pairs)
+    is_animal = np.zeros(n_crops, dtype=bool)
+    species_idx = np.zeros(n_crops, dtype=np.int64)
+    confidences = np.zeros(n_crops, dtype=np.float32)
+    rejected = np.zeros(n_crops, dtype=bool)
+    escalated = np.arange(n_crops)
+    crop_kwargs = dict(precision=precision, frame_cache=frame_cache, loader_threads=loader_threads,
+                       prefetch_batches=prefetch_batches, resolution_buckets=resolution_buckets,
+                       full_frames=full_frames)
     
-    if animal_features:
-        print(f"Performing species classification on {len(animal_features)} animal detections...")
-        species_start_time = time.time()
-        animal_species_preds, animal_species_confs = batch_predict_species(
-            animal_features, dino_species_classifier, classification_batch_size
+    if cascade is not None:
+        # Step 1b: The small backbone rejects clear blanks; only crops it
+        # can't rule out as animals go on to ViT-H+
+        tier1_start_time = time.time()
+        animal_probs = cascade_animal_probabilities(
+            all_image_bbox_pairs, cascade, device, img_transform, feature_batch_size,
+            classification_batch_size, **crop_kwargs
         )
-        species_time = time.time() - species_start_time
-        print(f"Species classification completed in {species_time:.2f} seconds")
+        rejected = animal_probs < cascade['threshold']
+        confidences[rejected] = 1 - animal_probs[rejected]
+        escalated = np.flatnonzero(~rejected)
+        tier1_time = time.time() - tier1_start_time
+        print(f"Cascade tier 1 ({cascade['name']}): {n_crops} crops in {tier1_time:.2f} seconds, "
+              f"{int(rejected.sum())} rejected as blank, {len(escalated)} go on", flush=True)
+        cascade['stats']['crops'] += n_crops
+        cascade['stats']['rejected'] += int(rejected.sum())
+        cascade['stats']['tier1_seconds'] += tier1_time
+    
+    tier2_start_time = time.time()
+    if len(escalated):
+        tier_pairs = (all_image_bbox_pairs if cascade is None
+                      else [all_image_bbox_pairs[i] for i in escalated])
         
-        # Map species predictions back to original indices
-        for i, original_idx in enumerate(animal_indices):
-            species_predictions[original_idx] = animal_species_preds[i]
-            species_confidences[original_idx] = animal_species_confs[i]
+        # Step 2: Batch process the crops for feature extraction
+        print("Extracting features in batches...")
+        feature_start_time = time.time()
+        all_features = batch_dino_image_processing(
+            tier_pairs, device, img_transform, feature_extractor, feature_batch_size,
+            cache=cache, image_id_map=image_id_map, report_progress=report_progress, **crop_kwargs
+        )
+        feature_time = time.time() - feature_start_time
+        print(f"Feature extraction completed in {feature_time:.2f} seconds")
+
+        # Step 3: Binary and species classification in one pass over the
+        # feature store; species only count for animal crops
+        print("Performing classification in batches...")
+        classification_start_time = time.time()
+        try:
+            (is_animal[escalated], species_idx[escalated], confidences[escalated]) = batch_classify(
+                all_features, classifier, device, classification_batch_size
+            )
+        finally:
+            all_features.close()
+        classification_time = time.time() - classification_start_time
+        print(f"Classification of {len(escalated)} crops ({int(is_animal.sum())} animals) "
+              f"completed in {classification_time:.2f} seconds")
+    if cascade is not None:
+        tier2_time = time.time() - tier2_start_time
+        print(f"Cascade tier 2 (dinov3_vith16plus): {len(escalated)} crops in {tier2_time:.2f} seconds", flush=True)
+        cascade['stats']['tier2_seconds'] += tier2_time
 
-    # Step 5: Organize results back into original structure
+    # Step 4: Organize results back into original structure
     print("Organizing results...")
     
     # Initialize result structure for each image
     image_results = {}
-    for i, prediction in enumerate(data["images"]):
+    for i, prediction in enumerate(images):
         filepath = prediction["file"]
         filename = Path(filepath).name
         image_results[i] = {
@@ -548,20 +817,17 @@ def predict_multiple_species_batched(detection_filepath: str,
         image_idx = mapping['image_idx']
         bbox = mapping['bbox']
         
-        binary_pred = binary_predictions[pair_idx]
-        binary_conf = binary_confidences[pair_idx]
-        
-        if binary_pred == 0:  # Blank detection
+        if not is_animal[pair_idx]:  # Blank detection
             prediction_entry = {
                 "bounding_box": bbox,
                 "predicted_class": 'blank',
-                "prediction_source": "dino_binary",
-                "pred_confidence": float(binary_conf),
+                "prediction_source": "dino_cascade" if rejected[pair_idx] else "dino_binary",
+                "pred_confidence": float(confidences[pair_idx]),
                 "detection_confidence": float(mapping['bbox_conf'])
             }
         else:  # Animal detection
-            species_pred = species_predictions[pair_idx]
-            species_conf = species_confidences[pair_idx]
+            species_pred = int(species_idx[pair_idx])
+            species_conf = float(confidences[pair_idx])
             predicted_class = idx_to_dino_class.get(species_pred, f"unknown_class_{species_pred}")
             
             prediction_entry = {
@@ -576,31 +842,291 @@ def predict_multiple_species_batched(detection_filepath: str,
         image_results[image_idx]["predictions"].append(prediction_entry)
     
     # Convert to list format
-    prediction_results = [image_results[i] for i in sorted(image_results.keys())]
+    return [image_results[i] for i in sorted(image_results.keys())], len(all_image_bbox_pairs)
+    
+def predict_multiple_species_batched(detection_filepath: str, 
+                                   json_output_dir: str = None,
+                                   image_output_dir: str = None,
+                                   original_images_dir: str = None,
+                                   device: torch.device = None,
+                                   feature_batch_size: int = 32,
+                                   classification_batch_size: int = 64,
+                                   log_file = None,
+                                   db_path: str = None,
+                                   image_id_map: Dict[str, int] = None,
+                                   models: Dict[str, Any] = None,
+                                   execution: str = 'eager',
+                                   precision: str = 'fp32',
+                                   loader_threads: int = None,
+                                   prefetch_batches: int = CROP_PREFETCH_BATCHES,
+                                   detection_stream: Iterable[Dict[str, Any]] = None,
+                                   total_images: int = None,
+                                   results_ndjson: bool = RESULTS_NDJSON,
+                                   per_image_json: bool = PER_IMAGE_JSON,
+                                   journal: JobJournal = None,
+                                   resume: bool = False,
+                                   annotation: str = None,
+                                   burst_members: Dict[str, List[str]] = None,
+                                   probable_blanks: List[str] = None,
+                                   cascade: bool = CASCADE,
+                                   resolution_buckets: Tuple[int, ...] = RESOLUTION_BUCKETS) -> List[Dict[str, Any]]:
+    """
+    Process the classification results using batch processing for improved speed.
     
+    Args:
+        detection_filepath (str): Path to the detection JSON file.
+        output_filepath (str): Path to save the prediction results JSON file.
+        device: PyTorch device to use
+        feature_batch_size: Batch size for feature extraction
+        classification_batch_size: Batch size for classification
+        db_path: Optional path to SQLite database for embedding cache
+        image_id_map: Optional dict mapping filepath -> database image_id
+        models: Optional preloaded models from load_detection_models()
+        execution: Backbone execution mode, 'eager', 'compile', 'export' or 'onnx'
+        precision: Backbone precision, 'fp32' or 'int8' (CPU only)
+        loader_threads: Threads preparing crops ahead of the backbone
+        prefetch_batches: How many batches the crop loader may prepare ahead
+        detection_stream: Optional per-image MegaDetector results, e.g. from
+            md_detection_stream(); when given, detection_filepath is not read
+            and images are classified and saved in chunks as they arrive
+        total_images: Number of images in detection_stream, for progress
+        results_ndjson: Append each image's result to json_output_dir/detection_results.ndjson
+            as soon as it is done (see result_sink.py)
+        per_image_json: Also write the legacy per-image JSON files
+        journal: Optional JobJournal; images it records as done are skipped
+            and each newly saved image is recorded
+        resume: Append to the NDJSON results of the interrupted run instead
+            of starting them afresh
+        annotation: Annotated copy mode, 'off', 'full' or 'preview'; defaults
+            to ANNOTATION_MODE in config/config.py
+        burst_members: Optional representative path -> near-duplicate paths
+            from dedup_bursts(); members get a copy of their representative's
+            results, marked with 'duplicate_of'
+        probable_blanks: Optional images the blank prefilter kept from
+            detection; they are saved as blanks marked with 'probable_blank'
+        cascade: Run the small-backbone blank rejection tier (see load_cascade())
+            before ViT-H+
+        resolution_buckets: Optional crop input sizes (see resolution_bucket());
+            None resizes every crop to 224x224
+    """
+    start_time = time.time()
+    
+    # Initialize embedding cache if db_path provided
+    cache = None
+    if db_path:
+        try:
+            from db_utils import EmbeddingCache
+            cache = EmbeddingCache(db_path)
+            print(f"Embedding cache initialized: {db_path}", flush=True)
+        except Exception as e:
+            print(f"Warning: Could not initialize embedding cache: {e}", flush=True)
+            cache = None
+    
+    # Initialize results list
+    prediction_results = []
+    
+    if models is None:
+        print("Loading models...")
+        models = load_detection_models(device)
+    feature_extractor = load_feature_extractor(device, execution, feature_batch_size, precision)
+    classifier = fuse_classifiers(models['binary_classifier'], models['species_classifier'])
+    cascade_models = load_cascade(device, execution, feature_batch_size, precision) if cascade else None
+    if resolution_buckets and execution in ('export', 'onnx'):
+        print(f"Warning: Resolution buckets need a backbone that takes any input size, "
+              f"not execution '{execution}'; using 224x224", flush=True)
+        resolution_buckets = None
+
+    img_transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Resize((224, 224)),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),  # ImageNet normalization
+    ])
+
+    if detection_stream is None:
+        print("Loading detection data...")
+        # Read JSON data from the file
+        with open(detection_filepath, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        # os.remove(detection_filepath)  # Remove the detection file to save space
+        print(f"Removed detection file: {detection_filepath}")
+        log_message(log_file, f"Removed detection file: {detection_filepath}")
+        done = journal.entries('image') if journal else {}
+        chunks = [[image for image in data["images"] if image["file"] not in done]]
+        report_progress = True
+    else:
+        # Classify (and save) each chunk of images as soon as it is detected,
+        # reporting progress in images instead of crops.
+        chunks = iter(lambda: list(itertools.islice(detection_stream, DETECTION_STREAM_CHUNK_IMAGES)), [])
+        report_progress = False
+        print(f"PROCESS: 0/{total_images}", flush=True)
+
     # Save results to JSON file
     if json_output_dir is None:
         json_output_dir = str(Path(detection_filepath).parent / "prediction_standalone_batched.json")
 
-    save_detection_results(prediction_results, image_output_dir, original_images_dir, json_output_dir, log_file)
+    # Shared with the annotation step, so images still cached are not decoded again.
+    frame_cache = FrameCache(FRAME_CACHE_BYTES)
+    if db_path and image_id_map:
+        # Image sizes from the metadata index (python main.py image_metadata)
+        # spare a header read per image.
+        try:
+            from db_utils import ImageMetadataStore
+            metadata = ImageMetadataStore(db_path).get_image_meta_batch(image_id_map.values())
+            # The index stores the header size; rotate it into display orientation.
+            frame_cache.set_image_sizes({path: oriented_size(metadata[image_id]['width'], metadata[image_id]['height'],
+                                                             metadata[image_id]['orientation'])
+                                         for path, image_id in image_id_map.items() if image_id in metadata})
+            print(f"Image metadata known for {len(metadata)} of {len(image_id_map)} images", flush=True)
+        except Exception as e:
+            print(f"Warning: Could not read image metadata: {e}", flush=True)
+    result_sink = (NdjsonResultSink(os.path.join(json_output_dir, RESULTS_NDJSON_NAME), resume=resume)
+                   if results_ndjson else None)
+    # Annotated copies are drawn and written on writer threads while later chunks are classified.
+    renderer = AnnotationRenderer(image_output_dir, log_file, mode=annotation, frame_cache=frame_cache)
+    # Full size copies are drawn on the cached full frame, so crops are taken
+    # from it too rather than from a second, reduced decode.
+    full_frames = renderer.mode == 'full'
+    total_crops = 0
+    processed_images = 0
+    try:
+        if probable_blanks:
+            blank_results = [{"filename": Path(path).name, "filepath": path, "predictions": [], "probable_blank": True}
+                             for path in probable_blanks]
+            save_detection_results(blank_results, image_output_dir, original_images_dir, json_output_dir, log_file,
+                                   frame_cache=frame_cache, result_sink=result_sink,
+                                   write_json_files=per_image_json, renderer=renderer)
+            prediction_results.extend(blank_results)
+            if journal:
+                for result in blank_results:
+                    journal.record('image', result['filepath'], result)
+        for chunk in chunks:
+            chunk_results, chunk_crops = classify_detection_images(
+                chunk, device, feature_extractor, classifier, img_transform,
+                feature_batch_size, classification_batch_size, cache=cache, image_id_map=image_id_map,
+                precision=precision, frame_cache=frame_cache, loader_threads=loader_threads,
+                prefetch_batches=prefetch_batches, report_progress=report_progress, cascade=cascade_models,
+                resolution_buckets=resolution_buckets, full_frames=full_frames,
+            )
+            if burst_members:
+                chunk_results = chunk_results + [
+                    {"filename": Path(member).name, "filepath": member, "predictions": result["predictions"],
+                     "duplicate_of": result["filepath"]}
+                    for result in chunk_results for member in burst_members.get(result["filepath"], [])
+                ]
+            save_detection_results(chunk_results, image_output_dir, original_images_dir, json_output_dir, log_file,
+                                   frame_cache=frame_cache, result_sink=result_sink,
+                                   write_json_files=per_image_json, renderer=renderer)
+            prediction_results.extend(chunk_results)
+            if journal:
+                for result in chunk_results:
+                    journal.record('image', result['filepath'], result)
+            total_crops += chunk_crops
+            processed_images += len(chunk)
+            if not report_progress:
+                print(f"PROCESS: {processed_images}/{total_images}", flush=True)
+    finally:
+        renderer.close()
+        if result_sink is not None:
+            result_sink.close()
+    print(f"Frame cache: {frame_cache.stats()}", flush=True)
+    if cascade_models is not None:
+        stats = cascade_models['stats']
+        message = (f"Cascade: {stats['rejected']} of {stats['crops']} crops rejected by {cascade_models['name']} "
+                   f"in {stats['tier1_seconds']:.2f} seconds, {stats['crops'] - stats['rejected']} classified by "
+                   f"dinov3_vith16plus in {stats['tier2_seconds']:.2f} seconds")
+        print(message, flush=True)
+        log_message(log_file, message)
+    if result_sink is not None:
+        print(f"Results streamed to: {result_sink.path} ({result_sink.count} images)", flush=True)
     
     total_time = time.time() - start_time
     print(f"\nBatch processing completed!")
     print(f"Total time: {total_time:.2f} seconds")
     print(f"Prediction results saved to: {json_output_dir}")
     print(f"Total predictions processed: {len(prediction_results)}")
-    print(f"Total crops processed: {len(all_image_bbox_pairs)}")
+    print(f"Total crops processed: {total_crops}")
 
     if log_file:
         log_message(log_file, f"Batch processing completed in {total_time:.2f} seconds")
         log_message(log_file, f"Prediction results saved to: {json_output_dir}")
         log_message(log_file, f"Total predictions processed: {len(prediction_results)}")
-        log_message(log_file, f"Total crops processed: {len(all_image_bbox_pairs)}")
+        log_message(log_file, f"Total crops processed: {total_crops}")
     
     return prediction_results
 
 
-def run(original_images_dir, output_images_dir, json_output_dir, log_dir=''):
+def prefilter_blanks(image_file_names: List[str], workers: int, log_file) -> List[str]:
+    """
+    Find the probable blanks among image_file_names (see blank_prefilter.py)
+    and report the skip rate.
+    """
+    from blank_prefilter import find_probable_blanks
+    
+    start_time = time.time()
+    blanks = find_probable_blanks(image_file_names, workers=workers)
+    skip_rate = len(blanks) / len(image_file_names) if image_file_names else 0.0
+    message = (f"Blank prefilter: skipping detection of {len(blanks)} of {len(image_file_names)} images "
+               f"({skip_rate:.1%}) in {time.time() - start_time:.2f} seconds")
+    print(message, flush=True)
+    log_message(log_file, message)
+    return blanks
+
+
+def dedup_bursts(image_file_names: List[str], json_output_dir: str, workers: int, log_file,
+                 resume: bool = False) -> Dict[str, List[str]]:
+    """
+    Group burst near-duplicates (see burst_dedup.py) and record the groups in
+    json_output_dir/burst_groups.json.
+    
+    A resumed job only groups the images still to do, so its groups are
+    merged into those the interrupted run recorded rather than replacing them.
+    
+    Returns:
+        Representative path -> member paths; only the representatives need detection.
+    """
+    from burst_dedup import group_bursts
+    
+    start_time = time.time()
+    bursts = group_bursts(image_file_names, workers=workers)
+    message = (f"Burst deduplication: {len(image_file_names)} images -> {len(bursts)} to detect "
+               f"in {time.time() - start_time:.2f} seconds")
+    print(message, flush=True)
+    log_message(log_file, message)
+    
+    groups = {representative: members for representative, members in bursts.items() if members}
+    groups_path = os.path.join(json_output_dir, "burst_groups.json")
+    if resume and os.path.exists(groups_path):
+        try:
+            with open(groups_path, "r") as f:
+                recorded = json.load(f)["groups"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not read {groups_path}: {e}", flush=True)
+            recorded = {}
+        # Images grouped again now belong to their new group only.
+        regrouped = set(bursts).union(*bursts.values())
+        for representative, members in recorded.items():
+            members = [member for member in members if member not in regrouped]
+            if representative not in regrouped and members:
+                groups.setdefault(representative, members)
+    
+    os.makedirs(json_output_dir, exist_ok=True)
+    with open(groups_path, "w") as f:
+        json.dump({
+            "threshold": BURST_HASH_THRESHOLD,
+            "window_seconds": BURST_WINDOW_SECONDS,
+            "groups": groups,
+        }, f, indent=2)
+    return bursts
+
+
+def _record(stream, results):
+    """Pass stream through, appending each item to results."""
+    for item in stream:
+        results.append(item)
+        yield item
+
+
+def run(original_images_dir, output_images_dir, json_output_dir, log_dir='', models=None, resume=False):
     """
     Main run function that matches the interface expected by main.py
     
@@ -609,6 +1135,10 @@ def run(original_images_dir, output_images_dir, json_output_dir, log_dir=''):
         output_images_dir: Output directory for marked images
         json_output_dir: Output directory for JSON detection results
         log_dir: Directory for log files
+        models: Optional preloaded models from load_detection_models(), used by
+            the persistent worker so the backbone and heads are not reloaded per job
+        resume: Skip the images an interrupted run with the same json_output_dir
+            already finished (see job_journal.py)
     """
     print("STATUS: BEGIN", flush=True)
     
@@ -618,6 +1148,17 @@ def run(original_images_dir, output_images_dir, json_output_dir, log_dir=''):
     image_file_list = None
     db_path = None  # For embedding cache
     image_id_map = None  # filepath -> image_id mapping
+    execution = BACKBONE_EXECUTION
+    precision = BACKBONE_PRECISION
+    prefetch_batches = CROP_PREFETCH_BATCHES
+    streaming = DETECTION_STREAMING
+    results_ndjson = RESULTS_NDJSON
+    per_image_json = PER_IMAGE_JSON
+    annotation = None
+    burst_dedup = BURST_DEDUP
+    blank_prefilter = BLANK_PREFILTER
+    cascade = CASCADE
+    resolution_buckets = RESOLUTION_BUCKETS
     
     # Check if input is a JSON manifest
     if original_images_dir.lower().endswith('.json') and os.path.isfile(original_images_dir):
@@ -633,6 +1174,17 @@ def run(original_images_dir, output_images_dir, json_output_dir, log_dir=''):
                     # Extract optional cache parameters
                     db_path = data.get('db_path')
                     image_id_map = data.get('image_id_map')  # dict: filepath -> image_id
+                    execution = data.get('execution', execution)
+                    precision = data.get('precision', precision)
+                    prefetch_batches = int(data.get('prefetch_batches', prefetch_batches))
+                    streaming = bool(data.get('streaming', streaming))
+                    results_ndjson = bool(data.get('results_ndjson', results_ndjson))
+                    per_image_json = bool(data.get('per_image_json', per_image_json))
+                    annotation = data.get('annotation', annotation)
+                    burst_dedup = bool(data.get('burst_dedup', burst_dedup))
+                    blank_prefilter = bool(data.get('blank_prefilter', blank_prefilter))
+                    cascade = bool(data.get('cascade', cascade))
+                    resolution_buckets = data.get('resolution_buckets', resolution_buckets)
                 else:
                     raise ValueError("Manifest JSON must be a list or object with 'files' key")
             
@@ -655,29 +1207,85 @@ def run(original_images_dir, output_images_dir, json_output_dir, log_dir=''):
         detection_filepath = os.path.join(original_images_dir, "detection_results.json")
 
     # Check available devices
-    if torch.cuda.is_available():
-        device = torch.device("cuda")
-    elif torch.backends.mps.is_available():
-        device = torch.device("mps")
-    else:
-        device = torch.device("cpu")
+    device = select_device()
     print(f"Using device: {device}")
     log_message(log_file, f"Using device: {device}")
 
-    # Step 1: Run MegaDetector
+    plan = execution_plan.plan_for('detection_dino', device)
+    execution_plan.apply(plan)
+    print(execution_plan.describe(plan), flush=True)
+    log_message(log_file, execution_plan.describe(plan))
+
+    # Step 1: Run MegaDetector, either image by image into classification
+    # (streaming) or over every image into detection_results.json first
     print("Running MegaDetector...")
     log_message(log_file, "Running MegaDetector...")
+    detection_stream = None
+    detection_log = None
+    bursts = None
+    blanks = None
+    # Finished images (and in streaming mode detector outputs) are journaled
+    # in the output dir, so an interrupted job can be resumed.
+    journal = JobJournal(os.path.join(json_output_dir, DETECTION_JOURNAL_NAME), resume)
     try:
-        md_detection(original_images_dir, detection_filepath, log_file, image_file_list)
+        if streaming:
+            image_file_names = find_detection_images(original_images_dir, log_file, image_file_list)
+            done = journal.entries('image')
+            if done:
+                print(f"Resuming: {len(done)} images already done", flush=True)
+                log_message(log_file, f"Resuming: {len(done)} images already done")
+                image_file_names = [path for path in image_file_names if path not in done]
+            if blank_prefilter:
+                blanks = prefilter_blanks(image_file_names, plan['decode_threads'], log_file)
+                blank_set = set(blanks)
+                image_file_names = [path for path in image_file_names if path not in blank_set]
+            if burst_dedup:
+                bursts = dedup_bursts(image_file_names, json_output_dir, plan['decode_threads'], log_file,
+                                      resume=resume)
+                image_file_names = list(bursts)
+            if not image_file_names and not blanks:
+                print(f"No images found.")
+                log_message(log_file, f"No images found.")
+                journal.finish()
+                print("STATUS: DONE", flush=True)
+                return
+            detection_stream = (md_detection_stream(image_file_names, log_file, journal=journal)
+                                if image_file_names else iter([]))
+            if KEEP_DETECTION_RESULTS:
+                detection_log = []
+                detection_stream = _record(detection_stream, detection_log)
+        else:
+            if blank_prefilter or burst_dedup:
+                image_file_list = find_detection_images(original_images_dir, log_file, image_file_list)
+            if blank_prefilter:
+                blanks = prefilter_blanks(image_file_list, plan['decode_threads'], log_file)
+                blank_set = set(blanks)
+                image_file_list = [path for path in image_file_list if path not in blank_set]
+                done = journal.entries('image')
+                blanks = [path for path in blanks if path not in done]
+            if burst_dedup:
+                bursts = dedup_bursts(image_file_list, json_output_dir, plan['decode_threads'], log_file,
+                                      resume=resume)
+                image_file_list = list(bursts)
+            if blank_prefilter and not image_file_list:
+                # Everything is blank: nothing to detect, or to read back from a detection file
+                detection_stream = iter([])
+            else:
+                md_detection(original_images_dir, detection_filepath, log_file, image_file_list, resume=resume)
     except Exception as e:
+        journal.close()
         log_message(log_file, f"Error running MegaDetector: {str(e)}")
         raise e
 
-    # Configurable batch sizes - adjust based on GPU memory
-    feature_batch_size = 8 if device.type == 'cuda' else 4  # For feature extraction (more memory intensive)
-    classification_batch_size = 16 if device.type == 'cuda' else 8  # For classification (less memory intensive)
+    # Feature batch size comes from the machine profile (python main.py calibrate);
+    # the linear heads are cheap enough for large fixed batches.
+    precision = model_registry.resolve_precision(precision, device)
+    feature_batch_size = batch_calibration.get_batch_size(
+        device, (224, 224), precision, gpu_fp16=False, default=8 if device.type == 'cuda' else 4
+    )
+    classification_batch_size = CLASSIFICATION_BATCH_SIZE
     
-    log_message(log_file, f"Starting species classification with batch sizes: feature={feature_batch_size}, classification={classification_batch_size}")
+    log_message(log_file, f"Starting species classification with batch sizes: feature={feature_batch_size}, classification={classification_batch_size}, execution={execution}, precision={precision}")
     
     try:
         predict_multiple_species_batched(
@@ -690,11 +1298,36 @@ def run(original_images_dir, output_images_dir, json_output_dir, log_dir=''):
         classification_batch_size=classification_batch_size,
         log_file=log_file,
         db_path=db_path,
-        image_id_map=image_id_map
+        image_id_map=image_id_map,
+        models=models,
+        execution=execution,
+        precision=precision,
+        loader_threads=plan['decode_threads'],
+        prefetch_batches=prefetch_batches,
+        detection_stream=detection_stream,
+        total_images=len(image_file_names) if streaming else 0,
+        results_ndjson=results_ndjson,
+        per_image_json=per_image_json,
+        journal=journal,
+        resume=resume,
+        annotation=annotation,
+        burst_members=bursts,
+        probable_blanks=blanks,
+        cascade=cascade,
+        resolution_buckets=tuple(resolution_buckets) if resolution_buckets else None
         )
-    except Exception as e:
+    except BaseException as e:
+        # Also on SIGINT/SIGTERM (SystemExit): keep what was journaled so far.
+        journal.close()
         log_message(log_file, f"Error running DINO detection pipeline: {str(e)}")
         raise e
+    journal.finish()
+
+    if detection_log is not None:
+        # Debug artifact only; nothing downstream reads it in streaming mode.
+        from megadetector.detection.run_detector_batch import write_results_to_file
+        write_results_to_file(detection_log, detection_filepath, detector_file=MD_DETECTOR_PATH)
+        log_message(log_file, f"Detection results written to: {detection_filepath}")
     
     print("STATUS: DONE", flush=True)
     log_message(log_file, "DINO detection pipeline completed successfully")
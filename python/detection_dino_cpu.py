@@ -5,6 +5,7 @@ import time
 import signal
 import torch
 import PIL.Image
+import PIL.ImageOps
 from torchvision import transforms
 from torchvision.ops import box_convert
 from torchvision.ops import nms
@@ -14,8 +15,11 @@ from typing import List, Tuple, Dict, Any
 
 from datetime import datetime
 from pathlib import Path
-from megadetector.detection.run_detector_batch import load_and_run_detector_batch
 from detection_utils import convert_bbox_normalized_to_absolute, create_log_file, log_message, save_detection_results
+import execution_plan
+import model_registry
+import weight_store
+from job_journal import DETECTION_JOURNAL_NAME, JobJournal
 
 
 # Global variables for multiprocessing
@@ -27,34 +31,62 @@ img_transform = None
 device = None
 
 
-def init_process(md_model_path, dino_model_path, binary_classifier_path, species_classifier_path):
+def load_models(binary_classifier_path, species_classifier_path):
+    """The DINOv3 backbone and the binary and species heads on CPU, in eval mode."""
+    cpu = torch.device("cpu")
+    backbone = model_registry.get_backbone('dinov3_vith16plus', cpu)
+    
+    binary_classifier = LinearClassifier(1280, 1, False, 2)
+    binary_classifier.load_state_dict(torch.load(binary_classifier_path, map_location=cpu))
+    binary_classifier.to(cpu).eval()
+    
+    species_classifier = LinearClassifier(1280, 1, False, 24)
+    species_classifier.load_state_dict(torch.load(species_classifier_path, map_location=cpu))
+    species_classifier.to(cpu).eval()
+    return {'backbone': backbone, 'binary_classifier': binary_classifier, 'species_classifier': species_classifier}
+
+
+def load_shared_models(binary_classifier_path, species_classifier_path):
+    """
+    Load the models once in the parent for every pool worker to share.
+    
+    The weights are moved to shared memory: forked workers inherit them
+    without copying, spawned workers receive them as shared memory handles.
+    With converted weights (python main.py convert_weights) every worker maps
+    the same file and shares its page cache pages anyway, so nothing is
+    loaded here.
+    
+    Returns:
+        Dict of models as from load_models(), or None when workers should
+        load them themselves.
+    """
+    backbone_weights = os.path.join(model_registry.MODELS_DIR, model_registry.BACKBONE_WEIGHTS['dinov3_vith16plus'])
+    if weight_store.find_converted(backbone_weights):
+        print("Pool workers map the converted backbone weights", flush=True)
+        return None
+    start_time = time.time()
+    models = load_models(binary_classifier_path, species_classifier_path)
+    for model in models.values():
+        model.share_memory()
+    print(f"Loaded shared models for the pool in {time.time() - start_time:.2f} seconds", flush=True)
+    return models
+
+
+def init_process(md_model_path, dino_model_path, binary_classifier_path, species_classifier_path, plan,
+                 shared_models=None):
     global md_model, dino_model, dino_binary_classifier, dino_species_classifier, img_transform, device
     
+    execution_plan.apply(plan, execution_plan.pool_worker_index())
     device = torch.device("cpu")
     
     # Load MegaDetector model
     md_model = md_model_path
     
-    # Load DINO model
-    repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dinov3")
-    weights_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models/dinov3_vith16plus_pretrain_lvd1689m-7c1da9a5.pth")
-    dino_model = torch.hub.load(
-        repo, 
-        'dinov3_vith16plus', 
-        source='local', 
-        weights=weights_path
-    )
-    dino_model.eval()
-    dino_model = dino_model.to(device)
-    
-    # Load classifiers
-    dino_binary_classifier = LinearClassifier(1280, 1, False, 2)
-    dino_binary_classifier.load_state_dict(torch.load(binary_classifier_path, map_location=device))
-    dino_binary_classifier.to(device).eval()
-    
-    dino_species_classifier = LinearClassifier(1280, 1, False, 24)
-    dino_species_classifier.load_state_dict(torch.load(species_classifier_path, map_location=device))
-    dino_species_classifier.to(device).eval()
+    # DINO model and classifiers, shared by the parent or loaded here
+    models = shared_models or load_models(binary_classifier_path, species_classifier_path)
+    dino_model = models['backbone']
+    dino_binary_classifier = models['binary_classifier']
+    dino_species_classifier = models['species_classifier']
     
     # Image transform
     img_transform = transforms.Compose([
@@ -108,7 +140,8 @@ def crop_image_from_bbox(filepath: str, bbox: List[float]) -> PIL.Image.Image:
         Cropped PIL Image
     """
     image_to_classify = PIL.Image.open(filepath)
-    image_to_classify = image_to_classify.convert('RGB')  # Ensure RGB format
+    # Display orientation, as MegaDetector's bboxes are
+    image_to_classify = PIL.ImageOps.exif_transpose(image_to_classify).convert('RGB')  # Ensure RGB format
     image_width, image_height = image_to_classify.size
     
     xmin_abs, ymin_abs, xmax_abs, ymax_abs = convert_bbox_normalized_to_absolute(bbox, image_width, image_height)
@@ -146,6 +179,7 @@ def filter_bboxes(detections, iou_threshold=0.3):
 
 def make_inference_detection(path_to_img, output_dir, original_root, log_file):
     global md_model, dino_model, dino_binary_classifier, dino_species_classifier, img_transform, device
+    from megadetector.detection.run_detector_batch import load_and_run_detector_batch
     
     image_filename = path_to_img
     dino_class_to_idx = {'Hedgehog': 0, 'bird': 1, 'cat': 2, 'deer': 3, 'dog': 4, 'ferret': 5, 'goat': 6, 'kea': 7, 'kiwi': 8, 'lagomorph': 9, 'livestock': 10, 'parakeet': 11, 'pig': 12, 'possum': 13, 'pukeko': 14, 'rodent': 15, 'stoat': 16, 'takahe': 17, 'tomtit': 18, 'tui': 19, 'wallaby': 20, 'weasel': 21, 'weka': 22, 'yellow_eyed_penguin': 23}
@@ -230,6 +264,7 @@ def make_inference_detection(path_to_img, output_dir, original_root, log_file):
 
 
 def worker_process(args):
+    """Detect, classify and save one image. Returns img_path once it is saved, else None."""
     img_path, output_dir, json_output_dir, original_root, log_file, counter, total_images, lock = args
     try:
         detection_info = make_inference_detection(img_path, output_dir, original_root, log_file)
@@ -271,8 +306,10 @@ def worker_process(args):
             
             save_detection_results([prediction_result], output_dir, original_root, json_output_dir, log_file)
             log_message(log_file, f"No detections for '{img_path}'. Empty result saved.")
+        return img_path
     except Exception as e:
         log_message(log_file, f"Error processing image '{img_path}': {str(e)}")
+        return None
     finally:
         with lock:
             counter.value += 1
@@ -280,7 +317,7 @@ def worker_process(args):
 
 
 def process_images_with_pool(md_model_path, dino_model_path, binary_classifier_path, species_classifier_path, 
-                           original_images_dir, output_dir, json_output_dir, log_file):
+                           original_images_dir, output_dir, json_output_dir, log_file, resume=False):
     print("STATUS: BEGIN", flush=True)
 
     if not os.path.exists(output_dir):
@@ -297,9 +334,18 @@ def process_images_with_pool(md_model_path, dino_model_path, binary_classifier_p
             if file.lower().endswith(('.jpg', '.jpeg', '.png')):
                 image_files.append(os.path.join(root, file))
 
+    # Saved images are journaled by the parent, so an interrupted run can be resumed.
+    journal = JobJournal(os.path.join(json_output_dir, DETECTION_JOURNAL_NAME), resume)
+    done = journal.entries('image')
+    if done:
+        print(f"Resuming: {len(done)} images already done", flush=True)
+        log_message(log_file, f"Resuming: {len(done)} images already done")
+        image_files = [img_path for img_path in image_files if img_path not in done]
+
     total_images = len(image_files)
     if total_images == 0:
         log_message(log_file, f"No images found in the folder '{original_images_dir}'.")
+        journal.finish()
         return
     print(f"PROCESS: 0/{total_images}")
 
@@ -312,15 +358,26 @@ def process_images_with_pool(md_model_path, dino_model_path, binary_classifier_p
     for img_path in image_files:
         args_list.append((img_path, output_dir, json_output_dir, original_images_dir, log_file, counter, total_images, lock))
 
-    num_processes = max(1, min(mp.cpu_count() // 2, 12))
+    plan = execution_plan.plan_for('detection_dino_cpu')
+    print(execution_plan.describe(plan), flush=True)
+    log_message(log_file, execution_plan.describe(plan))
+    # One copy of the backbone for the whole pool instead of one per worker
+    shared_models = load_shared_models(binary_classifier_path, species_classifier_path)
     with mp.Pool(
-        processes=num_processes,
+        processes=plan['processes'],
         initializer=init_process,
-        initargs=(md_model_path, dino_model_path, binary_classifier_path, species_classifier_path),
+        initargs=(md_model_path, dino_model_path, binary_classifier_path, species_classifier_path, plan,
+                  shared_models),
     ) as pool:
-        result = pool.map_async(worker_process, args_list)
-        while not result.ready():
-            result.wait(timeout=1)
+        try:
+            for img_path in pool.imap_unordered(worker_process, args_list):
+                if img_path:
+                    journal.record('image', img_path, True)
+        except BaseException:
+            # Including the SystemExit of signal_handler: keep the journal.
+            journal.close()
+            raise
+    journal.finish()
 
     print("STATUS: DONE", flush=True)
 
@@ -330,7 +387,7 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 
-def run(original_images_dir, output_images_dir, json_output_dir, log_dir):
+def run(original_images_dir, output_images_dir, json_output_dir, log_dir, resume=False):
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
@@ -344,7 +401,7 @@ def run(original_images_dir, output_images_dir, json_output_dir, log_dir):
 
     start_time = time.time()
     process_images_with_pool(md_model_path, dino_model_path, binary_classifier_path, species_classifier_path,
-                           original_images_dir, output_images_dir, json_output_dir, log_file)
+                           original_images_dir, output_images_dir, json_output_dir, log_file, resume)
     end_time = time.time()
 
     total_time = end_time - start_time
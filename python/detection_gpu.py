@@ -6,7 +6,6 @@ import time
 import torch
 
 from datetime import datetime
-from ultralytics import YOLO
 from pathlib import Path
 
 
@@ -143,6 +142,7 @@ def run(original_images_dir, output_images_dir, json_output_dir, log_dir=''):
     model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "Detector_GPU.pt")
     log_file = create_log_file(log_dir)
     try:
+        from ultralytics import YOLO
         DEVICE = "cuda"
         yolo_model = YOLO(model_path).to(DEVICE)
     except Exception as e:
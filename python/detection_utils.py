@@ -1,8 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
 import os
 from pathlib import Path
+import threading
 import cv2
+from frame_cache import header_size
+
+ANNOTATION_MODES = ('off', 'full', 'preview')
+# cv2 flags decoding JPEGs at 1/reduction scale.
+IMREAD_REDUCED = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                  4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
 
 def convert_bbox_normalized_to_absolute(bbox, image_width, image_height):
     xmin, ymin, xmax, ymax = bbox
@@ -30,127 +38,308 @@ def log_message(log_file, message):
     with open(log_file, "a") as f:
         f.write(f"[{current_time}] {message}\n")
 
-def save_detection_results(predictions, image_output_path, original_images_dir, json_output_path, log_file):
-    for img_file in predictions:
-        try:
-            image_filename = img_file['filename']
-            image_path = img_file['filepath']
-            predictions_list = img_file.get('predictions', [])
+class AnnotationRenderer:
+    """
+    Draws the predictions onto a copy of each image and writes it, on a pool
+    of writer threads fed through a bounded queue, so decoding, drawing and
+    encoding the annotated copies overlap inference instead of following it.
+
+    Modes:
+        'off':     no annotated copies
+        'full':    full resolution copies (the original behaviour)
+        'preview': copies scaled down to at most preview_max_edge pixels,
+                   decoded at reduced scale where possible
+
+    submit() blocks only once max_pending images are waiting for the writers.
+    """
+
+    def __init__(self, output_dir, log_file, mode=None, preview_max_edge=None, image_format=None,
+                 quality=None, workers=None, max_pending=None, frame_cache=None):
+        from config.config import (ANNOTATION_FORMAT, ANNOTATION_MODE, ANNOTATION_PREVIEW_MAX_EDGE,
+                                   ANNOTATION_QUALITY, ANNOTATION_QUEUE, ANNOTATION_WRITERS)
+        self.output_dir = output_dir
+        self.log_file = log_file
+        self.mode = mode or ANNOTATION_MODE
+        if self.mode not in ANNOTATION_MODES:
+            raise ValueError(f"Unknown annotation mode {self.mode!r}, expected one of {ANNOTATION_MODES}")
+        if not output_dir:
+            self.mode = 'off'
+        self.preview_max_edge = preview_max_edge or ANNOTATION_PREVIEW_MAX_EDGE
+        self.image_format = image_format if image_format is not None else ANNOTATION_FORMAT
+        self.quality = quality or ANNOTATION_QUALITY
+        self.frame_cache = frame_cache
+        workers = ANNOTATION_WRITERS if workers is None else workers
+        self._executor = None
+        if self.mode != 'off' and workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="annotation")
+            self._slots = threading.BoundedSemaphore(max_pending or ANNOTATION_QUEUE)
+        self._futures = set()
+
+    def submit(self, image_path, predictions_list):
+        """Queue the annotated copy of image_path (or render it inline without writer threads)."""
+        if self.mode == 'off':
+            return
+        if self._executor is None:
+            self._render(image_path, predictions_list)
+            return
+        self._slots.acquire()
+        future = self._executor.submit(self._render, image_path, predictions_list)
+        self._futures.add(future)
+        future.add_done_callback(self._release)
+
+    def _release(self, future):
+        self._futures.discard(future)
+        self._slots.release()
+
+    def close(self):
+        """Wait for every queued image to be written."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
-            # Skip macOS resource fork files
-            if image_filename.startswith('._'):
-                log_message(log_file, f"Skipping macOS resource fork file: '{image_filename}'")
-                continue
+    def output_path(self, image_path):
+        # Simply save using the filename, flattening the structure
+        filename = os.path.basename(image_path)
+        if self.image_format:
+            filename = os.path.splitext(filename)[0] + "." + self.image_format
+        return os.path.join(self.output_dir, filename)
 
-            if not os.path.exists(image_path):
-                log_message(log_file, f"The path '{image_path}' does not exist.")
-                continue  # Continue to next image instead of aborting
+    def _load(self, image_path):
+        """BGR image to draw on; a private copy, never a cached frame."""
+        if self.mode == 'full':
+            if self.frame_cache is not None:
+                # cvtColor copies, so drawing never touches the shared frame.
+                return cv2.cvtColor(self.frame_cache.get(image_path), cv2.COLOR_RGB2BGR)
+            return cv2.imread(image_path)
 
-            image = cv2.imread(image_path)
+        # Preview: decode at the largest DCT reduction that still covers the
+        # preview size, then resize the rest of the way.
+        if self.frame_cache is not None:
+            width, height = self.frame_cache.image_size(image_path)
+            reduction = _preview_reduction(max(width, height), self.preview_max_edge)
+            image = cv2.cvtColor(self.frame_cache.get(image_path, reduction), cv2.COLOR_RGB2BGR)
+        else:
+            reduction = _preview_reduction(max(header_size(image_path)), self.preview_max_edge)
+            image = cv2.imread(image_path, IMREAD_REDUCED[reduction])
+        if image is None:
+            return None
+        scale = self.preview_max_edge / max(image.shape[:2])
+        if scale < 1:
+            image = cv2.resize(image, (round(image.shape[1] * scale), round(image.shape[0] * scale)),
+                               interpolation=cv2.INTER_AREA)
+        return image
+
+    def _encode_params(self, output_path):
+        extension = os.path.splitext(output_path)[1].lower()
+        if extension in ('.jpg', '.jpeg'):
+            return [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        if extension == '.webp':
+            return [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        if extension == '.png':
+            return [cv2.IMWRITE_PNG_COMPRESSION, 1]  # Favour speed, PNG is lossless anyway
+        return []
+
+    def _render(self, image_path, predictions_list):
+        image_filename = os.path.basename(image_path)
+        try:
+            image = self._load(image_path)
             if image is None:
-                log_message(log_file, f"Failed to read image '{image_path}'.")
-                continue  # Continue to next image instead of aborting
+                log_message(self.log_file, f"Failed to read image '{image_path}'.")
+                return
+
+            # Line widths and text were sized for full resolution images.
+            image_height, image_width = image.shape[:2]
+            if self.mode == 'preview' and self.frame_cache is not None:
+                scale = image_width / self.frame_cache.image_size(image_path)[0]
+            elif self.mode == 'preview':
+                scale = image_width / header_size(image_path)[0]
+            else:
+                scale = 1.0
+            for pred in predictions_list:
+                label = pred['predicted_class']
+                if label == 'blank':
+                    continue
+                pred_conf = round(pred['pred_confidence'], 2)
+                x1, y1, x2, y2 = convert_bbox_normalized_to_absolute(pred['bounding_box'], image_width, image_height)
+                margin = max(1, round(10 * scale))
+                cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), max(1, round(15 * scale)))
+                label_text = f"{label} ({pred_conf:.2f})"
+                font = cv2.FONT_HERSHEY_SIMPLEX
+                font_scale = 3.5 * scale
+                thickness = max(1, round(10 * scale))
+                text_size = cv2.getTextSize(label_text, font, font_scale, thickness)[0]
+                text_x = x1
+                text_y = y1 - margin if y1 - text_size[1] - margin >= 0 else y2 + text_size[1] + margin
+                cv2.rectangle(image, (text_x, text_y - text_size[1] - margin),
+                            (text_x + text_size[0], text_y + margin), (0, 0, 255), -1)
+                cv2.putText(image, label_text, (text_x, text_y), font, font_scale, (255, 255, 255), thickness)
+
+            output_path = self.output_path(image_path)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            cv2.imwrite(output_path, image, self._encode_params(output_path))
+            if predictions_list:
+                log_message(self.log_file, f"Marked image '{image_filename}' has been saved to '{output_path}'.")
+            else:
+                log_message(self.log_file, f"Original image '{image_filename}' has been saved to '{output_path}'.")
+        except Exception as e:
+            print(f"Error rendering image '{image_path}': {str(e)}")
+            log_message(self.log_file, f"Error rendering image '{image_path}': {str(e)}")
+
 
-            json_results = {}
-            json_results["image"] = os.path.basename(image_path)
-            json_results["boxes"] = []
+def _preview_reduction(max_edge, preview_max_edge):
+    """Largest DCT reduction (8, 4, 2 or 1) that keeps the long edge at least preview_max_edge."""
+    reduction = 8
+    while reduction > 1 and max_edge // reduction < preview_max_edge:
+        reduction //= 2
+    return reduction
 
-            if image_output_path:
-                # Simply save using the filename, flattening the structure
-                filename = os.path.basename(image_path)
-                output_path = os.path.join(image_output_path, filename)
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-            if len(predictions_list) == 0:
-                log_message(log_file, f"No Detection in image '{image_filename}'.")
+def save_detection_results(predictions, image_output_path, original_images_dir, json_output_path, log_file,
+                           frame_cache=None, result_sink=None, write_json_files=True, renderer=None):
+    """
+    Write each image's results and hand it to the annotated-image stage.
+
+    frame_cache: Optional FrameCache; images are taken from it instead of
+    being decoded again.
+    result_sink: Optional NdjsonResultSink that gets each image's result as
+    soon as it is done.
+    write_json_files: Whether to also write the legacy per-image JSON files.
+    renderer: Optional AnnotationRenderer shared across calls (the caller
+    closes it); by default one with the configured mode is used for this call
+    and waited for before returning.
+    """
+    owns_renderer = renderer is None
+    if owns_renderer:
+        renderer = AnnotationRenderer(image_output_path, log_file, frame_cache=frame_cache)
+    if frame_cache is not None:
+        # Draw images still in the cache first, before decoding the rest evicts them.
+        predictions = sorted(predictions, key=lambda p: frame_cache.peek(p['filepath']) is None)
+    try:
+        for img_file in predictions:
+            _save_image_result(img_file, log_file, json_output_path, frame_cache, result_sink,
+                               write_json_files, renderer)
+    finally:
+        if owns_renderer:
+            renderer.close()
+
+
+def _save_image_result(img_file, log_file, json_output_path, frame_cache, result_sink, write_json_files, renderer):
+    """Write the results of one image and queue its annotated copy."""
+    try:
+        image_filename = img_file['filename']
+        image_path = img_file['filepath']
+        predictions_list = img_file.get('predictions', [])
+
+        # Skip macOS resource fork files
+        if image_filename.startswith('._'):
+            log_message(log_file, f"Skipping macOS resource fork file: '{image_filename}'")
+            return
+
+        if not os.path.exists(image_path):
+            log_message(log_file, f"The path '{image_path}' does not exist.")
+            return  # Continue to next image instead of aborting
+
+        # The boxes are reported in full resolution pixels; only the
+        # header is needed for that, decoding is left to the renderer.
+        try:
+            if frame_cache is not None:
+                image_width, image_height = frame_cache.image_size(image_path)
+            else:
+                image_width, image_height = header_size(image_path)
+        except Exception:
+            log_message(log_file, f"Failed to read image '{image_path}'.")
+            return  # Continue to next image instead of aborting
+
+        json_results = {}
+        json_results["image"] = os.path.basename(image_path)
+        json_results["boxes"] = []
+
+        if len(predictions_list) == 0:
+            log_message(log_file, f"No Detection in image '{image_filename}'.")
+            json_results["boxes"].append({
+                "label": None,
+                "confidence": 0,
+                "bbox": []
+            })
+
+        else:
+            for pred in predictions_list:
+                pred_conf = round(pred['pred_confidence'], 2)
+                detection_conf = round(pred.get('detection_confidence', 0), 2)
+                label = pred['predicted_class']
+                bounding_box = pred['bounding_box']
+                source = pred.get('prediction_source', 'DINO')
+
+                # Convert bounding box to absolute coordinates
+                bounding_box = convert_bbox_normalized_to_absolute(bounding_box, image_width, image_height)
+
                 json_results["boxes"].append({
-                    "label": None,
-                    "confidence": 0,
-                    "bbox": []
+                    "label": label,
+                    "pred_conf": float(pred_conf),
+                    "detection_conf": float(detection_conf),
+                    "bbox": bounding_box,
+                    "source": source
                 })
-                image_to_save = image
-                save_message = f"Original image '{image_filename}' has been saved to '{output_path}'."
 
-            else:
-                for pred in predictions_list:
-                    pred_conf = round(pred['pred_confidence'], 2)
-                    detection_conf = round(pred.get('detection_confidence', 0), 2)
-                    label = pred['predicted_class']
-                    bounding_box = pred['bounding_box']
-                    source = pred.get('prediction_source', 'DINO')
-
-                    # Convert bounding box to absolute coordinates
-                    image_height, image_width = image.shape[:2]
-                    bounding_box = convert_bbox_normalized_to_absolute(bounding_box, image_width, image_height)
-
-                    json_results["boxes"].append({
-                        "label": label,
-                        "pred_conf": float(pred_conf),
-                        "detection_conf": float(detection_conf),
-                        "bbox": bounding_box,
-                        "source": source
-                    })
-
-                    if label != 'blank':
-                        x1, y1, x2, y2 = list(map(int, bounding_box))
-                        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 15)
-                        label_text = f"{label} ({pred_conf:.2f})"
-                        font = cv2.FONT_HERSHEY_SIMPLEX
-                        font_scale = 3.5
-                        thickness = 10
-                        text_size = cv2.getTextSize(label_text, font, font_scale, thickness)[0]
-                        text_x = x1
-                        text_y = y1 - 10 if y1 - text_size[1] - 10 >= 0 else y2 + text_size[1] + 10
-                        cv2.rectangle(image, (text_x, text_y - text_size[1] - 10),
-                                    (text_x + text_size[0], text_y + 10), (0, 0, 255), -1)
-                        cv2.putText(image, label_text, (text_x, text_y), font, font_scale, (255, 255, 255), thickness)
-                image_to_save = image
-                save_message = f"Marked image '{image_filename}' has been saved to '{output_path}'."
-
-            if image_output_path:
-                cv2.imwrite(output_path, image_to_save)
-                log_message(log_file, save_message)
-
-            if json_results:
-                filename = os.path.basename(image_path)
-                json_filename = os.path.splitext(filename)[0] + ".json"
-                fin_json_output_path = os.path.join(json_output_path, json_filename)
-                os.makedirs(os.path.dirname(fin_json_output_path), exist_ok=True)
-
-                # detections = json_results['boxes']
-                # selected_detection = None
-
-                # stoat_detections = [d for d in detections if d['label'] == 'Stoat']
-
-                # if stoat_detections:
-                #     selected_detection = max(stoat_detections, key=lambda x: x['confidence'])
-                # else:
-                #     valid_detections = [d for d in detections if d['label'] is not None]
-                #     selected_detection = max(valid_detections, key=lambda x: x['confidence']) if valid_detections else {
-                #         "label": None,
-                #         "confidence": 0,
-                #         "bbox": []
-                #     }
-
-                # json_results['boxes'] = [selected_detection]
-                with open(fin_json_output_path, "w") as f:
-                    json.dump(json_results, f, indent=4)
-
-                log_message(log_file, f"Cropped info for '{json_results['image']}' has been saved to '{fin_json_output_path}'.")
+        # Burst near-duplicates share their representative's results, and
+        # prefiltered blanks skipped detection; both are marked as such.
+        for key in ('duplicate_of', 'probable_blank'):
+            if key in img_file:
+                json_results[key] = img_file[key]
 
-            else:
-                filename = os.path.basename(image_path)
-                json_filename = os.path.splitext(filename)[0] + ".json"
-                fin_json_output_path = os.path.join(json_output_path, json_filename)
-                os.makedirs(os.path.dirname(fin_json_output_path), exist_ok=True)
-                json_results = {
-                    "image": os.path.basename(image_path),
-                    "boxes": [{"label": None, "confidence": 0, "bbox": []}]
-                }
-                with open(fin_json_output_path, "w") as f:
-                    json.dump(json_results, f, indent=4)
-                log_message(log_file, f"No detections for '{image_path}'. Empty JSON saved to '{fin_json_output_path}'.")
+        renderer.submit(image_path, predictions_list)
 
-        except Exception as e:
-            print(f"Error processing image: {str(e)}")
-            log_message(log_file, f"Error processing image: {str(e)}")  
+        if result_sink is not None:
+            result_sink.write({"filepath": image_path, **json_results})
+        if not write_json_files:
+            return
+
+        if json_results:
+            filename = os.path.basename(image_path)
+            json_filename = os.path.splitext(filename)[0] + ".json"
+            fin_json_output_path = os.path.join(json_output_path, json_filename)
+            os.makedirs(os.path.dirname(fin_json_output_path), exist_ok=True)
+
+            # detections = json_results['boxes']
+            # selected_detection = None
+
+            # stoat_detections = [d for d in detections if d['label'] == 'Stoat']
+
+            # if stoat_detections:
+            #     selected_detection = max(stoat_detections, key=lambda x: x['confidence'])
+            # else:
+            #     valid_detections = [d for d in detections if d['label'] is not None]
+            #     selected_detection = max(valid_detections, key=lambda x: x['confidence']) if valid_detections else {
+            #         "label": None,
+            #         "confidence": 0,
+            #         "bbox": []
+            #     }
+
+            # json_results['boxes'] = [selected_detection]
+            with open(fin_json_output_path, "w") as f:
+                json.dump(json_results, f, indent=4)
+
+            log_message(log_file, f"Cropped info for '{json_results['image']}' has been saved to '{fin_json_output_path}'.")
+
+        else:
+            filename = os.path.basename(image_path)
+            json_filename = os.path.splitext(filename)[0] + ".json"
+            fin_json_output_path = os.path.join(json_output_path, json_filename)
+            os.makedirs(os.path.dirname(fin_json_output_path), exist_ok=True)
+            json_results = {
+                "image": os.path.basename(image_path),
+                "boxes": [{"label": None, "confidence": 0, "bbox": []}]
+            }
+            with open(fin_json_output_path, "w") as f:
+                json.dump(json_results, f, indent=4)
+            log_message(log_file, f"No detections for '{image_path}'. Empty JSON saved to '{fin_json_output_path}'.")
+
+    except Exception as e:
+        print(f"Error processing image: {str(e)}")
+        log_message(log_file, f"Error processing image: {str(e)}")  
@@ -0,0 +1,258 @@
+"""
+CPU execution planning.
+
+Every pipeline used to pick its own parallelism (`cpu_count() // 2` pool
+processes or Python threads) while torch's intra-op pool also spun up one
+thread per logical CPU inside each of them, heavily oversubscribing the
+cores. This module sizes everything from one budget:
+
+    usable cores = physical cores, limited by CPU affinity and the cgroup quota
+    processes    = pool processes, limited by available memory per process
+                   (after the models the pool shares, counted once)
+    workers      = Python threads per process that call the model
+    intra_op     = torch intra-op threads, so processes x workers x intra_op ~= usable cores
+    decode       = threads for image decoding / prefetch
+
+Usage:
+    plan = execution_plan.plan_for('detection_dino_cpu')
+    with mp.Pool(plan['processes'], initializer=init_process, initargs=(..., plan)) as pool: ...
+
+    # in each worker / in the main process of single-process pipelines
+    execution_plan.apply(plan)
+"""
+
+import math
+import multiprocessing as mp
+import os
+import sys
+
+import torch
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+GIB = 2**30
+
+# Rough resident memory of one pool process, including its own models.
+PROCESS_MEMORY = {
+    'detection_cpu': 1 * GIB,        # YOLO detector
+    'detection_dino_cpu': 2 * GIB,   # MegaDetector + activations
+}
+
+# Models loaded once and shared by all pool processes (see
+# detection_dino_cpu.load_shared_models), counted once.
+SHARED_MEMORY = {
+    'detection_dino_cpu': 4 * GIB,   # fp32 DINOv3 ViT-H+ + heads
+}
+
+# Below this many intra-op threads per process, more processes stop paying off.
+MIN_THREADS_PER_PROCESS = 4
+MAX_PROCESSES = 12
+
+
+def _read_first_line(path):
+    try:
+        with open(path, "r") as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit():
+    """CPU quota of the current cgroup in cores (v2 cpu.max or v1 cfs quota), or None."""
+    line = _read_first_line("/sys/fs/cgroup/cpu.max")
+    if line:
+        quota, _, period = line.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_available():
+    """Memory left under the current cgroup's limit in bytes, or None if unlimited."""
+    for limit_path, usage_path in (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),
+    ):
+        limit = _read_first_line(limit_path)
+        if limit and limit != "max":
+            usage = _read_first_line(usage_path) or "0"
+            # v1 reports "unlimited" as a huge number.
+            if int(limit) < 2**60:
+                return max(0, int(limit) - int(usage))
+    return None
+
+
+def allowed_cpus():
+    """Logical CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _parse_cpu_list(text):
+    """CPUs of a sysfs cpu list such as "0,64" or "0-3,8-11"."""
+    cpus = []
+    for part in text.split(","):
+        if part:
+            first, _, last = part.partition("-")
+            cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def physical_core_groups(cpus, sysfs="/sys/devices/system/cpu"):
+    """
+    The given logical CPUs grouped by physical core (hyperthread siblings
+    together), ordered by their lowest CPU. Without topology information
+    (non-Linux) every CPU is its own group.
+    """
+    groups = {}
+    allowed = set(cpus)
+    for cpu in cpus:
+        siblings = _read_first_line(f"{sysfs}/cpu{cpu}/topology/thread_siblings_list")
+        try:
+            core = tuple(sibling for sibling in _parse_cpu_list(siblings) if sibling in allowed) if siblings else ()
+        except ValueError:
+            core = ()
+        groups.setdefault(core or (cpu,), None)
+    return sorted(groups, key=min)
+
+
+def machine_resources():
+    """
+    Returns:
+        Dict with 'logical_cpus', 'physical_cores', 'allowed_cpus', 'cpu_quota',
+        'usable_cores' and 'available_memory' (bytes).
+    """
+    logical = os.cpu_count() or 1
+    physical = (psutil.cpu_count(logical=False) if psutil else None) or logical
+    cpus = allowed_cpus()
+    quota = cgroup_cpu_limit()
+
+    # Hyperthread siblings share a core's matmul units; count cores, not threads.
+    usable = max(1, len(cpus) * physical // logical)
+    if quota:
+        usable = max(1, min(usable, math.ceil(quota)))
+
+    available_memory = psutil.virtual_memory().available if psutil else None
+    cgroup_memory = cgroup_memory_available()
+    if cgroup_memory is not None:
+        available_memory = min(available_memory, cgroup_memory) if available_memory else cgroup_memory
+
+    return {
+        'logical_cpus': logical,
+        'physical_cores': physical,
+        'allowed_cpus': cpus,
+        'cpu_quota': quota,
+        'usable_cores': usable,
+        'available_memory': available_memory,
+    }
+
+
+def plan_for(pipeline: str, device=None, resources=None):
+    """
+    Decide the parallelism of a pipeline.
+
+    Args:
+        pipeline: 'detection_cpu', 'detection_dino_cpu' (process pools),
+            'reid_cpu' (model-calling threads) or any single-process pipeline
+            such as 'detection_dino' and 'reid_v2'.
+        device: Inference device for single-process pipelines; on a GPU fewer
+            CPU threads are needed.
+        resources: Optional machine_resources() result.
+
+    Returns:
+        Dict with 'pipeline', 'processes', 'workers', 'intra_op_threads',
+        'inter_op_threads', 'decode_threads', 'usable_cores' and 'cpus'.
+    """
+    resources = resources or machine_resources()
+    usable = resources['usable_cores']
+    processes = 1
+    workers = 1
+
+    if pipeline in PROCESS_MEMORY:
+        processes = max(1, min(usable // MIN_THREADS_PER_PROCESS, MAX_PROCESSES))
+        if resources['available_memory']:
+            per_process_memory = resources['available_memory'] - SHARED_MEMORY.get(pipeline, 0)
+            processes = max(1, min(processes, per_process_memory // PROCESS_MEMORY[pipeline]))
+    elif pipeline == 'reid_cpu':
+        workers = max(1, usable // MIN_THREADS_PER_PROCESS)
+
+    intra_op_threads = max(1, usable // (processes * workers))
+    if device is not None and torch.device(device).type != 'cpu':
+        # The accelerator does the heavy lifting; CPU threads only feed it.
+        intra_op_threads = min(intra_op_threads, 4)
+
+    return {
+        'pipeline': pipeline,
+        'processes': processes,
+        'workers': workers,
+        'intra_op_threads': intra_op_threads,
+        'inter_op_threads': 1,
+        'decode_threads': max(1, min(8, usable // 4)),
+        'usable_cores': usable,
+        'cpus': resources['allowed_cpus'],
+    }
+
+
+def describe(plan) -> str:
+    return (f"Execution plan for {plan['pipeline']}: {plan['processes']} processes x "
+            f"{plan['workers']} workers x {plan['intra_op_threads']} intra-op threads "
+            f"({plan['inter_op_threads']} inter-op, {plan['decode_threads']} decode) "
+            f"on {plan['usable_cores']} usable cores")
+
+
+def apply(plan, worker_index=None):
+    """
+    Apply a plan's thread counts to the current process.
+
+    Args:
+        plan: Result of plan_for().
+        worker_index: Index of this pool process; when given and the plan has
+            several processes, the process is pinned to its own share of the
+            allowed physical cores (Linux only, see worker_cpus()).
+    """
+    torch.set_num_threads(plan['intra_op_threads'])
+    try:
+        torch.set_num_interop_threads(plan['inter_op_threads'])
+    except RuntimeError:
+        # Can only be set before the first inter-op parallel work, e.g. on a
+        # later job in the persistent worker; the earlier setting stands.
+        pass
+    if 'cv2' in sys.modules:
+        sys.modules['cv2'].setNumThreads(plan['decode_threads'])
+
+    if worker_index is not None and plan['processes'] > 1 and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, worker_cpus(plan, worker_index))
+
+
+def worker_cpus(plan, worker_index, core_groups=None):
+    """
+    CPUs a pool process is pinned to: its own share of whole physical cores,
+    so hyperthread siblings (which share a core's matmul units) never end up
+    in different processes or make up one process's whole slice.
+
+    Args:
+        plan: Result of plan_for().
+        worker_index: Index of the pool process.
+        core_groups: Optional physical_core_groups() of plan['cpus'].
+    """
+    cpus = plan['cpus']
+    core_groups = core_groups or physical_core_groups(cpus)
+    per_process = max(1, len(core_groups) // plan['processes'])
+    start = (worker_index % plan['processes']) * per_process
+    pinned = sorted(cpu for core in core_groups[start:start + per_process] for cpu in core)
+    return pinned or cpus
+
+
+def pool_worker_index():
+    """0-based index of the current multiprocessing pool worker, or None in the main process."""
+    identity = mp.current_process()._identity
+    return identity[0] - 1 if identity else None
@@ -0,0 +1,100 @@
+"""
+Preallocated feature matrix for crop embeddings.
+
+batch_dino_image_processing used to return one device tensor per crop, so a
+100k-crop job made 100k small allocations and every later stage re-stacked
+them. A FeatureStore is a single [N, D] float32 array that batch outputs and
+cache hits are copied into by row, and that classification and the embedding
+cache read back as row views. Past FEATURE_STORE_MEMMAP_BYTES it is a
+np.memmap on a temporary file (in FEATURE_STORE_DIR, or the system temp
+dir), so a large job pages features to disk instead of holding them in RAM.
+
+D is taken from the first rows written, so callers don't need to know the
+backbone's feature size up front.
+
+Usage:
+    store = FeatureStore(len(crops))
+    store.put_rows(start, batch_features)       # [B, D] tensor or array
+    logits = head(store.tensor(0, 256, device))
+    store.close()
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+from config.config import FEATURE_STORE_DIR, FEATURE_STORE_MEMMAP_BYTES
+
+
+class FeatureStore:
+    """[N, D] float32 feature rows, in memory or memory-mapped when large."""
+
+    def __init__(self, num_rows: int, memmap_bytes: int = FEATURE_STORE_MEMMAP_BYTES,
+                 directory: str = FEATURE_STORE_DIR):
+        self.num_rows = num_rows
+        self.memmap_bytes = memmap_bytes
+        self.directory = directory
+        self.array = None
+        self._file = None
+
+    def _allocate(self, dim: int):
+        shape = (self.num_rows, dim)
+        if self.num_rows * dim * 4 > self.memmap_bytes:
+            # Anonymous in effect: the file is deleted on close and never read back.
+            self._file = tempfile.NamedTemporaryFile(prefix="features_", suffix=".f32", dir=self.directory)
+            self.array = np.memmap(self._file, dtype=np.float32, mode="w+", shape=shape)
+        else:
+            self.array = np.empty(shape, dtype=np.float32)
+
+    @property
+    def dim(self):
+        return None if self.array is None else self.array.shape[1]
+
+    @property
+    def is_memmap(self) -> bool:
+        return isinstance(self.array, np.memmap)
+
+    def _as_numpy(self, values) -> np.ndarray:
+        if isinstance(values, torch.Tensor):
+            values = values.detach().float().cpu().numpy()
+        return np.asarray(values, dtype=np.float32)
+
+    def put_rows(self, start: int, values):
+        """Copy a [B, D] batch into rows start..start + B."""
+        values = self._as_numpy(values)
+        if self.array is None:
+            self._allocate(values.shape[1])
+        self.array[start:start + len(values)] = values
+
+    def put(self, indices, values):
+        """Copy a [B, D] batch (or one [D] row) into the given row indices."""
+        values = self._as_numpy(values)
+        if self.array is None:
+            self._allocate(values.shape[-1])
+        self.array[indices] = values
+
+    def rows(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """Row view, no copy."""
+        return self.array[start:stop]
+
+    def tensor(self, start: int = 0, stop: int = None, device: torch.device = torch.device("cpu")) -> torch.Tensor:
+        """Rows as a float32 tensor on device; shares memory on CPU."""
+        return torch.from_numpy(self.rows(start, stop)).to(device)
+
+    def __len__(self):
+        return self.num_rows
+
+    def close(self):
+        """Release the buffer (and delete the backing file of a memmap)."""
+        self.array = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
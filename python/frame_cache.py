@@ -0,0 +1,178 @@
+"""
+Decoded image cache.
+
+Detection used to decode each camera-trap image several times: once per crop
+for classification and once more with cv2 to draw the annotated copy. The
+FrameCache decodes an image once into an RGB uint8 array and hands the same
+buffer to every consumer, evicting least recently used frames once the
+decoded bytes exceed a budget (a 12 MP frame is ~36 MB).
+
+Crops are resized to the backbone input size (224 or 256 px) anyway, so a
+consumer that only needs crops can ask for a reduced decode: JPEGs are then
+decoded at 1/2, 1/4 or 1/8 scale by libjpeg's DCT scaling (PIL draft mode),
+which is several times faster and smaller than a full decode.
+draft_reduction() picks the largest reduction that keeps every crop at or
+above the target size.
+
+Frames and sizes are in display orientation: the EXIF orientation is applied
+on decode, as MegaDetector and cv2.imread do, so normalized bboxes map onto
+the same pixels whichever of them read the image.
+
+Usage:
+    frame_cache = FrameCache(FRAME_CACHE_BYTES)
+    frame = frame_cache.get(path)             # H x W x 3 RGB, read-only
+    width, height = frame_cache.image_size(path)
+
+    reduction = draft_reduction(pixel_bboxes, (224, 224))
+    small = frame_cache.get(path, reduction)  # ~(H / reduction) x (W / reduction); scale bboxes by its shape
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import PIL.Image
+import PIL.ImageOps
+
+
+# DCT scale factors libjpeg can decode at directly, largest first.
+DRAFT_REDUCTIONS = (8, 4, 2)
+# EXIF orientation tag; values 5-8 rotate by 90 degrees, swapping the axes.
+EXIF_ORIENTATION = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def oriented_size(width: int, height: int, orientation) -> tuple:
+    """(width, height) as displayed, from the stored size and EXIF orientation."""
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def header_size(path: str) -> tuple:
+    """(width, height) of path as decode_rgb and cv2.imread decode it, from the header alone."""
+    with PIL.Image.open(path) as image:
+        return oriented_size(*image.size, image.getexif().get(EXIF_ORIENTATION))
+
+
+def draft_reduction(pixel_bboxes, target_size) -> int:
+    """
+    Largest DCT reduction (8, 4, 2 or 1) at which every crop is still at least target_size.
+
+    Args:
+        pixel_bboxes: [x1, y1, x2, y2] crops in full resolution pixels.
+        target_size: (height, width) the crops are resized to.
+    """
+    reduction = DRAFT_REDUCTIONS[0]
+    for x1, y1, x2, y2 in pixel_bboxes:
+        while reduction > 1 and ((x2 - x1) // reduction < target_size[1]
+                                 or (y2 - y1) // reduction < target_size[0]):
+            reduction //= 2
+    return reduction if pixel_bboxes else 1
+
+
+def decode_rgb(path: str, reduction: int = 1) -> np.ndarray:
+    """
+    Decode path to RGB, in display orientation. With reduction > 1, JPEGs are
+    decoded at 1/reduction scale (other formats ignore it and decode at full size).
+    """
+    with PIL.Image.open(path) as image:
+        if reduction > 1:
+            width, height = image.size
+            image.draft('RGB', (math.ceil(width / reduction), math.ceil(height / reduction)))
+        return np.asarray(PIL.ImageOps.exif_transpose(image).convert('RGB'))
+
+
+class FrameCache:
+    """Thread-safe, byte-bounded LRU cache of decoded RGB frames keyed by (path, reduction)."""
+
+    def __init__(self, max_bytes: int, decoder=decode_rgb):
+        self.max_bytes = max_bytes
+        self.decoder = decoder
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._decoding = {}  # key -> Event set once its decode finishes
+        self._sizes = {}  # path -> (width, height) known without opening the file
+
+    def get(self, path: str, reduction: int = 1) -> np.ndarray:
+        """
+        Decoded RGB frame of path, decoding it on a miss.
+
+        Args:
+            path: Image path.
+            reduction: 1 for the full resolution frame, or a DCT reduction
+                from draft_reduction(). The returned frame may still be full
+                size (non-JPEG input), so scale coordinates by its shape.
+        """
+        key = (path, reduction)
+        while True:
+            with self._lock:
+                frame = self._frames.get(key)
+                if frame is not None:
+                    self._frames.move_to_end(key)
+                    self.hits += 1
+                    return frame
+                in_progress = self._decoding.get(key)
+                if in_progress is None:
+                    self._decoding[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread (e.g. a loader worker on a sibling crop) is
+            # decoding this image; wait for it rather than decoding twice.
+            in_progress.wait()
+
+        # Decode outside the lock so other threads can use the cache meanwhile.
+        try:
+            frame = self.decoder(path, reduction) if reduction > 1 else self.decoder(path)
+            frame.setflags(write=False)
+            self.put(path, frame, reduction)
+        finally:
+            with self._lock:
+                self._decoding.pop(key).set()
+        return frame
+
+    def put(self, path: str, frame: np.ndarray, reduction: int = 1):
+        key = (path, reduction)
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            if frame.nbytes > self.max_bytes:
+                return
+            self._frames[key] = frame
+            self._nbytes += frame.nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+
+    def peek(self, path: str, reduction: int = 1):
+        """Cached frame of path without decoding or touching LRU order, or None."""
+        with self._lock:
+            return self._frames.get((path, reduction))
+
+    def set_image_sizes(self, sizes: dict):
+        """
+        Register known (width, height) per path, e.g. from the image metadata
+        index. Sizes must be in display orientation (see oriented_size()).
+        """
+        with self._lock:
+            self._sizes.update(sizes)
+
+    def image_size(self, path: str):
+        """(width, height) of path as decoded: registered, from the cached frame, or else from the file header alone."""
+        size = self._sizes.get(path)
+        if size is not None:
+            return size
+        frame = self.peek(path)
+        if frame is not None:
+            return frame.shape[1], frame.shape[0]
+        return header_size(path)
+
+    def stats(self) -> str:
+        with self._lock:
+            return (f"{self.hits} hits, {self.misses} decodes, {len(self._frames)} frames "
+                    f"({self._nbytes / 2**20:.0f} MiB) cached")
@@ -0,0 +1,78 @@
+"""
+Image metadata extraction.
+
+Reads the header of every library image (dimensions, EXIF orientation,
+DateTimeOriginal, camera make/model/serial) on a thread pool, without
+decoding pixels, and stores it per images.id in the image_metadata table of
+the library database (see ImageMetadataStore in db_utils.py). Images whose
+file size and mtime match the stored row are skipped, so reruns only read new
+or changed files.
+
+Usage:
+    python main.py image_metadata /path/to/library.db [workers]
+
+Pipelines then look metadata up instead of opening files:
+    meta = ImageMetadataStore(db_path).get_image_meta_batch(image_ids)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from db_utils import ImageMetadataStore, read_image_meta
+
+# Header reads are I/O bound, so more threads than cores pay off.
+DEFAULT_WORKERS = 16
+STORE_BATCH = 500
+
+
+def _is_current(path, file_size, file_mtime):
+    if file_size is None:
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return True  # Missing file: keep what we have rather than retry it forever
+    return stat.st_size == file_size and int(stat.st_mtime) == file_mtime
+
+
+def _read(item):
+    image_id, path = item
+    try:
+        return image_id, read_image_meta(path)
+    except Exception as e:
+        print(f"Warning: Could not read metadata of {path}: {e}", flush=True)
+        return image_id, None
+
+
+def extract(db_path: str, workers: int = DEFAULT_WORKERS) -> int:
+    """
+    Extract metadata of every image missing or outdated in db_path.
+
+    Returns:
+        Number of images whose metadata was stored.
+    """
+    store = ImageMetadataStore(db_path)
+    todo = [(image_id, path) for image_id, path, file_size, file_mtime in store.list_images()
+            if not _is_current(path, file_size, file_mtime)]
+    print(f"Reading metadata of {len(todo)} images", flush=True)
+    print(f"PROCESS: 0/{len(todo)}", flush=True)
+
+    stored = 0
+    pending = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image_metadata") as executor:
+        for done, (image_id, meta) in enumerate(executor.map(_read, todo), start=1):
+            if meta is not None:
+                pending.append((image_id, meta))
+            if len(pending) >= STORE_BATCH or done == len(todo):
+                store.store_image_meta_batch(pending)
+                stored += len(pending)
+                pending = []
+                print(f"PROCESS: {done}/{len(todo)}", flush=True)
+    return stored
+
+
+def run(db_path, workers=DEFAULT_WORKERS):
+    print("STATUS: BEGIN", flush=True)
+    stored = extract(db_path, int(workers))
+    print(f"Stored metadata of {stored} images", flush=True)
+    print("STATUS: DONE", flush=True)
@@ -0,0 +1,122 @@
+"""
+Persistent inference worker.
+
+Spawning `python main.py detection ...` or `python main.py reid_v2 ...` per job
+reloads the DINOv3 backbone, the classifier heads and the ReID adapters every
+time. The `serve` task instead loads them once and then runs jobs read from
+stdin, one JSON object per line (NDJSON):
+
+    {"id": 1, "task": "detection", "args": {"original_images_dir": "...", "output_images_dir": "...", "json_output_dir": "...", "log_dir": "..."}}
+    {"id": 2, "task": "reid_v2", "args": {"input_json_path": "...", "batch_size": 8, "resume": true}}
+    {"id": 3, "task": "evict", "args": {"kind": "adapter"}}
+    {"id": 4, "task": "shutdown"}
+
+Each job streams the usual STATUS/PROCESS lines on stdout, exactly as the
+one-shot tasks do, and finishes with a single result line:
+
+    JOB: {"id": 1, "task": "detection", "ok": true, "seconds": 12.3}
+
+Usage:
+    python main.py serve [log_dir]
+"""
+
+import json
+import logging
+import sys
+import time
+import traceback
+
+import torch
+
+import detection_dino
+import execution_plan
+import model_registry
+import reid_v2
+
+
+def preload_models(device):
+    """
+    Load every model the worker's jobs use into the model registry.
+
+    Jobs then get them from the registry without reloading; the ReID adapters
+    sit on top of the same backbone instance as detection. Models evicted
+    between jobs are reloaded by the next job that needs them.
+    """
+    print(f"Using device: {device}", flush=True)
+    print("Loading models...", flush=True)
+    start_time = time.time()
+    detection_dino.load_detection_models(device)
+    reid_v2.load_reid_model(device)
+    logging.info(f"Models loaded in {time.time() - start_time:.2f} seconds")
+    log_memory_report()
+
+
+def log_memory_report():
+    for key, nbytes in model_registry.memory_report().items():
+        logging.info(f"Resident model {key}: {nbytes / 2**20:.0f} MiB")
+
+
+def run_job(job):
+    """
+    Run a single job against the resident models.
+
+    Args:
+        job: Parsed job request with 'task' and 'args'.
+    """
+    task = job.get('task')
+    args = job.get('args', {})
+    match (task):
+        case "detection":
+            detection_dino.run(**args)
+        case "reid_v2":
+            reid_v2.run(**args)
+        case "evict":
+            evicted = model_registry.evict(args.get('kind'), args.get('name'))
+            logging.info(f"Evicted {evicted} models")
+            log_memory_report()
+        case _:
+            raise ValueError(f"Invalid task {task}")
+
+
+def report(result):
+    print(f"JOB: {json.dumps(result)}", flush=True)
+
+
+def run(log_dir=''):
+    print(f"torch.cuda.is_available(): {torch.cuda.is_available()}", flush=True)
+    device = detection_dino.select_device()
+    plan = execution_plan.plan_for('serve', device)
+    execution_plan.apply(plan)
+    logging.info(execution_plan.describe(plan))
+    preload_models(device)
+    print("STATUS: READY", flush=True)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            report({"id": None, "ok": False, "error": f"Invalid job request: {e}"})
+            continue
+
+        if job.get('task') == "shutdown":
+            report({"id": job.get('id'), "task": "shutdown", "ok": True})
+            break
+
+        logging.info(f"Starting job {job.get('id')}: {job}")
+        start_time = time.time()
+        result = {"id": job.get('id'), "task": job.get('task')}
+        try:
+            run_job(job)
+            result["ok"] = True
+        except (Exception, SystemExit) as e:
+            # A failing job must not take the resident models down with it.
+            logging.error(f"Error in job {job.get('id')}: {str(e)}")
+            logging.error(traceback.format_exc())
+            result["ok"] = False
+            result["error"] = str(e)
+        result["seconds"] = round(time.time() - start_time, 2)
+        report(result)
@@ -0,0 +1,80 @@
+"""
+Append-only job journal for checkpoint/resume.
+
+Long detection and ReID jobs used to keep all progress in memory, so a job
+that died at 90% restarted from zero. A JobJournal records each unit of
+finished work as one NDJSON line in the job's output dir (written through
+NdjsonResultSink, so lines are flushed at once and fsynced periodically):
+
+    {"kind": "detection", "key": "/photos/IMG_0001.JPG", "value": {... MegaDetector result ...}}
+    {"kind": "image", "key": "/photos/IMG_0001.JPG", "value": {... prediction result ...}}
+    {"kind": "embedding", "key": "42", "value": "<base64 float32>"}
+
+A job started with resume=True reads the journal back and skips what it
+records; otherwise the journal is started afresh. A line cut short by a crash
+is ignored. The journal is deleted once the job completes.
+
+Usage:
+    journal = JobJournal(os.path.join(json_output_dir, DETECTION_JOURNAL_NAME), resume)
+    done = journal.entries('image')
+    journal.record('image', path, result)
+    journal.finish()
+"""
+
+import base64
+import json
+import os
+
+import numpy as np
+
+from result_sink import NdjsonResultSink
+
+DETECTION_JOURNAL_NAME = "detection_journal.ndjson"
+
+
+def encode_array(array: np.ndarray) -> str:
+    """float32 array as base64, far smaller than a JSON list of floats."""
+    return base64.b64encode(np.ascontiguousarray(array, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_array(value: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32)
+
+
+class JobJournal:
+    """Append-only record of finished work, keyed by kind and key."""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._entries = {}
+        if resume:
+            self._load()
+        self._sink = NdjsonResultSink(path, resume=resume)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Last line of a crashed job
+                    self._entries.setdefault(entry["kind"], {})[entry["key"]] = entry["value"]
+        except FileNotFoundError:
+            pass
+
+    def entries(self, kind: str) -> dict:
+        """key -> value of everything the resumed run recorded under kind."""
+        return self._entries.get(kind, {})
+
+    def record(self, kind: str, key: str, value):
+        self._sink.write({"kind": kind, "key": key, "value": value})
+
+    def close(self):
+        self._sink.close()
+
+    def finish(self):
+        """The job completed: close and delete the journal."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
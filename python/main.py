@@ -29,21 +29,50 @@ Test with:
         /tmp/care/reid_image_output \
         /tmp/care/reid_json_output \
         /tmp/care/logs
+
+    # Long-lived worker reading detection/reid_v2 jobs as NDJSON on stdin.
+    python main.py serve /tmp/care/logs
+
+    # One-time conversion of model weights to memory-mappable files.
+    python main.py convert_weights
+
+    # Species/ReID agreement of the int8 backbone with fp32 on a folder of images.
+    python main.py validate_precision /path/to/images int8 200
+
+    # Species agreement of reduced crop input sizes with 224x224 on a finished detection job.
+    python main.py validate_resolution /path/to/json_output/detection_results.ndjson 112,160,224 2000
+
+    # Animal/blank head of the detection cascade's small backbone, distilled on a finished job's crops.
+    python main.py train_cascade_head /path/to/json_output/detection_results.ndjson 20000 20
+
+    # Re-measure the per-machine batch sizes saved in ~/.ml4sg-care/machine_profile.json.
+    python main.py calibrate
+
+    # Header metadata (size, EXIF time, camera) of all library images into the database.
+    python main.py image_metadata /path/to/library.db
+
+    # Backbone throughput per execution mode (eager, torch.compile, AOT export, ONNX Runtime).
+    python main.py benchmark eager,compile,export,onnx 4 10 cpu
+
+Add --startup-report anywhere on the command line to print per-module import
+times before the task runs.
+
+Add --resume to a detection or reid_v2 command to continue an interrupted run
+with the same output paths, skipping the work it journaled (see job_journal.py).
 """
 
 import multiprocessing
 import sys
-import torch
 import os
 import logging
+import time
 import traceback
 
-import detection_dino_cpu
-import reid_dino_adapter
-import reid_cpu
-import reid_gpu
-import detection_dino
-import reid_v2
+from startup_report import ImportTimer
+
+STARTUP_REPORT_FLAG = "--startup-report"
+RESUME_FLAG = "--resume"
+RESUMABLE_TASKS = ("detection", "reid_v2")
 
 
 def setup_logging(log_dir):
@@ -63,6 +92,13 @@ def setup_logging(log_dir):
 def main():
     # We must call freeze_support() before any flag parsing
     multiprocessing.freeze_support()
+
+    startup_report = STARTUP_REPORT_FLAG in sys.argv
+    if startup_report:
+        sys.argv.remove(STARTUP_REPORT_FLAG)
+    resume = RESUME_FLAG in sys.argv
+    if resume:
+        sys.argv.remove(RESUME_FLAG)
     
     if len(sys.argv) == 1:
         print("No task specified.")
@@ -70,8 +106,9 @@ def main():
         
     task = sys.argv[1]
     try:
-        print(f"torch.cuda.is_available(): {torch.cuda.is_available()}")
-        
+        # Task modules are imported only once their task is chosen, so e.g.
+        # reid_v2 never pays for megadetector. They are listed as hidden
+        # imports in the PyInstaller scripts since nothing imports them statically.
         match (task):
             case "reid":
                 args = [
@@ -82,10 +119,7 @@ def main():
                     "log_dir",
                 ]
                 optional_args = ["batch_size"]
-                if torch.cuda.is_available():
-                    run = reid_dino_adapter.run
-                else:
-                    run = reid_dino_adapter.run
+                module_name = "reid_dino_adapter"
             case "detection":
                 args = [
                     "original_images_dir",
@@ -94,20 +128,53 @@ def main():
                     "log_dir",
                 ]
                 optional_args = []
-                if torch.cuda.is_available() or torch.backends.mps.is_available():
-                    run = detection_dino.run
-                else:
-                    run = detection_dino.run
+                module_name = "detection_dino"
             case "reid_v2":
                 args = [
                     "input_json_path",
                 ]
                 optional_args = ["batch_size"]
-                run = reid_v2.run
+                module_name = "reid_v2"
+            case "serve":
+                args = []
+                optional_args = ["log_dir"]
+                module_name = "inference_server"
+            case "convert_weights":
+                args = []
+                optional_args = []
+                module_name = "weight_store"
+            case "validate_precision":
+                args = ["image_dir"]
+                optional_args = ["precision", "max_images"]
+                module_name = "validate_precision"
+            case "validate_resolution":
+                args = ["results_path"]
+                optional_args = ["buckets", "max_crops"]
+                module_name = "validate_resolution"
+            case "train_cascade_head":
+                args = ["results_path"]
+                optional_args = ["max_crops", "epochs", "backbone", "head"]
+                module_name = "train_cascade_head"
+            case "calibrate":
+                args = []
+                optional_args = ["device", "precision"]
+                module_name = "batch_calibration"
+            case "image_metadata":
+                args = ["db_path"]
+                optional_args = ["workers"]
+                module_name = "image_metadata"
+            case "benchmark":
+                args = []
+                optional_args = ["executions", "batch_size", "iterations", "device"]
+                module_name = "benchmark"
             case _:
                 print(f"Invalid option {task}")
                 sys.exit(1)
 
+        if resume and task not in RESUMABLE_TASKS:
+            print(f"{RESUME_FLAG} is only supported for {', '.join(RESUMABLE_TASKS)}")
+            sys.exit(1)
+
         min_args = len(args) + 2
         max_args = len(args) + 2 + len(optional_args)
         if not (min_args <= len(sys.argv) <= max_args):
@@ -115,6 +182,16 @@ def main():
             print(f"sys.argv={sys.argv}")
             sys.exit(1)
 
+        start_time = time.perf_counter()
+        with ImportTimer() as import_timer:
+            run = import_timer.import_module(module_name).run
+            torch = import_timer.import_module("torch")
+        import_seconds = time.perf_counter() - start_time
+        if startup_report:
+            import_timer.print_report()
+
+        print(f"torch.cuda.is_available(): {torch.cuda.is_available()}")
+
         kwargs = {k: sys.argv[2 + i] for (i, k) in enumerate(args)}
 
         # Append optional arguments if provided
@@ -122,14 +199,19 @@ def main():
         for i, value in enumerate(extra_values):
             if i < len(optional_args):
                 kwargs[optional_args[i]] = value
+        if resume:
+            kwargs['resume'] = True
         
         # Setup logging before running
         log_dir = kwargs.get('log_dir', os.path.join(os.path.expanduser('~'), '.ml4sg-care', 'logs'))
         setup_logging(log_dir)
         logging.info(f"Starting {task} with arguments: {kwargs}")
+        logging.info(f"Imported {module_name} in {import_seconds:.2f} seconds")
         
-        # Verify input/output paths exist for path arguments only (skip for reid_v2 which uses JSON)
-        if task != "reid_v2":
+        # Verify input/output paths exist for path arguments only (skip for tasks
+        # whose arguments are inputs that must already exist)
+        if task not in ("reid_v2", "validate_precision", "validate_resolution", "train_cascade_head",
+                        "image_metadata"):
             for key in args:
                 path = kwargs[key]
                 if not os.path.exists(path):
@@ -0,0 +1,72 @@
+"""
+Autocast policy for inference.
+
+CUDA and MPS run the backbone under float16 autocast. On CPU, bfloat16
+autocast is used when the processor has native bf16 matmul support
+(AVX512-BF16 or AMX on x86, BF16 on ARM); without it bf16 is emulated and
+slower than fp32, so CPU inference stays fp32. Set CPU_BF16 in
+config/config.py to 'off' to always run fp32 on CPU.
+
+Callers cast results back to float32, so cached embeddings are float32
+regardless of the compute precision.
+"""
+
+import functools
+import platform
+
+import torch
+from torch.amp import autocast
+
+from config.config import CPU_BF16
+
+# /proc/cpuinfo / py-cpuinfo flags that indicate native bf16 matmuls.
+BF16_CPU_FLAGS = {'avx512_bf16', 'amx_bf16', 'bf16'}
+
+
+def _cpu_flags():
+    if platform.system() == "Linux":
+        try:
+            with open("/proc/cpuinfo", "r") as f:
+                for line in f:
+                    if line.startswith(("flags", "Features")):
+                        return set(line.split(":", 1)[1].split())
+        except OSError:
+            pass
+    try:
+        import cpuinfo
+        return set(cpuinfo.get_cpu_info().get('flags', []))
+    except Exception:
+        return set()
+
+
+@functools.lru_cache(maxsize=None)
+def cpu_bf16_supported() -> bool:
+    """Whether the CPU has native bfloat16 matmul instructions."""
+    supported = bool(_cpu_flags() & BF16_CPU_FLAGS)
+    print(f"CPU bf16 support: {supported}", flush=True)
+    return supported
+
+
+def autocast_dtype(device: torch.device, gpu_fp16: bool = True, precision: str = 'fp32'):
+    """
+    The autocast dtype for inference on device, or None to run in fp32.
+
+    Args:
+        device: Inference device.
+        gpu_fp16: Whether to use float16 autocast on CUDA/MPS.
+        precision: Backbone weight precision; only fp32 weights are autocast,
+            int8 quantized layers expect float32 inputs.
+    """
+    if precision != 'fp32':
+        return None
+    if device.type == "cuda" or (device.type == "mps" and torch.backends.mps.is_built()):
+        return torch.float16 if gpu_fp16 else None
+    if device.type == "cpu" and CPU_BF16 == 'auto' and cpu_bf16_supported():
+        return torch.bfloat16
+    return None
+
+
+def inference_autocast(device: torch.device, gpu_fp16: bool = True, precision: str = 'fp32'):
+    """autocast context for inference on device, see autocast_dtype()."""
+    dtype = autocast_dtype(device, gpu_fp16, precision)
+    return autocast(device_type=device.type, dtype=dtype, enabled=dtype is not None)
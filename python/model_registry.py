@@ -0,0 +1,385 @@
+"""
+Process-wide model registry.
+
+Detection, ReID and the persistent worker all ask this registry for the
+DINOv3 backbone, the LinearClassifier heads and the ReID adapters instead of
+loading them themselves. Each model is loaded once per (name, device,
+precision) and shared by every caller, so a process holds a single copy of
+the 840M-parameter backbone no matter how many pipelines use it.
+
+Usage:
+    import model_registry
+
+    backbone = model_registry.get_backbone('dinov3_vith16plus', device)
+    binary_head = model_registry.get_head('binary', device)
+    reid_model = model_registry.get_adapter('stoat_day_night', device)
+    extractor = model_registry.get_feature_extractor('dinov3_vith16plus', device, execution='compile')
+
+    model_registry.memory_report()   # {key: resident bytes}
+    model_registry.evict('backbone') # drop every backbone (and what uses it)
+"""
+
+import gc
+import itertools
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import torch
+
+import compiled_backbone
+import quantized_backbone
+import weight_store
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(SCRIPT_DIR, "models")
+DINO_REPO = os.path.join(SCRIPT_DIR, "dinov3")
+
+# Backbone name -> pretrained weights file in models/
+BACKBONE_WEIGHTS = {
+    'dinov3_vith16plus': 'dinov3_vith16plus_pretrain_lvd1689m-7c1da9a5.pth',
+    # Small backbones of the optional detection cascade (CASCADE in config/config.py)
+    'dinov3_vits16': 'dinov3_vits16_pretrain_lvd1689m-08c60483.pth',
+    'dinov3_vitb16': 'dinov3_vitb16_pretrain_lvd1689m-73cec8be.pth',
+}
+
+# Head name -> (weights file in models/, input dim, number of classes)
+HEADS = {
+    'binary': ('dino_binary_classifier_v3.pt', 1280, 2),
+    'species': ('dino_species_classifier.pt', 1280, 24),
+    # Animal / blank heads on the cascade backbones, from `python main.py train_cascade_head`
+    'binary_vits16': ('dino_binary_classifier_vits16.pt', 384, 2),
+    'binary_vitb16': ('dino_binary_classifier_vitb16.pt', 768, 2),
+}
+
+# Adapter name -> (backbone name, weights file in models/)
+ADAPTERS = {
+    'stoat_day_night': ('dinov3_vith16plus', 'DinoAdapter_Stoat_day_night_mixed_precision.pth.tar25'),
+}
+
+# 'int8' quantizes the backbone's Linear layers (CPU only); heads and adapters
+# are small and stay fp32 at every precision.
+PRECISIONS = ('fp32', 'int8')
+
+
+def resolve_precision(precision: str, device) -> str:
+    """
+    The precision to actually use on device: 'int8' falls back to 'fp32' off CPU.
+
+    Lets one manifest or config request int8 for CPU-only machines without
+    breaking GPU ones.
+    """
+    if precision == 'int8' and torch.device(device).type != 'cpu':
+        print(f"Precision 'int8' is CPU only, using fp32 on {device}", flush=True)
+        return 'fp32'
+    return precision
+
+
+def _check_precision(precision: str, device=None):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unsupported precision '{precision}', expected one of {PRECISIONS}")
+    if precision == 'int8' and device is not None and torch.device(device).type != 'cpu':
+        raise ValueError(f"Precision 'int8' is only supported on CPU, not {device}")
+
+
+def module_nbytes(module: torch.nn.Module) -> int:
+    """Bytes held by a module's parameters and buffers, counting shared storage once."""
+    seen = set()
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        storage = tensor.untyped_storage()
+        if storage.data_ptr() in seen:
+            continue
+        seen.add(storage.data_ptr())
+        total += storage.nbytes()
+    # Dynamically quantized Linear layers keep their int8 weights packed
+    # outside parameters().
+    for submodule in module.modules():
+        if isinstance(submodule, torch.ao.nn.quantized.dynamic.Linear):
+            weight = submodule.weight()
+            total += weight.numel() * weight.element_size()
+    return total
+
+
+def build_with_weights(builder, state_dict, strict=True) -> torch.nn.Module:
+    """
+    Construct a module and adopt state_dict's tensors as its weights.
+
+    The module is first built on the meta device so its initial weights are
+    never materialised, then load_state_dict(assign=True) swaps in the given
+    tensors without copying (for memory-mapped weights, the module ends up
+    backed directly by the mapping). If anything stays on meta, e.g. a
+    non-persistent buffer, the module is built for real instead.
+    """
+    with torch.device("meta"):
+        module = builder()
+    module.load_state_dict(state_dict, strict=strict, assign=True)
+    if any(t.is_meta for t in itertools.chain(module.parameters(), module.buffers())):
+        module = builder()
+        module.load_state_dict(state_dict, strict=strict, assign=True)
+    return module
+
+
+class ModelRegistry:
+    """Memoizing loader for backbones, classifier heads and ReID adapters."""
+
+    def __init__(self):
+        self._models: Dict[Tuple, torch.nn.Module] = {}
+        self._lock = threading.RLock()
+
+    def _get_or_load(self, key: Tuple, loader) -> torch.nn.Module:
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                start_time = time.time()
+                model = loader()
+                self._models[key] = model
+                print(f"Loaded {'/'.join(map(str, key))} in {time.time() - start_time:.2f} seconds "
+                      f"({module_nbytes(model) / 2**20:.0f} MiB)", flush=True)
+            return model
+
+    def get_backbone(self, name: str = 'dinov3_vith16plus', device=torch.device("cpu"),
+                     precision: str = 'fp32', checkpoint: Optional[str] = None) -> torch.nn.Module:
+        """
+        Get a DINOv3 backbone from the local hub repo.
+
+        Args:
+            name: Hub entrypoint, e.g. 'dinov3_vith16plus'.
+            device: torch.device to load onto.
+            precision: Weight precision.
+            checkpoint: Optional extra state dict (e.g. fine-tuned weights) applied
+                on top of the pretrained weights. Loaded as a separate instance.
+                Not supported with 'int8'.
+
+        Returns:
+            Backbone in eval mode. Shared; callers must not modify its weights.
+        """
+        _check_precision(precision, device)
+        if precision == 'int8' and checkpoint:
+            raise ValueError("Precision 'int8' does not support fine-tuned checkpoints")
+        device = torch.device(device)
+        key = ('backbone', name, str(device), precision, checkpoint)
+        weights_path = os.path.join(MODELS_DIR, BACKBONE_WEIGHTS[name])
+
+        def load():
+            if precision == 'int8':
+                path = quantized_backbone.cache_path(
+                    name, compiled_backbone.model_hash(name, weights_path, 'fp32')
+                )
+                return quantized_backbone.load_or_quantize(path, DINO_REPO, load_fp32).eval()
+            return load_fp32().to(device)
+
+        def load_fp32():
+            converted = weight_store.find_converted(weights_path)
+            if converted:
+                # Page the weights in lazily from the memory-mapped conversion.
+                model = build_with_weights(
+                    lambda: torch.hub.load(DINO_REPO, name, source='local', pretrained=False),
+                    weight_store.load_state_dict(converted),
+                )
+            else:
+                model = torch.hub.load(
+                    DINO_REPO,
+                    name,
+                    source='local',
+                    weights=weights_path
+                )
+            if checkpoint:
+                missing, unexpected = model.load_state_dict(
+                    torch.load(checkpoint, map_location="cpu"), strict=False
+                )
+                print("Missing", missing)
+                print("Unexpected", unexpected)
+            return model.eval()
+
+        return self._get_or_load(key, load)
+
+    def get_feature_extractor(self, name: str = 'dinov3_vith16plus', device=torch.device("cpu"),
+                              precision: str = 'fp32', execution: str = 'eager',
+                              input_size: Tuple[int, int] = (224, 224),
+                              batch_size: Optional[int] = None) -> torch.nn.Module:
+        """
+        Get a callable mapping an image batch to the backbone's CLS features.
+
+        Args:
+            name: Backbone name.
+            device: torch.device to run on.
+            precision: Weight precision.
+            execution: 'eager', 'compile', 'export' or 'onnx' (see compiled_backbone).
+            input_size: (height, width) of the input images; used by 'export' and 'onnx'.
+            batch_size: Batch size the artifact is compiled for; only used by 'export'.
+
+        Returns:
+            Feature extractor wrapping the registry's backbone instance.
+        """
+        _check_precision(precision, device)
+        device = torch.device(device)
+        if execution == 'export':
+            input_size = tuple(input_size)
+            batch_size = int(batch_size or 1)
+        elif execution == 'onnx':
+            # Exported with a dynamic batch axis.
+            input_size = tuple(input_size)
+            batch_size = None
+        else:
+            # Eager and torch.compile handle any input shape themselves.
+            input_size = batch_size = None
+        key = ('extractor', name, str(device), precision, execution, input_size, batch_size)
+
+        def load():
+            weights_hash = compiled_backbone.model_hash(
+                name, os.path.join(MODELS_DIR, BACKBONE_WEIGHTS[name]), precision
+            )
+            return compiled_backbone.build_extractor(
+                self.get_backbone(name, device, precision), execution, device, weights_hash,
+                name, precision, input_size, batch_size,
+            )
+
+        return self._get_or_load(key, load)
+
+    def get_head(self, name: str, device=torch.device("cpu"), precision: str = 'fp32') -> torch.nn.Module:
+        """
+        Get a LinearClassifier head ('binary' or 'species'). Heads always run
+        eagerly, whatever the backbone's execution mode (see compiled_backbone).
+
+        Returns:
+            LinearClassifier in eval mode.
+        """
+        _check_precision(precision, device)
+        device = torch.device(device)
+        key = ('head', name, str(device), precision)
+
+        def load():
+            from detection_dino import LinearClassifier
+            weights_file, out_dim, num_classes = HEADS[name]
+            head = build_with_weights(
+                lambda: LinearClassifier(out_dim, 1, False, num_classes),
+                weight_store.load_weights(os.path.join(MODELS_DIR, weights_file), map_location=device),
+            )
+            return head.to(device).eval()
+
+        return self._get_or_load(key, load)
+
+    def get_adapter(self, name: str = 'stoat_day_night', device=torch.device("cpu"),
+                    precision: str = 'fp32') -> torch.nn.Module:
+        """
+        Get the ReID CustomDino model: the shared backbone plus day/night adapters.
+
+        Returns:
+            CustomDino in eval mode, wrapping the registry's backbone instance.
+        """
+        _check_precision(precision, device)
+        device = torch.device(device)
+        key = ('adapter', name, str(device), precision)
+
+        def load():
+            from reid_v2 import CustomDino, load_reid_config
+            backbone_name, weights_file = ADAPTERS[name]
+            reid_cfg = load_reid_config()
+            dino_with_adapter = CustomDino(
+                reid_cfg,
+                dino_model=self.get_backbone(backbone_name, device, precision),
+                domains=[0],
+            )
+            checkpoint = weight_store.load_weights(os.path.join(MODELS_DIR, weights_file))
+            for k, v in list(checkpoint.items()):
+                if k.startswith("adapter_dict."):
+                    checkpoint[k[len("adapter_dict."):]] = v
+                    del checkpoint[k]
+            missing, unexpected = dino_with_adapter.adapter_dict.load_state_dict(
+                checkpoint, strict=False, assign=True
+            )
+            print("Missing", missing)
+            print("Unexpected", unexpected)
+            return dino_with_adapter.to(device).eval()
+
+        return self._get_or_load(key, load)
+
+    def memory_report(self) -> Dict[str, int]:
+        """
+        Resident bytes per loaded model.
+
+        Adapters and feature extractors report only their own weights; the
+        backbone they wrap is reported under its own key.
+        """
+        with self._lock:
+            report = {}
+            for key, model in self._models.items():
+                nbytes = module_nbytes(model)
+                if key[0] == 'adapter':
+                    nbytes -= module_nbytes(model.dino_model)
+                elif key[0] == 'extractor':
+                    backbone = self._models.get(('backbone',) + key[1:4] + (None,))
+                    if backbone is not None:
+                        nbytes -= module_nbytes(backbone)
+                report['/'.join(map(str, key))] = nbytes
+            return report
+
+    def evict(self, kind: Optional[str] = None, name: Optional[str] = None) -> int:
+        """
+        Drop loaded models so their memory can be reclaimed.
+
+        Args:
+            kind: 'backbone', 'head', 'adapter' or 'extractor'; None matches every kind.
+            name: Model name; None matches every name.
+
+        Evicting a backbone also evicts the adapters and feature extractors
+        built on it, since they would otherwise keep it alive.
+
+        Returns:
+            Number of models evicted.
+        """
+        with self._lock:
+            evicted = [key for key in self._models
+                       if (kind is None or key[0] == kind) and (name is None or key[1] == name)]
+            backbones = {(key[1], key[2], key[3]) for key in evicted if key[0] == 'backbone'}
+            for key in list(self._models):
+                if key in evicted:
+                    continue
+                if key[0] == 'adapter' and (ADAPTERS[key[1]][0], key[2], key[3]) in backbones:
+                    evicted.append(key)
+                elif key[0] == 'extractor' and (key[1], key[2], key[3]) in backbones:
+                    evicted.append(key)
+            for key in evicted:
+                del self._models[key]
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return len(evicted)
+
+
+_registry = ModelRegistry()
+
+
+def get_registry() -> ModelRegistry:
+    """The process-wide registry."""
+    return _registry
+
+
+def get_backbone(name: str = 'dinov3_vith16plus', device=torch.device("cpu"),
+                 precision: str = 'fp32', checkpoint: Optional[str] = None) -> torch.nn.Module:
+    return _registry.get_backbone(name, device, precision, checkpoint)
+
+
+def get_feature_extractor(name: str = 'dinov3_vith16plus', device=torch.device("cpu"),
+                          precision: str = 'fp32', execution: str = 'eager',
+                          input_size: Tuple[int, int] = (224, 224),
+                          batch_size: Optional[int] = None) -> torch.nn.Module:
+    return _registry.get_feature_extractor(name, device, precision, execution, input_size, batch_size)
+
+
+def get_head(name: str, device=torch.device("cpu"), precision: str = 'fp32') -> torch.nn.Module:
+    return _registry.get_head(name, device, precision)
+
+
+def get_adapter(name: str = 'stoat_day_night', device=torch.device("cpu"), precision: str = 'fp32') -> torch.nn.Module:
+    return _registry.get_adapter(name, device, precision)
+
+
+def memory_report() -> Dict[str, int]:
+    return _registry.memory_report()
+
+
+def evict(kind: Optional[str] = None, name: Optional[str] = None) -> int:
+    return _registry.evict(kind, name)
@@ -0,0 +1,96 @@
+"""
+ONNX Runtime execution of the DINOv3 CLS feature extractor.
+
+The extractor (get_intermediate_layers + CLS token) is exported to ONNX once
+per backbone, weights, torch version and input resolution, with a dynamic
+batch axis, and run with ONNX Runtime's CPU execution provider at full graph
+optimization. Its weights exceed protobuf's 2GB limit, so each export lives
+in its own directory under ~/.ml4sg-care/compile_cache with the weights
+stored as external data next to model.onnx.
+
+onnxruntime is optional; without it the 'onnx' execution mode falls back to
+eager PyTorch.
+
+    pip install onnxruntime
+"""
+
+import os
+import shutil
+
+import torch
+import torch.nn as nn
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+OPSET_VERSION = 17
+MODEL_FILENAME = "model.onnx"
+
+
+class OnnxRunner:
+    """Runs an ONNX Runtime session on torch tensors, returning features on the input's device."""
+
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def __call__(self, images):
+        outputs = self.session.run(None, {self.input_name: images.detach().float().cpu().numpy()})
+        return torch.from_numpy(outputs[0]).to(images.device)
+
+
+def export(extractor: nn.Module, export_dir: str, input_size):
+    """
+    Export a CPU extractor to export_dir/model.onnx for (height, width) = input_size.
+
+    The export is written to a temporary directory and renamed, so an
+    interrupted export is never picked up.
+    """
+    tmp_dir = export_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    example = torch.randn(1, 3, input_size[0], input_size[1])
+    with torch.no_grad():
+        torch.onnx.export(
+            extractor,
+            (example,),
+            os.path.join(tmp_dir, MODEL_FILENAME),
+            input_names=["images"],
+            output_names=["features"],
+            dynamic_axes={"images": {0: "batch"}, "features": {0: "batch"}},
+            opset_version=OPSET_VERSION,
+        )
+    os.replace(tmp_dir, export_dir)
+
+
+def load_session(model_path: str, intra_op_threads: int = 0):
+    """ONNX Runtime CPU session with every graph optimization enabled."""
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = intra_op_threads
+    return onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+
+def build_extractor(extractor: nn.Module, export_dir: str, input_size):
+    """
+    ONNX Runtime runner for the extractor, exporting it first if needed.
+
+    Returns:
+        OnnxRunner, or None if onnxruntime is missing or the export failed.
+    """
+    if onnxruntime is None:
+        print("Warning: onnxruntime is not installed, using eager execution", flush=True)
+        return None
+    model_path = os.path.join(export_dir, MODEL_FILENAME)
+    try:
+        if not os.path.exists(model_path):
+            print(f"Exporting backbone to ONNX for input {tuple(input_size)}, this may take a few minutes...",
+                  flush=True)
+            export(extractor, export_dir, input_size)
+            print(f"Saved ONNX backbone to {export_dir}", flush=True)
+        return OnnxRunner(load_session(model_path))
+    except Exception as e:
+        print(f"Warning: could not build ONNX backbone, using eager execution: {e}", flush=True)
+        return None
@@ -0,0 +1,91 @@
+"""
+INT8 dynamically quantized DINOv3 backbone for CPU inference.
+
+Dynamic quantization stores the backbone's Linear weights (attention qkv and
+projection, SwiGLU FFN; the bulk of its 840M parameters) as int8 and quantizes
+activations on the fly, which cuts memory roughly 4x and speeds up CPU
+matmuls. It only runs on CPU.
+
+Quantizing takes a while, so the result is cached under
+~/.ml4sg-care/quantized, keyed by backbone, weights and torch version.
+
+Usage:
+    backbone = model_registry.get_backbone('dinov3_vith16plus', 'cpu', precision='int8')
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+CACHE_DIR = os.path.join(Path.home(), ".ml4sg-care", "quantized")
+
+
+def cache_path(name: str, weights_hash: str) -> str:
+    torch_version = torch.__version__.replace("+", "_")
+    return os.path.join(CACHE_DIR, f"{name}-{weights_hash}-int8-torch{torch_version}.pt")
+
+
+def unmask_linears(model: nn.Module) -> nn.Module:
+    """
+    Replace Linear subclasses carrying a bias_mask with plain nn.Linear.
+
+    quantize_dynamic only swaps modules whose type is exactly nn.Linear, so
+    DINOv3's qkv projections (LinearKMaskedBias, which multiplies its bias by
+    a mask in forward) would stay fp32. Folding the mask into the bias gives
+    an equivalent plain Linear that can be quantized.
+    """
+    for parent in list(model.modules()):
+        for child_name, child in list(parent.named_children()):
+            if not isinstance(child, nn.Linear) or type(child) is nn.Linear:
+                continue
+            bias_mask = getattr(child, "bias_mask", None)
+            if bias_mask is None or child.bias is None:
+                continue
+            linear = nn.Linear(child.in_features, child.out_features,
+                               device=child.weight.device, dtype=child.weight.dtype)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight)
+                linear.bias.copy_(child.bias * bias_mask.to(child.bias.dtype))
+            setattr(parent, child_name, linear)
+    return model
+
+
+def quantize(model: nn.Module) -> nn.Module:
+    """Dynamically quantize a CPU fp32 model's Linear layers to int8."""
+    model = unmask_linears(model.cpu().eval())
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_or_quantize(path: str, repo_dir: str, load_fp32) -> nn.Module:
+    """
+    Load a cached int8 backbone, quantizing and caching it first if needed.
+
+    Args:
+        path: Cache file, from cache_path().
+        repo_dir: Local DINOv3 hub repo, needed on sys.path to unpickle the model.
+        load_fp32: Callable returning the fp32 backbone on CPU.
+    """
+    if os.path.exists(path):
+        sys.path.insert(0, repo_dir)
+        try:
+            return torch.load(path, map_location="cpu", weights_only=False)
+        except Exception as e:
+            print(f"Warning: could not load quantized backbone {path}, re-quantizing: {e}", flush=True)
+        finally:
+            sys.path.remove(repo_dir)
+
+    start_time = time.time()
+    model = quantize(load_fp32())
+    print(f"Quantized backbone to int8 in {time.time() - start_time:.2f} seconds", flush=True)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        torch.save(model, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        print(f"Saved quantized backbone to {path}", flush=True)
+    except OSError as e:
+        print(f"Warning: could not cache quantized backbone: {e}", flush=True)
+    return model
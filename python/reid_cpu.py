@@ -9,6 +9,7 @@ import torch
 import torch.nn.functional as F
 import torchvision.transforms as T
 
+import execution_plan
 from config import cfg
 from datetime import datetime
 from PIL import Image
@@ -301,7 +302,11 @@ def run(image_dir, json_dir, output_dir, reid_output_dir, log_dir = ''):
                 progress += 1
                 print(f"PROCESS: {progress}/{total_images}", flush=True)
 
-    num_threads = os.cpu_count() // 2 or 1
+    plan = execution_plan.plan_for('reid_cpu')
+    print(execution_plan.describe(plan), flush=True)
+    log_message(log_file, execution_plan.describe(plan))
+    execution_plan.apply(plan)
+    num_threads = min(plan['workers'], len(cropped_image_paths))
     indices = list(range(len(cropped_image_paths)))
     chunk_size = len(indices) // num_threads
     threads = []
@@ -8,8 +8,9 @@ import torch
 import torch.nn.functional as F
 import torchvision.transforms as T
 import torch.nn as nn
-from torch.amp import autocast
 
+import mixed_precision
+import model_registry
 from config import cfg
 from datetime import datetime
 from PIL import Image
@@ -95,7 +96,7 @@ class CustomDino(nn.Module):
 
         # Normalize mixed features for retrieval/metric learning
         mixed_features_norm = torch.nn.functional.normalize(mixed_features, dim=-1, eps=1e-6)
-        return mixed_features_norm
+        return mixed_features_norm.float()
 
 def create_log_file(log_dir: str = '') -> str:
     """
@@ -164,16 +165,12 @@ def create_linear_input(x_tokens_list, use_n_blocks, use_avgpool):
     return output
 
 def get_dino_with_adapter_embedding(model, image, device, is_day_list=None):
-    with torch.no_grad(), autocast(device_type=device.type, dtype=torch.float16, enabled=_fp16_supported(device)):
+    with torch.no_grad(), mixed_precision.inference_autocast(device):
         image = image.to(device)
         feature = model(image, is_day_list)
         feature = feature.to(device)
     return feature
 
-def _fp16_supported(device):
-    fp16_supported = device.type == "cuda" or (device.type == "mps" and torch.backends.mps.is_built())
-    return fp16_supported
-
 
 def compute_embeddings_batched(model, images, times, device, batch_size: int) -> np.ndarray:
     """
@@ -405,7 +402,6 @@ def run(image_dir, json_dir, output_dir, reid_output_dir, log_dir = '', batch_si
     log_file = create_log_file(log_dir)
     clear_cropped_folder(output_dir, log_file)
 
-    dino_backbone_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "dinov3_vith16plus_pretrain_lvd1689m-7c1da9a5.pth")
     adapter_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "DinoAdapter_Stoat_day_night_mixed_precision.pth.tar25")
     cfg_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "dinoadapter_inference.yaml")
 
@@ -432,15 +428,7 @@ def run(image_dir, json_dir, output_dir, reid_output_dir, log_dir = '', batch_si
 
     # Load the traced reid model.
     try:
-        repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dinov3")
-        dino_model = torch.hub.load(
-                        repo, 
-                        'dinov3_vith16plus', 
-                        source='local', 
-                        weights=dino_backbone_path
-                    )
-        dino_model = dino_model.to(DEVICE)
-        dino_model.eval()    # set the model in evaluation mode
+        dino_model = model_registry.get_backbone('dinov3_vith16plus', DEVICE)
 
         dino_with_adapter = CustomDino(
             cfg,
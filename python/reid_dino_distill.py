@@ -9,6 +9,7 @@ import torch.nn.functional as F
 import torchvision.transforms as T
 import torch.nn as nn
 
+import model_registry
 from config import cfg
 from datetime import datetime
 from PIL import Image
@@ -319,7 +320,6 @@ def run(image_dir, json_dir, output_dir, reid_output_dir, log_dir = ''):
     log_file = create_log_file(log_dir)
     clear_cropped_folder(output_dir, log_file)
 
-    zeroshot_model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "dinov3_vith16plus_pretrain_lvd1689m-7c1da9a5.pth")
     model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "dino_finetune_distill-weights-only.pth")
     cfg_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "dinodistill.yaml")
 
@@ -346,7 +346,6 @@ def run(image_dir, json_dir, output_dir, reid_output_dir, log_dir = ''):
 
     # Load the traced reid model.
     try:
-        repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dinov3")
         # dino_zeroshot_model = torch.hub.load(
         #                 repo, 
         #                 'dinov3_vith16plus', 
@@ -356,24 +355,17 @@ def run(image_dir, json_dir, output_dir, reid_output_dir, log_dir = ''):
         # dino_zeroshot_model = dino_zeroshot_model.to(DEVICE)
         # dino_zeroshot_model.eval()    # set the model in evaluation mode
 
+        # The fine-tuned weights are applied to a separate registry instance so
+        # the pretrained backbone shared with other pipelines stays untouched.
         dino_finetuned_model = DinoStudent(
             cfg,
-            student_backbone=torch.hub.load(
-                repo,
-                "dinov3_vith16plus",
-                source="local",
-                weights=zeroshot_model_path,
+            student_backbone=model_registry.get_backbone(
+                "dinov3_vith16plus", DEVICE, checkpoint=model_path
             ),
             dimention_student=1280,
             dimention_teacher=4096,
             num_classes_per_domain={"0": 22},
         )
-        checkpoint = torch.load(model_path, map_location="cpu")
-        missing, unexpected = dino_finetuned_model.backbone.load_state_dict(
-            checkpoint, strict=False
-        )
-        print("Missing", missing)
-        print("Unexpected", unexpected)
         dino_finetuned_model = dino_finetuned_model.to(DEVICE)
         dino_finetuned_model.eval()    # set the model in evaluation mode
     except Exception as e:
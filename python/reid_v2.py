@@ -11,7 +11,10 @@ Input JSON format:
         },
         ...
     ],
-    "output_path": "/path/to/output.json"
+    "output_path": "/path/to/output.json",
+    "execution": "eager",   // optional: backbone execution mode, "eager", "compile", "export" or "onnx"
+    "precision": "fp32",    // optional: backbone precision, "fp32" or "int8" (CPU only)
+    "prefetch_batches": 2   // optional: batches of crops decoded ahead of the model
 }
 
 Output JSON format:
@@ -30,6 +33,7 @@ Usage:
 """
 
 import json
+import math
 import numpy as np
 import os
 import sys
@@ -37,11 +41,17 @@ import torch
 import torch.nn.functional as F
 import torchvision.transforms as T
 import torch.nn as nn
-from torch.amp import autocast
 
+import batch_calibration
+import execution_plan
+import mixed_precision
+import model_registry
 from config import cfg
+from crop_loader import prefetch_map
+from frame_cache import EXIF_ORIENTATION, draft_reduction, oriented_size
+from job_journal import JobJournal, decode_array, encode_array
 from datetime import datetime
-from PIL import Image
+from PIL import Image, ImageOps
 from pathlib import Path
 
 
@@ -123,9 +133,10 @@ class CustomDino(nn.Module):
                 adapter_ratio * sub_adapter_features + (1 - adapter_ratio) * base_features
             )
 
-        # Normalize mixed features for retrieval/metric learning
+        # Normalize mixed features for retrieval/metric learning; float32 whatever
+        # the autocast dtype, so cached embeddings stay compatible
         mixed_features_norm = torch.nn.functional.normalize(mixed_features, dim=-1, eps=1e-6)
-        return mixed_features_norm
+        return mixed_features_norm.float()
     
     def forward_from_raw(self, base_features, time):
         """
@@ -174,7 +185,7 @@ class CustomDino(nn.Module):
         
         # Normalize mixed features for retrieval/metric learning
         mixed_features_norm = torch.nn.functional.normalize(mixed_features, dim=-1, eps=1e-6)
-        return mixed_features_norm
+        return mixed_features_norm.float()
 
 
 def create_linear_input(x_tokens_list, use_n_blocks, use_avgpool):
@@ -222,10 +233,23 @@ def load_and_crop_image(image_path, bbox):
     Returns:
         (tensor, is_day): Preprocessed image tensor and day/night flag.
     """
-    img = Image.open(image_path).convert("RGB")
+    img = Image.open(image_path)
+    x1, y1, x2, y2 = map(int, bbox)
+    
+    # Decode JPEGs at the smallest DCT scale that keeps the crop at least
+    # cfg.INPUT.SIZE, and scale the bbox to match. The bbox is in display
+    # orientation, so the EXIF orientation is applied before cropping.
+    reduction = draft_reduction([(x1, y1, x2, y2)], cfg.INPUT.SIZE)
+    if reduction > 1:
+        width, height = oriented_size(*img.size, img.getexif().get(EXIF_ORIENTATION))
+        img.draft('RGB', (math.ceil(img.size[0] / reduction), math.ceil(img.size[1] / reduction)))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    if reduction > 1:
+        scale_x, scale_y = img.size[0] / width, img.size[1] / height
+        x1, x2 = int(x1 * scale_x), int(x2 * scale_x)
+        y1, y2 = int(y1 * scale_y), int(y2 * scale_y)
     
     # Crop the image using bbox
-    x1, y1, x2, y2 = map(int, bbox)
     cropped_img = img.crop((x1, y1, x2, y2))
     
     # Check day/night on cropped image
@@ -242,13 +266,8 @@ def load_and_crop_image(image_path, bbox):
     return image, is_day
 
 
-def _fp16_supported(device):
-    fp16_supported = device.type == "cuda" or (device.type == "mps" and torch.backends.mps.is_built())
-    return fp16_supported
-
-
 def get_dino_with_adapter_embedding(model, image, device, is_day_list=None):
-    with torch.no_grad(), autocast(device_type=device.type, dtype=torch.float16, enabled=_fp16_supported(device)):
+    with torch.no_grad(), mixed_precision.inference_autocast(device):
         image = image.to(device)
         feature = model(image, is_day_list)
         feature = feature.to(device)
@@ -361,6 +380,55 @@ def process_dist_mat_v2(dist_mat):
     return output_dict
 
 
+def select_device():
+    """Pick the best available device: CUDA, then Apple MPS, then CPU."""
+    if torch.cuda.is_available():
+        device = torch.device("cuda")
+        print(f"Using GPU: {torch.cuda.get_device_name(0)}", flush=True)
+    elif torch.backends.mps.is_available():
+        device = torch.device("mps")
+        print("Using Apple Silicon GPU", flush=True)
+    else:
+        device = torch.device("cpu")
+        print("Using CPU. Note: Using CPU may be slow.", flush=True)
+    return device
+
+
+def load_reid_config():
+    """
+    Merge the DinoAdapter inference yaml into the global cfg.
+
+    The yacs cfg is frozen after the first merge, so this is a no-op when
+    called again in the same process.
+    """
+    if cfg.is_frozen():
+        return cfg
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    cfg_file_path = os.path.join(script_dir, "models", "dinoadapter_inference.yaml")
+    cfg.set_new_allowed(True)
+    cfg.merge_from_file(cfg_file_path)
+    cfg.merge_from_list([])
+    cfg.freeze()
+    return cfg
+
+
+def load_reid_model(device, precision='fp32'):
+    """
+    Get the DINOv3 backbone wrapped with the day/night adapters.
+
+    The backbone comes from the process-wide registry and is shared with
+    detection when both run in the same process.
+
+    Args:
+        device: torch.device to load onto.
+        precision: Backbone precision, 'fp32' or 'int8' (CPU only).
+
+    Returns:
+        CustomDino in eval mode.
+    """
+    return model_registry.get_adapter('stoat_day_night', device, precision)
+
+
 def format_output_with_detection_ids(detection_ids, cluster_dict):
     """
     Format output with detection IDs instead of file paths.
@@ -374,9 +442,18 @@ def format_output_with_detection_ids(detection_ids, cluster_dict):
     return {"individuals": individuals}
 
 
-def run(input_json_path: str, batch_size: int = 4):
+def run(input_json_path: str, batch_size: int = None, model=None, resume: bool = False):
     """
     Main entry point for reid_v2.
+
+    Args:
+        input_json_path: Path to the input JSON described in the module docstring.
+        batch_size: Batch size for inference; by default the calibrated size
+            for this machine (see batch_calibration).
+        model: Optional preloaded CustomDino from load_reid_model(), used by the
+            persistent worker so the backbone and adapters are not reloaded per job.
+        resume: Reuse the embeddings an interrupted run with the same output_path
+            already computed (journaled in output_path + ".journal").
     """
     print("STATUS: BEGIN", flush=True)
     
@@ -388,6 +465,10 @@ def run(input_json_path: str, batch_size: int = 4):
     output_path = input_data['output_path']
     db_path = input_data.get('db_path')  # Optional: for embedding cache
     species = input_data.get('species', 'unknown')
+    from config.config import BACKBONE_EXECUTION, BACKBONE_PRECISION, CROP_PREFETCH_BATCHES
+    execution = input_data.get('execution', BACKBONE_EXECUTION)
+    precision = input_data.get('precision', BACKBONE_PRECISION)
+    prefetch_batches = int(input_data.get('prefetch_batches', CROP_PREFETCH_BATCHES))
     
     # Initialize embedding cache if db_path provided
     cache = None
@@ -416,58 +497,34 @@ def run(input_json_path: str, batch_size: int = 4):
         print("STATUS: DONE", flush=True)
         return
     
-    # Setup paths
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    dino_backbone_path = os.path.join(script_dir, "models", "dinov3_vith16plus_pretrain_lvd1689m-7c1da9a5.pth")
-    adapter_path = os.path.join(script_dir, "models", "DinoAdapter_Stoat_day_night_mixed_precision.pth.tar25")
-    cfg_file_path = os.path.join(script_dir, "models", "dinoadapter_inference.yaml")
-    
     # Set the device to GPU if available, otherwise use CPU.
-    if torch.cuda.is_available():
-        DEVICE = torch.device("cuda")
-        print(f"Using GPU: {torch.cuda.get_device_name(0)}", flush=True)
-    elif torch.backends.mps.is_available():
-        DEVICE = torch.device("mps")
-        print("Using Apple Silicon GPU", flush=True)
+    if model is None:
+        DEVICE = select_device()
     else:
-        DEVICE = torch.device("cpu")
-        print("Using CPU. Note: Using CPU may be slow.", flush=True)
-    
-    # Read and import the cfg file.
-    cfg.set_new_allowed(True)
-    cfg.merge_from_file(cfg_file_path)
-    cfg.merge_from_list([])
-    cfg.freeze()
-    
-    # Load the model
-    print("Loading model...", flush=True)
-    repo = os.path.join(script_dir, "dinov3")
-    dino_model = torch.hub.load(
-        repo, 
-        'dinov3_vith16plus', 
-        source='local', 
-        weights=dino_backbone_path
-    )
-    dino_model = dino_model.to(DEVICE)
-    dino_model.eval()
-
-    dino_with_adapter = CustomDino(
-        cfg,
-        dino_model=dino_model,
-        domains=[0],
-    )
-    checkpoint = torch.load(adapter_path, map_location="cpu")
-    for k, v in list(checkpoint.items()):
-        if k.startswith("adapter_dict."):
-            checkpoint[k[len("adapter_dict."):]] = v
-            del checkpoint[k]
-    missing, unexpected = dino_with_adapter.adapter_dict.load_state_dict(
-        checkpoint, strict=False
-    )
-    print("Missing", missing)
-    print("Unexpected", unexpected)
-    dino_with_adapter = dino_with_adapter.to(DEVICE)
-    dino_with_adapter.eval()
+        DEVICE = next(model.parameters()).device
+    precision = model_registry.resolve_precision(precision, DEVICE)
+    plan = execution_plan.plan_for('reid_v2', DEVICE)
+    execution_plan.apply(plan)
+    print(execution_plan.describe(plan), flush=True)
+    if model is None or precision != 'fp32':
+        print("Loading model...", flush=True)
+        dino_with_adapter = load_reid_model(DEVICE, precision)
+    else:
+        dino_with_adapter = model
+
+    if batch_size is None:
+        batch_size = batch_calibration.get_batch_size(DEVICE, tuple(cfg.INPUT.SIZE), precision, default=4)
+    batch_size = int(batch_size)
+    print(f"Batch size: {batch_size}", flush=True)
+
+    # Non-eager modes run the backbone through a compiled CLS feature extractor
+    # and apply the adapters on its output.
+    feature_extractor = None
+    if execution != 'eager':
+        feature_extractor = model_registry.get_feature_extractor(
+            'dinov3_vith16plus', DEVICE, precision=precision, execution=execution,
+            input_size=tuple(cfg.INPUT.SIZE), batch_size=batch_size,
+        )
     
     print("STATUS: PROCESSING", flush=True)
     
@@ -481,176 +538,216 @@ def run(input_json_path: str, batch_size: int = 4):
     # 2. Have dinov3_raw but not dinov3_reid (run adapter only)
     # 3. Have neither (run full model)
     
-    cached_reid = {}      # key -> numpy array (final embeddings)
-    has_raw = []          # [(idx, det, raw_embedding)] - needs adapter only
-    needs_full = []       # [(idx, det)] - needs full model
-    detection_ids = []
+    # Computed embeddings are also journaled next to the output, so an
+    # interrupted job can be resumed without recomputing them.
+    journal = JobJournal(output_path + ".journal", resume)
+    try:
+        journaled = journal.entries('embedding')
     
-    total = len(detections)
-    print(f"Checking cache for {total} detections...", flush=True)
+        cached_reid = {}      # key -> numpy array (final embeddings)
+        journal_embeddings = {}  # idx -> numpy array (computed by the interrupted run)
+        has_raw = []          # [(idx, det, raw_embedding)] - needs adapter only
+        needs_full = []       # [(idx, det)] - needs full model
+        detection_ids = []
     
-    for i, det in enumerate(detections):
-        detection_ids.append(det['detection_id'])
+        total = len(detections)
+        print(f"Checking cache for {total} detections...", flush=True)
+    
+        for i, det in enumerate(detections):
+            detection_ids.append(det['detection_id'])
         
-        if cache and 'image_id' in det:
-            image_id = det['image_id']
-            bbox = det['bbox']
-            key = f"{image_id}:{cache.bbox_to_hash(bbox)}"
-            
-            # First check: do we have final reid embedding?
-            reid_emb = cache.get_embedding(image_id, bbox, reid_embedding_type)
-            if reid_emb is not None:
-                cached_reid[key] = reid_emb
+            if str(det['detection_id']) in journaled:
+                journal_embeddings[i] = decode_array(journaled[str(det['detection_id'])])
                 continue
+        
+            if cache and 'image_id' in det:
+                image_id = det['image_id']
+                bbox = det['bbox']
+                key = f"{image_id}:{cache.bbox_to_hash(bbox)}"
             
-            # Second check: do we have raw embedding from classification?
-            raw_emb = cache.get_embedding(image_id, bbox, raw_embedding_type)
-            if raw_emb is not None:
-                has_raw.append((i, det, raw_emb))
-                continue
+                # First check: do we have final reid embedding?
+                reid_emb = cache.get_embedding(image_id, bbox, reid_embedding_type)
+                if reid_emb is not None:
+                    cached_reid[key] = reid_emb
+                    continue
+            
+                # Second check: do we have raw embedding from classification?
+                raw_emb = cache.get_embedding(image_id, bbox, raw_embedding_type)
+                if raw_emb is not None:
+                    has_raw.append((i, det, raw_emb))
+                    continue
         
-        # Need full model
-        needs_full.append((i, det))
+            # Need full model
+            needs_full.append((i, det))
     
-    print(f"Cache status: {len(cached_reid)} reid cached, {len(has_raw)} have raw (adapter only), {len(needs_full)} need full model", flush=True)
+        if journal_embeddings:
+            print(f"Resuming: {len(journal_embeddings)} embeddings already computed", flush=True)
+        print(f"Cache status: {len(cached_reid)} reid cached, {len(has_raw)} have raw (adapter only), {len(needs_full)} need full model", flush=True)
     
-    # Process items that have dinov3_raw (adapter only - FAST)
-    raw_embeddings = {}  # idx -> numpy array
-    if has_raw:
-        print(f"Running adapter on {len(has_raw)} cached raw embeddings...", flush=True)
+        # Process items that have dinov3_raw (adapter only - FAST)
+        raw_embeddings = {}  # idx -> numpy array
+        if has_raw:
+            print(f"Running adapter on {len(has_raw)} cached raw embeddings...", flush=True)
         
-        for batch_start in range(0, len(has_raw), batch_size):
-            batch_items = has_raw[batch_start:batch_start + batch_size]
+            for batch_start in range(0, len(has_raw), batch_size):
+                batch_items = has_raw[batch_start:batch_start + batch_size]
             
-            # Prepare batch
-            raw_tensors = []
-            is_day_list = []
-            batch_info = []  # (idx, det)
+                # Prepare batch
+                raw_tensors = []
+                is_day_list = []
+                batch_info = []  # (idx, det)
             
-            for idx, det, raw_emb in batch_items:
-                raw_tensors.append(torch.from_numpy(raw_emb))
-                # Get day/night from image
-                try:
-                    _, is_day = load_and_crop_image(det['image_path'], det['bbox'])
-                    is_day_list.append(is_day)
-                except:
-                    is_day_list.append(1)  # Default to day if error
-                batch_info.append((idx, det))
+                for idx, det, raw_emb in batch_items:
+                    raw_tensors.append(torch.from_numpy(raw_emb))
+                    # Get day/night from image
+                    try:
+                        _, is_day = load_and_crop_image(det['image_path'], det['bbox'])
+                        is_day_list.append(is_day)
+                    except:
+                        is_day_list.append(1)  # Default to day if error
+                    batch_info.append((idx, det))
             
-            # Stack and process through adapter only
-            batch_tensor = torch.stack(raw_tensors).to(DEVICE)
+                # Stack and process through adapter only
+                batch_tensor = torch.stack(raw_tensors).to(DEVICE)
             
-            with torch.no_grad(), autocast(device_type=DEVICE.type, dtype=torch.float16, enabled=_fp16_supported(DEVICE)):
-                reid_features = dino_with_adapter.forward_from_raw(batch_tensor, is_day_list)
-                reid_features_np = reid_features.cpu().float().numpy()
+                with torch.no_grad(), mixed_precision.inference_autocast(DEVICE, precision=precision):
+                    reid_features = dino_with_adapter.forward_from_raw(batch_tensor, is_day_list)
+                    reid_features_np = reid_features.cpu().float().numpy()
             
-            # Save on-the-fly and store results
-            items_to_store = []
-            for k, (idx, det) in enumerate(batch_info):
-                raw_embeddings[idx] = reid_features_np[k]
-                if cache and 'image_id' in det:
-                    items_to_store.append((det['image_id'], det['bbox'], reid_features_np[k]))
+                # Save on-the-fly and store results
+                items_to_store = []
+                for k, (idx, det) in enumerate(batch_info):
+                    raw_embeddings[idx] = reid_features_np[k]
+                    journal.record('embedding', str(det['detection_id']), encode_array(reid_features_np[k]))
+                    if cache and 'image_id' in det:
+                        items_to_store.append((det['image_id'], det['bbox'], reid_features_np[k]))
             
-            if items_to_store and cache:
-                cache.store_embeddings_batch(items_to_store, reid_embedding_type)
+                if items_to_store and cache:
+                    cache.store_embeddings_batch(items_to_store, reid_embedding_type)
             
-            processed = min(batch_start + batch_size, len(has_raw))
-            print(f"ADAPTER: {processed}/{len(has_raw)}", flush=True)
+                processed = min(batch_start + batch_size, len(has_raw))
+                print(f"ADAPTER: {processed}/{len(has_raw)}", flush=True)
     
-    # Process items that need full model (SLOW)
-    full_embeddings = {}  # idx -> numpy array
-    if needs_full:
-        print(f"Running full model on {len(needs_full)} images...", flush=True)
+        # Process items that need full model (SLOW)
+        full_embeddings = {}  # idx -> numpy array
+        if needs_full:
+            print(f"Running full model on {len(needs_full)} images...", flush=True)
+        
+            def prepare_crop(item):
+                # Runs on loader threads; errors are returned and reported in order below.
+                idx, det = item
+                try:
+                    return idx, det, load_and_crop_image(det['image_path'], det['bbox'])
+                except Exception as e:
+                    return idx, det, e
         
-        for batch_start in range(0, len(needs_full), batch_size):
-            batch_items = needs_full[batch_start:batch_start + batch_size]
+            # Decode and crop the next batches while the model runs on this one
+            prepared_crops = prefetch_map(prepare_crop, needs_full, plan['decode_threads'],
+                                          prefetch_batches * batch_size)
+            for batch_start in range(0, len(needs_full), batch_size):
+                batch_items = needs_full[batch_start:batch_start + batch_size]
             
-            # Load and prepare batch
-            images = []
-            is_day_list = []
-            batch_info = []  # (idx, det)
+                # Collect the prepared batch
+                images = []
+                is_day_list = []
+                batch_info = []  # (idx, det)
             
-            for idx, det in batch_items:
-                try:
-                    img, is_day = load_and_crop_image(det['image_path'], det['bbox'])
+                for _ in batch_items:
+                    idx, det, result = next(prepared_crops)
+                    if isinstance(result, Exception):
+                        print(f"Error loading {det['image_path']}: {result}", flush=True)
+                        # Mark as failed
+                        detection_ids[detection_ids.index(det['detection_id'])] = None
+                        continue
+                    img, is_day = result
                     images.append(img)
                     is_day_list.append(is_day)
                     batch_info.append((idx, det))
-                except Exception as e:
-                    print(f"Error loading {det['image_path']}: {e}", flush=True)
-                    # Mark as failed
-                    detection_ids[detection_ids.index(det['detection_id'])] = None
             
-            if not images:
-                continue
+                if not images:
+                    continue
             
-            # Stack and process through full model
-            batch_tensor = torch.cat(images, dim=0).to(DEVICE)
+                # Stack and process through full model
+                batch_tensor = torch.cat(images, dim=0).to(DEVICE)
             
-            with torch.no_grad(), autocast(device_type=DEVICE.type, dtype=torch.float16, enabled=_fp16_supported(DEVICE)):
-                reid_features = dino_with_adapter(batch_tensor, is_day_list)
-                reid_features_np = reid_features.cpu().float().numpy()
+                with torch.no_grad(), mixed_precision.inference_autocast(DEVICE, precision=precision):
+                    if feature_extractor is None:
+                        reid_features = dino_with_adapter(batch_tensor, is_day_list)
+                    else:
+                        reid_features = dino_with_adapter.forward_from_raw(feature_extractor(batch_tensor), is_day_list)
+                    reid_features_np = reid_features.cpu().float().numpy()
             
-            # Save on-the-fly and store results
-            items_to_store = []
-            for k, (idx, det) in enumerate(batch_info):
-                full_embeddings[idx] = reid_features_np[k]
-                if cache and 'image_id' in det:
-                    items_to_store.append((det['image_id'], det['bbox'], reid_features_np[k]))
+                # Save on-the-fly and store results
+                items_to_store = []
+                for k, (idx, det) in enumerate(batch_info):
+                    full_embeddings[idx] = reid_features_np[k]
+                    journal.record('embedding', str(det['detection_id']), encode_array(reid_features_np[k]))
+                    if cache and 'image_id' in det:
+                        items_to_store.append((det['image_id'], det['bbox'], reid_features_np[k]))
             
-            if items_to_store and cache:
-                cache.store_embeddings_batch(items_to_store, reid_embedding_type)
+                if items_to_store and cache:
+                    cache.store_embeddings_batch(items_to_store, reid_embedding_type)
             
-            processed = min(batch_start + batch_size, len(needs_full))
-            print(f"PROCESS: {processed}/{len(needs_full)}", flush=True)
+                processed = min(batch_start + batch_size, len(needs_full))
+                print(f"PROCESS: {processed}/{len(needs_full)}", flush=True)
     
-    # Remove failed detection_ids
-    detection_ids = [d for d in detection_ids if d is not None]
+        # Remove failed detection_ids
+        detection_ids = [d for d in detection_ids if d is not None]
     
-    # Combine cached and new embeddings in original order
-    all_embeddings = []
-    for i, det in enumerate(detections):
-        if det['detection_id'] not in detection_ids:
-            continue  # This detection failed to load
+        # Combine cached and new embeddings in original order
+        all_embeddings = []
+        for i, det in enumerate(detections):
+            if det['detection_id'] not in detection_ids:
+                continue  # This detection failed to load
         
-        # Check cached_reid first (from previous ReID runs)
-        if cache and 'image_id' in det:
-            key = f"{det['image_id']}:{cache.bbox_to_hash(det['bbox'])}"
-            if key in cached_reid:
-                all_embeddings.append(cached_reid[key])
+            # Check cached_reid first (from previous ReID runs)
+            if cache and 'image_id' in det:
+                key = f"{det['image_id']}:{cache.bbox_to_hash(det['bbox'])}"
+                if key in cached_reid:
+                    all_embeddings.append(cached_reid[key])
+                    continue
+        
+            # Check journal_embeddings (from the interrupted run being resumed)
+            if i in journal_embeddings:
+                all_embeddings.append(journal_embeddings[i])
                 continue
         
-        # Check raw_embeddings (from adapter-only processing)
-        if i in raw_embeddings:
-            all_embeddings.append(raw_embeddings[i])
-            continue
+            # Check raw_embeddings (from adapter-only processing)
+            if i in raw_embeddings:
+                all_embeddings.append(raw_embeddings[i])
+                continue
         
-        # Check full_embeddings (from full model processing)
-        if i in full_embeddings:
-            all_embeddings.append(full_embeddings[i])
-            continue
-    
-    if len(all_embeddings) == 0:
-        print("No valid embeddings after processing. Exiting.", flush=True)
-        output = {"individuals": []}
-        with open(output_path, 'w') as f:
-            json.dump(output, f, indent=2)
-        print("STATUS: DONE", flush=True)
-        return
+            # Check full_embeddings (from full model processing)
+            if i in full_embeddings:
+                all_embeddings.append(full_embeddings[i])
+                continue
     
-    embeddings = np.stack(all_embeddings, axis=0)
+        if len(all_embeddings) == 0:
+            print("No valid embeddings after processing. Exiting.", flush=True)
+            output = {"individuals": []}
+            with open(output_path, 'w') as f:
+                json.dump(output, f, indent=2)
+            journal.finish()
+            print("STATUS: DONE", flush=True)
+            return
     
-    distance_mat = compute_distance_matrix(embeddings)
+        embeddings = np.stack(all_embeddings, axis=0)
     
-    id_dict = process_dist_mat_v2(distance_mat)
+        distance_mat = compute_distance_matrix(embeddings)
     
-    # Format output with detection IDs
-    output = format_output_with_detection_ids(detection_ids, id_dict)
+        id_dict = process_dist_mat_v2(distance_mat)
     
-    # Write output
-    with open(output_path, 'w') as f:
-        json.dump(output, f, indent=2)
+        # Format output with detection IDs
+        output = format_output_with_detection_ids(detection_ids, id_dict)
     
+        # Write output
+        with open(output_path, 'w') as f:
+            json.dump(output, f, indent=2)
+    except BaseException:
+        # Also on SIGINT/SIGTERM (SystemExit): keep what was journaled so far.
+        journal.close()
+        raise
+    journal.finish()
     print(f"Identified {len(output['individuals'])} individuals", flush=True)
     print("STATUS: DONE", flush=True)
 
@@ -661,5 +758,5 @@ if __name__ == "__main__":
         sys.exit(1)
     
     input_json_path = sys.argv[1]
-    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else None
     run(input_json_path, batch_size)
@@ -0,0 +1,82 @@
+"""
+Streaming NDJSON result sink.
+
+Detection results used to exist only as one pretty-printed JSON file per
+image, written after the whole job. The sink appends one compact JSON object
+per image to a single file as soon as the image is done:
+
+    {"image": "IMG_0001.JPG", "filepath": "/photos/IMG_0001.JPG", "boxes": [...]}
+
+Lines are flushed immediately and fsynced every FSYNC_EVERY lines or
+FSYNC_SECONDS, so a reader can ingest the file while the job runs and a crash
+loses at most the last few results. A new job starts the file afresh; a
+resumed job (resume=True) appends to it, and if an image appears more than
+once the last line wins.
+
+Usage:
+    with NdjsonResultSink(os.path.join(json_output_dir, RESULTS_NDJSON_NAME)) as sink:
+        sink.write(record)
+"""
+
+import json
+import os
+import threading
+import time
+
+RESULTS_NDJSON_NAME = "detection_results.ndjson"
+FSYNC_EVERY = 100
+FSYNC_SECONDS = 5.0
+
+
+class NdjsonResultSink:
+    """Thread-safe append-only writer of one JSON object per line."""
+
+    def __init__(self, path: str, fsync_every: int = FSYNC_EVERY, fsync_seconds: float = FSYNC_SECONDS,
+                 resume: bool = False):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        if resume and self._file.tell() and not _ends_with_newline(path):
+            # Terminate a line cut short by a crash so the next record starts on its own.
+            self._file.write("\n")
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.count = 0
+
+    def write(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            self._sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
@@ -0,0 +1,73 @@
+"""
+Import-time accounting for `main.py --startup-report`.
+
+Wraps `builtins.__import__` while active and records, for every top-level
+package loaded for the first time, the cumulative time spent importing it and
+its self time (cumulative minus the packages it pulled in). Used to track
+cold-start regressions, especially in the PyInstaller bundle where imports
+are noticeably slower than in a venv.
+"""
+
+import builtins
+import importlib
+import sys
+import time
+
+
+class ImportTimer:
+    """Context manager recording first-import times of top-level packages."""
+
+    def __init__(self):
+        self.timings = {}  # name -> [cumulative_seconds, self_seconds]
+        self._stack = []  # [[name, start_time, child_seconds]]
+        self._original_import = None
+
+    def __enter__(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        builtins.__import__ = self._original_import
+        return False
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        top_level = name.partition('.')[0]
+        # Only time absolute imports of packages that are not loaded yet;
+        # everything else is a cheap sys.modules lookup.
+        if level != 0 or not top_level or top_level in sys.modules or top_level in self.timings:
+            return self._original_import(name, globals, locals, fromlist, level)
+        return self._timed(top_level, self._original_import, name, globals, locals, fromlist, level)
+
+    def _timed(self, key, fn, *args):
+        self.timings[key] = [0.0, 0.0]
+        self._stack.append([key, time.perf_counter(), 0.0])
+        try:
+            module = fn(*args)
+        except ImportError:
+            # Optional/platform imports probed with try/except are not part of startup.
+            self._stack.pop()
+            del self.timings[key]
+            raise
+        _, start_time, child_seconds = self._stack.pop()
+        elapsed = time.perf_counter() - start_time
+        self.timings[key] = [elapsed, elapsed - child_seconds]
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        return module
+
+    def import_module(self, name):
+        """importlib.import_module, timed (importlib bypasses builtins.__import__)."""
+        if name in sys.modules:
+            return sys.modules[name]
+        return self._timed(name, importlib.import_module, name)
+
+    def print_report(self, min_seconds=0.01):
+        total = sum(self_time for _, self_time in self.timings.values())
+        print(f"STARTUP: imported {len(self.timings)} top-level packages in {total:.3f}s", flush=True)
+        print(f"STARTUP: {'module':<32} {'cumulative':>10} {'self':>10}", flush=True)
+        ordered = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (cumulative, self_time) in ordered:
+            if cumulative < min_seconds:
+                continue
+            print(f"STARTUP: {name:<32} {cumulative:>9.3f}s {self_time:>9.3f}s", flush=True)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the pipeline modules the way main.py does, from python/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import PIL.Image
+
+from blank_prefilter import find_probable_blanks
+
+EXIF_MAKE = 0x010F
+BASE_TIME = 1_700_000_000
+
+
+def _write_jpeg(path, pixels, mtime, make=None):
+    exif = PIL.Image.Exif()
+    if make is not None:
+        exif[EXIF_MAKE] = make
+    PIL.Image.fromarray(pixels).save(path, exif=exif.tobytes())
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def _scene():
+    return (np.random.default_rng(0).random((480, 640)) * 200).astype(np.uint8)
+
+
+def _with_animal(scene):
+    frame = scene.copy()
+    frame[200:280, 300:400] = 255
+    return frame
+
+
+def test_warmup_animal_is_not_baked_into_background(tmp_path):
+    scene = _scene()
+    frames = [_with_animal(scene), scene, scene, _with_animal(scene), scene]
+    paths = [_write_jpeg(tmp_path / f"{i}.jpg", frame, BASE_TIME + 60 * i) for i, frame in enumerate(frames)]
+    blanks = find_probable_blanks(paths)
+    # Frames 0-2 are warm-up; the animal returning in frame 3 is not a blank.
+    assert blanks == [paths[4]]
+
+
+def test_mixed_exif_in_one_folder(tmp_path):
+    scene = _scene()
+    paths = [
+        _write_jpeg(tmp_path / f"{i}.jpg", scene, BASE_TIME + 60 * i, make="Browning" if i % 2 else None)
+        for i in range(8)
+    ] + [str(tmp_path / "missing.jpg")]
+    blanks = find_probable_blanks(paths)
+    # Two sequences (with and without Make) of four frames; the last one of each is past warm-up.
+    assert blanks == [paths[6], paths[7]]
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import PIL.Image
+
+from burst_dedup import capture_info, group_bursts
+
+EXIF_MAKE = 0x010F
+
+
+def _write_jpeg(path, pixels, make=None, mtime=1_700_000_000):
+    exif = PIL.Image.Exif()
+    if make is not None:
+        exif[EXIF_MAKE] = make
+    PIL.Image.fromarray(pixels).save(path, exif=exif.tobytes())
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def _scene(seed=0):
+    return (np.random.default_rng(seed).random((120, 160, 3)) * 255).astype(np.uint8)
+
+
+def test_capture_info_missing_exif_is_orderable(tmp_path):
+    with_make = _write_jpeg(tmp_path / "a.jpg", _scene(), make="Browning")
+    without_make = _write_jpeg(tmp_path / "b.jpg", _scene())
+    sources = [capture_info(with_make)[0], capture_info(without_make)[0]]
+    assert sources[1][1] == ('', '', '')
+    assert sorted(sources)
+
+
+def test_group_bursts_mixed_exif(tmp_path):
+    scene = _scene()
+    paths = [
+        _write_jpeg(tmp_path / "0.jpg", scene, make="Browning"),
+        _write_jpeg(tmp_path / "1.jpg", scene, mtime=1_700_000_002),
+        _write_jpeg(tmp_path / "2.jpg", scene, make="Browning", mtime=1_700_000_003),
+    ]
+    groups = group_bursts(paths)
+    # Different cameras never share a burst; same camera within the window does.
+    assert groups == {paths[0]: [paths[2]], paths[1]: []}
+
+
+def test_group_bursts_without_exif(tmp_path):
+    scene = _scene()
+    paths = [
+        _write_jpeg(tmp_path / "0.jpg", scene),
+        _write_jpeg(tmp_path / "1.jpg", scene, mtime=1_700_000_001),
+        _write_jpeg(tmp_path / "2.jpg", _scene(1), mtime=1_700_000_002),
+        _write_jpeg(tmp_path / "3.jpg", scene, mtime=1_700_000_100),
+        str(tmp_path / "missing.jpg"),
+    ]
+    groups = group_bursts(paths)
+    assert groups == {paths[0]: [paths[1]], paths[2]: [], paths[3]: [], paths[4]: []}
@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("torch")
+
+import execution_plan  # noqa: E402
+
+
+def _fake_topology(root, siblings):
+    for cpu, cpu_list in siblings.items():
+        topology = root / f"cpu{cpu}" / "topology"
+        topology.mkdir(parents=True)
+        (topology / "thread_siblings_list").write_text(cpu_list + "\n")
+    return str(root)
+
+
+def test_workers_get_whole_physical_cores(tmp_path):
+    # Siblings numbered apart (0/4, 1/5) and adjacent (2-3)
+    sysfs = _fake_topology(tmp_path, {0: "0,4", 1: "1,5", 2: "2-3", 3: "2-3", 4: "0,4", 5: "1,5"})
+    cpus = [0, 1, 2, 3, 4, 5]
+    groups = execution_plan.physical_core_groups(cpus, sysfs)
+    assert groups == [(0, 4), (1, 5), (2, 3)]
+
+    plan = {'cpus': cpus, 'processes': 3}
+    assert [execution_plan.worker_cpus(plan, i, groups) for i in range(3)] == [[0, 4], [1, 5], [2, 3]]
+
+
+def test_core_groups_without_topology(tmp_path):
+    assert execution_plan.physical_core_groups([2, 0, 1], str(tmp_path)) == [(0,), (1,), (2,)]
@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+import PIL.Image
+
+from frame_cache import EXIF_ORIENTATION, FrameCache, decode_rgb, header_size, oriented_size
+
+
+def _write_jpeg(path, width, height, orientation=None):
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, :width // 4] = 255  # Bright band on the stored left edge
+    image = PIL.Image.fromarray(pixels)
+    exif = PIL.Image.Exif()
+    if orientation is not None:
+        exif[EXIF_ORIENTATION] = orientation
+    image.save(path, exif=exif.tobytes())
+    return str(path)
+
+
+def test_oriented_size_swaps_rotated_orientations():
+    assert oriented_size(640, 480, None) == (640, 480)
+    assert oriented_size(640, 480, 3) == (640, 480)
+    for orientation in (5, 6, 7, 8):
+        assert oriented_size(640, 480, orientation) == (480, 640)
+
+
+def test_decode_matches_cv2_for_rotated_jpeg(tmp_path):
+    path = _write_jpeg(tmp_path / "rotated.jpg", 64, 32, orientation=6)
+
+    frame = decode_rgb(path)
+    assert frame.shape[:2] == (64, 32)
+    assert header_size(path) == (32, 64)
+    expected = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+    assert np.abs(frame.astype(int) - expected.astype(int)).mean() < 4
+
+    # Orientation 6 rotates clockwise: the stored left edge ends up on top
+    assert frame[:8].mean() > 200 and frame[-8:].mean() < 50
+    assert decode_rgb(path, 2).shape[:2] == (32, 16)
+
+
+def test_image_size_is_in_display_orientation(tmp_path):
+    path = _write_jpeg(tmp_path / "rotated.jpg", 64, 32, orientation=8)
+    plain = _write_jpeg(tmp_path / "plain.jpg", 64, 32)
+
+    frame_cache = FrameCache(2**20)
+    assert frame_cache.image_size(path) == (32, 64)
+    assert frame_cache.image_size(plain) == (64, 32)
+    frame = frame_cache.get(path)
+    assert frame_cache.image_size(path) == (frame.shape[1], frame.shape[0])
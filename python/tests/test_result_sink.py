@@ -0,0 +1,51 @@
+import json
+
+from job_journal import JobJournal
+from result_sink import NdjsonResultSink
+
+
+def _lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_new_job_starts_afresh(tmp_path):
+    path = str(tmp_path / "detection_results.ndjson")
+    with NdjsonResultSink(path) as sink:
+        sink.write({"image": "old.jpg"})
+    with NdjsonResultSink(path) as sink:
+        sink.write({"image": "new.jpg"})
+    assert _lines(path) == [{"image": "new.jpg"}]
+
+
+def test_resumed_job_appends_after_cut_short_line(tmp_path):
+    path = str(tmp_path / "detection_results.ndjson")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"image": "a.jpg"}\n{"image": "b.j')
+    with NdjsonResultSink(path, resume=True) as sink:
+        sink.write({"image": "c.jpg"})
+    with open(path, "r", encoding="utf-8") as f:
+        assert f.read().splitlines()[1:] == ['{"image": "b.j', '{"image":"c.jpg"}']
+
+
+def test_journal_resume(tmp_path):
+    path = str(tmp_path / "journal.ndjson")
+    journal = JobJournal(path)
+    journal.record("image", "a.jpg", {"boxes": []})
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"kind": "image", "key": "b.j')
+
+    journal = JobJournal(path, resume=True)
+    assert list(journal.entries("image")) == ["a.jpg"]
+    journal.record("image", "c.jpg", {"boxes": []})
+    journal.close()
+    journal = JobJournal(path, resume=True)
+    assert list(journal.entries("image")) == ["a.jpg", "c.jpg"]
+    journal.close()
+
+    # Not resuming starts the journal afresh
+    journal = JobJournal(path)
+    assert journal.entries("image") == {}
+    journal.close()
+    assert _lines(path) == []
@@ -0,0 +1,159 @@
+"""
+Cascade head training.
+
+The detection cascade (CASCADE in config/config.py) needs an animal/blank
+head on the small backbone's features, which no released model provides.
+This task distils one from the ViT-H+ binary head (dino_binary_classifier_v3.pt)
+on the detected crops of a finished detection job: each crop is labelled with
+the ViT-H+ head's animal probability, and a LinearClassifier is fitted to
+those soft labels on the small backbone's CLS features of the same crops. A
+tenth of the crops is held out to report agreement and how many animal crops
+the head would reject at CASCADE_ANIMAL_THRESHOLD.
+
+The head is written to models/<HEADS[head][0]> (and its memory-mapped copy,
+if any, is converted again), where load_cascade() picks it up.
+
+Usage:
+    python main.py train_cascade_head <detection_results.ndjson> [max_crops] [epochs] [backbone] [head]
+
+    python main.py train_cascade_head /path/to/json_output/detection_results.ndjson 20000 20 dinov3_vits16 binary_vits16
+"""
+
+import os
+import time
+
+import PIL.Image
+import torch
+import torch.nn.functional as F
+from torchvision import transforms
+
+import model_registry
+import weight_store
+from config.config import CASCADE_ANIMAL_THRESHOLD, CASCADE_BACKBONE, CASCADE_HEAD
+from detection_dino import LinearClassifier, load_classifiers, load_feature_extractor, select_device
+from feature_store import FeatureStore
+from frame_cache import decode_rgb
+from validate_resolution import load_crops
+
+BATCH_SIZE = 16
+TRAIN_BATCH_SIZE = 256
+LEARNING_RATE = 1e-3
+WEIGHT_DECAY = 1e-4
+VALIDATION_FRACTION = 0.1
+
+
+def extract(crops, transform, teacher_extractor, teacher_head, student_extractor, device):
+    """
+    Student features and teacher animal probabilities of the crops.
+
+    Returns:
+        (FeatureStore of student features, [N] tensor of animal probabilities).
+    """
+    features = FeatureStore(len(crops))
+    targets = torch.empty(len(crops))
+    frame_path = frame = None
+    for start in range(0, len(crops), BATCH_SIZE):
+        images = []
+        for filepath, (xmin, ymin, xmax, ymax) in crops[start:start + BATCH_SIZE]:
+            if filepath != frame_path:
+                # Crops of an image are consecutive; decode it once
+                frame_path, frame = filepath, decode_rgb(filepath)
+            images.append(transform(PIL.Image.fromarray(frame[ymin:ymax, xmin:xmax])))
+        batch = torch.stack(images).to(device)
+        with torch.no_grad():
+            logits = teacher_head(teacher_extractor(batch).float())
+            targets[start:start + len(images)] = logits.softmax(dim=1)[:, 1].cpu()
+            features.put_rows(start, student_extractor(batch))
+        print(f"PROCESS: {min(start + BATCH_SIZE, len(crops))}/{len(crops)}", flush=True)
+    return features, targets
+
+
+def fit(features, targets, out_dim, epochs):
+    """LinearClassifier(out_dim, 1, False, 2) fitted to the soft animal/blank labels."""
+    head = LinearClassifier(out_dim, 1, False, 2)
+    optimizer = torch.optim.AdamW(head.parameters(), lr=LEARNING_RATE, weight_decay=WEIGHT_DECAY)
+    soft_labels = torch.stack([1 - targets, targets], dim=1)
+    for epoch in range(epochs):
+        order = torch.randperm(len(targets))
+        total_loss = 0.0
+        for start in range(0, len(order), TRAIN_BATCH_SIZE):
+            rows = order[start:start + TRAIN_BATCH_SIZE]
+            loss = F.cross_entropy(head(features[rows]), soft_labels[rows])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(rows)
+        print(f"TRAIN: epoch {epoch + 1}/{epochs}, loss {total_loss / len(order):.4f}", flush=True)
+    return head.eval()
+
+
+def report(head, features, targets):
+    """Agreement with the teacher, and the animal crops the cascade would reject."""
+    with torch.no_grad():
+        animal = head(features).softmax(dim=1)[:, 1]
+    is_animal = targets >= 0.5
+    agreement = ((animal >= 0.5) == is_animal).float().mean().item()
+    rejected = animal < CASCADE_ANIMAL_THRESHOLD
+    lost = (rejected & is_animal).sum().item()
+    print(f"VALIDATION: {len(targets)} held-out crops, agreement {agreement * 100:.1f}%, "
+          f"{rejected.sum().item()} rejected at {CASCADE_ANIMAL_THRESHOLD}, "
+          f"{lost} of {is_animal.sum().item()} animal crops among them", flush=True)
+
+
+def run(results_path, max_crops=20000, epochs=20, backbone=CASCADE_BACKBONE, head=CASCADE_HEAD):
+    """
+    Fit the cascade head on a detection job's crops and save it to models/.
+
+    Args:
+        results_path: detection_results.ndjson of a finished detection job.
+        max_crops: Crops to use, training and held-out together.
+        epochs: Passes over the training crops.
+        backbone: Small backbone of the cascade (see BACKBONE_WEIGHTS).
+        head: Head to write (see HEADS); its input dim must match the backbone.
+    """
+    print("STATUS: BEGIN", flush=True)
+    crops = load_crops(results_path, int(max_crops))
+    if not crops:
+        print(f"No detected crops found in {results_path}", flush=True)
+        print("STATUS: DONE", flush=True)
+        return
+    weights_file, out_dim, num_classes = model_registry.HEADS[head]
+    if num_classes != 2:
+        raise ValueError(f"Head {head!r} is not an animal/blank head")
+
+    device = select_device()
+    teacher_head, _ = load_classifiers(device)
+    teacher_extractor = load_feature_extractor(device)
+    student_extractor = model_registry.get_feature_extractor(backbone, device, input_size=(224, 224))
+    # The detection crop transform
+    transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Resize((224, 224)),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+
+    start_time = time.time()
+    store, targets = extract(crops, transform, teacher_extractor, teacher_head, student_extractor, device)
+    if store.dim != out_dim:
+        store.close()
+        raise ValueError(f"{backbone} features have {store.dim} dims, head {head!r} expects {out_dim}")
+    print(f"Extracted {len(crops)} crops in {time.time() - start_time:.2f} seconds, "
+          f"{(targets >= 0.5).sum().item()} labelled animal", flush=True)
+
+    # Crops of an image are consecutive; hold out the last images whole.
+    features = store.tensor().clone()
+    store.close()
+    split = len(crops) - int(len(crops) * VALIDATION_FRACTION)
+    while 0 < split < len(crops) and crops[split][0] == crops[split - 1][0]:
+        split += 1
+    classifier = fit(features[:split], targets[:split], out_dim, int(epochs))
+    if split < len(crops):
+        report(classifier, features[split:], targets[split:])
+
+    weights_path = os.path.join(model_registry.MODELS_DIR, weights_file)
+    torch.save(classifier.state_dict(), weights_path)
+    print(f"Saved {head} head to {weights_path}", flush=True)
+    if os.path.exists(weight_store.mmap_paths(weights_path)[0]):
+        # Same size as before, so the old conversion would not look stale.
+        weight_store.convert(weights_path)
+    print("STATUS: DONE", flush=True)
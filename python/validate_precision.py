@@ -0,0 +1,99 @@
+"""
+Reduced-precision validation.
+
+Runs species classification and ReID embedding on whole images from a local
+folder at fp32 and at a reduced precision, and reports species top-1
+agreement, ReID embedding cosine similarity and the speedup, so each
+deployment can decide whether the faster precision is accurate enough.
+
+Usage:
+    python main.py validate_precision <image_dir> [precision] [max_images]
+
+    python main.py validate_precision /path/to/images int8 200
+"""
+
+import os
+import time
+
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torchvision import transforms
+
+import model_registry
+from reid_v2 import load_and_crop_image
+
+
+def list_images(image_dir: str, max_images: int):
+    image_paths = []
+    for root, _, files in os.walk(image_dir):
+        for filename in sorted(files):
+            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                image_paths.append(os.path.join(root, filename))
+    return sorted(image_paths)[:max_images]
+
+
+def evaluate(image_paths, precision):
+    """
+    Species top-1 and ReID embeddings for whole images at the given precision.
+
+    Returns:
+        Tuple of (species predictions, ReID embeddings [N, D], seconds spent).
+    """
+    device = torch.device("cpu")
+    feature_extractor = model_registry.get_feature_extractor('dinov3_vith16plus', device, precision=precision)
+    species_classifier = model_registry.get_head('species', device, precision=precision)
+    reid_model = model_registry.get_adapter('stoat_day_night', device, precision=precision)
+    img_transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Resize((224, 224)),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+
+    predictions = []
+    embeddings = []
+    start_time = time.time()
+    with torch.no_grad():
+        for i, image_path in enumerate(image_paths):
+            image = Image.open(image_path).convert("RGB")
+            features = feature_extractor(img_transform(image).unsqueeze(0)).float()
+            predictions.append(int(species_classifier(features).argmax(dim=1).item()))
+
+            reid_image, is_day = load_and_crop_image(image_path, [0, 0, image.width, image.height])
+            embeddings.append(reid_model(reid_image, [is_day]).float()[0])
+            print(f"PROCESS: {i + 1}/{len(image_paths)}", flush=True)
+    return predictions, torch.stack(embeddings), time.time() - start_time
+
+
+def run(image_dir, precision='int8', max_images=100):
+    """
+    Compare a reduced precision against fp32 on a folder of images.
+
+    Each whole image is classified and embedded with both precisions; the
+    report gives species top-1 agreement, ReID embedding cosine similarity
+    and the speedup, to decide whether the precision is good enough for a
+    deployment.
+    """
+    print("STATUS: BEGIN", flush=True)
+    image_paths = list_images(image_dir, int(max_images))
+    if not image_paths:
+        print(f"No images found in {image_dir}", flush=True)
+        print("STATUS: DONE", flush=True)
+        return
+
+    print(f"Evaluating fp32 on {len(image_paths)} images...", flush=True)
+    reference_predictions, reference_embeddings, reference_seconds = evaluate(image_paths, 'fp32')
+    # Keep only one backbone resident at a time.
+    model_registry.evict('backbone')
+
+    print(f"Evaluating {precision} on {len(image_paths)} images...", flush=True)
+    predictions, embeddings, seconds = evaluate(image_paths, precision)
+
+    agreement = sum(a == b for a, b in zip(reference_predictions, predictions)) / len(image_paths)
+    cosine = F.cosine_similarity(reference_embeddings, embeddings, dim=1)
+    print(f"VALIDATION: species top-1 agreement {agreement * 100:.1f}%", flush=True)
+    print(f"VALIDATION: ReID cosine similarity mean {cosine.mean().item():.4f}, "
+          f"min {cosine.min().item():.4f}", flush=True)
+    print(f"VALIDATION: fp32 {reference_seconds:.2f} seconds, {precision} {seconds:.2f} seconds "
+          f"({reference_seconds / seconds:.2f}x)", flush=True)
+    print("STATUS: DONE", flush=True)
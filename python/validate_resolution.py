@@ -0,0 +1,125 @@
+"""
+Adaptive resolution validation.
+
+Classifies the detected crops of a finished detection job both at 224x224
+and at their resolution bucket (see resolution_bucket() in detection_dino.py)
+and reports, per bucket, how often the two agree (blank or the same species)
+and the speedup, so RESOLUTION_BUCKETS is only turned on where it is safe.
+
+Usage:
+    python main.py validate_resolution <detection_results.ndjson> [buckets] [max_crops]
+
+    python main.py validate_resolution /path/to/json_output/detection_results.ndjson 112,160,224 2000
+"""
+
+import json
+import time
+
+import PIL.Image
+import torch
+from torchvision import transforms
+
+from detection_dino import (bucket_transforms, fuse_classifiers, load_classifiers, load_feature_extractor,
+                            resolution_bucket, select_device)
+from frame_cache import decode_rgb
+
+BATCH_SIZE = 16
+REFERENCE_SIZE = 224
+
+
+def load_crops(results_path: str, max_crops: int):
+    """
+    (filepath, pixel bbox) of the detected boxes in an NDJSON results file;
+    the last line of an image wins, and burst duplicates (copies of their
+    representative's boxes) are left out.
+    """
+    boxes = {}
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("duplicate_of"):
+                continue
+            boxes[record["filepath"]] = [box["bbox"] for box in record["boxes"] if len(box.get("bbox") or []) == 4]
+    crops = [(filepath, bbox) for filepath, bboxes in boxes.items() for bbox in bboxes]
+    return crops[:max_crops]
+
+
+def labels(classifier, features):
+    """-1 for blank crops, else the species index."""
+    logits = classifier(features)
+    is_animal = logits[:, :classifier.num_binary].argmax(dim=1) == 1
+    species = logits[:, classifier.num_binary:].argmax(dim=1)
+    return torch.where(is_animal, species, torch.full_like(species, -1)).tolist()
+
+
+def evaluate(crops, transform, feature_extractor, classifier, device):
+    """Labels of the crops at one input size, and the seconds spent in the model."""
+    predictions = []
+    seconds = 0.0
+    for start in range(0, len(crops), BATCH_SIZE):
+        batch = torch.stack([transform(crop) for crop in crops[start:start + BATCH_SIZE]]).to(device)
+        start_time = time.time()
+        with torch.no_grad():
+            predictions.extend(labels(classifier, feature_extractor(batch).float()))
+        seconds += time.time() - start_time
+    return predictions, seconds
+
+
+def run(results_path, buckets='112,160,224', max_crops=1000):
+    """
+    Compare bucketed crop resolution against 224x224 on a detection job's crops.
+
+    For each bucket below 224 the report gives the number of crops assigned
+    to it, their label agreement with 224x224 and the model time at both
+    sizes.
+    """
+    print("STATUS: BEGIN", flush=True)
+    buckets = tuple(sorted(int(bucket) for bucket in str(buckets).split(',')))
+    crops = load_crops(results_path, int(max_crops))
+    if not crops:
+        print(f"No detected crops found in {results_path}", flush=True)
+        print("STATUS: DONE", flush=True)
+        return
+
+    device = select_device()
+    feature_extractor = load_feature_extractor(device)
+    classifier = fuse_classifiers(*load_classifiers(device))
+    # The detection crop transform; only the Resize differs per size
+    img_transform = bucket_transforms(transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Resize((REFERENCE_SIZE, REFERENCE_SIZE)),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ]), buckets + (REFERENCE_SIZE,))
+
+    # Group the crops by bucket; crops that stay at 224 are trivially identical.
+    by_bucket = {bucket: [] for bucket in buckets if bucket < REFERENCE_SIZE}
+    kept = 0
+    frame_path = frame = None
+    for i, (filepath, bbox) in enumerate(crops):
+        bucket = resolution_bucket(bbox, buckets)
+        if bucket in by_bucket:
+            xmin, ymin, xmax, ymax = bbox
+            if filepath != frame_path:
+                # Crops of an image are consecutive; decode it once
+                frame_path, frame = filepath, decode_rgb(filepath)
+            by_bucket[bucket].append(PIL.Image.fromarray(frame[ymin:ymax, xmin:xmax]))
+        else:
+            kept += 1
+        print(f"PROCESS: {i + 1}/{len(crops)}", flush=True)
+
+    print(f"VALIDATION: {kept} of {len(crops)} crops stay at {REFERENCE_SIZE}x{REFERENCE_SIZE}", flush=True)
+    for bucket, bucket_crops in by_bucket.items():
+        if not bucket_crops:
+            print(f"VALIDATION: bucket {bucket}: no crops", flush=True)
+            continue
+        reference, reference_seconds = evaluate(bucket_crops, img_transform[REFERENCE_SIZE], feature_extractor,
+                                                classifier, device)
+        predictions, seconds = evaluate(bucket_crops, img_transform[bucket], feature_extractor, classifier, device)
+        agreement = sum(a == b for a, b in zip(reference, predictions)) / len(bucket_crops)
+        print(f"VALIDATION: bucket {bucket}: {len(bucket_crops)} crops, agreement {agreement * 100:.1f}%, "
+              f"{REFERENCE_SIZE}x{REFERENCE_SIZE} {reference_seconds:.2f} seconds, {bucket}x{bucket} "
+              f"{seconds:.2f} seconds ({reference_seconds / max(seconds, 1e-9):.2f}x)", flush=True)
+    print("STATUS: DONE", flush=True)
@@ -0,0 +1,174 @@
+"""
+Memory-mapped weight files.
+
+`torch.load` on the DINOv3 `.pth` reads, unpickles and copies gigabytes into
+freshly allocated tensors, in every process. This module converts state dicts
+once into a raw file of 64-byte aligned tensors plus a JSON index:
+
+    models/mmap/<weights file>.weights       raw tensor bytes
+    models/mmap/<weights file>.weights.json  {"tensors": {key: {dtype, shape, offset, nbytes}}, "source": {...}}
+
+Loading maps the file copy-on-write and wraps each tensor around the mapping
+without copying, so weights are paged in lazily on first use and concurrent
+processes share the same page-cache pages.
+
+Usage:
+    python main.py convert_weights
+"""
+
+import json
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+
+ALIGNMENT = 64
+FORMAT_VERSION = 1
+MMAP_DIR_NAME = "mmap"
+
+
+def mmap_paths(weights_path: str):
+    """(data file, index file) of the converted copy of weights_path."""
+    base = os.path.join(os.path.dirname(weights_path), MMAP_DIR_NAME, os.path.basename(weights_path) + ".weights")
+    return base, base + ".json"
+
+
+def save_state_dict(state_dict: Dict[str, torch.Tensor], data_path: str, source_path: Optional[str] = None):
+    """
+    Write a state dict as an aligned raw tensor file plus a JSON index.
+
+    Args:
+        state_dict: Mapping of name -> tensor.
+        data_path: Output data file; the index is written to data_path + ".json".
+        source_path: Optional original weights file, recorded to detect stale conversions.
+    """
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    tensors = {}
+    offset = 0
+    tmp_path = data_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for key, tensor in state_dict.items():
+            if not isinstance(tensor, torch.Tensor):
+                print(f"Skipping non-tensor entry '{key}'", flush=True)
+                continue
+            tensor = tensor.detach().cpu().contiguous()
+            dtype = str(tensor.dtype).replace("torch.", "")
+            if tensor.dtype == torch.bfloat16:
+                # numpy has no bfloat16; store the raw 16-bit patterns.
+                array = tensor.view(torch.int16).numpy()
+            else:
+                array = tensor.numpy()
+
+            padding = -offset % ALIGNMENT
+            f.write(b"\0" * padding)
+            offset += padding
+
+            f.write(array.tobytes())
+            tensors[key] = {
+                "dtype": dtype,
+                "shape": list(tensor.shape),
+                "offset": offset,
+                "nbytes": array.nbytes,
+            }
+            offset += array.nbytes
+
+    index = {"format": FORMAT_VERSION, "tensors": tensors}
+    if source_path:
+        index["source"] = {"file": os.path.basename(source_path), "size": os.path.getsize(source_path)}
+    with open(data_path + ".json.tmp", "w") as f:
+        json.dump(index, f)
+    # Data first, index last: an index only ever points at a complete data file.
+    os.replace(tmp_path, data_path)
+    os.replace(data_path + ".json.tmp", data_path + ".json")
+
+
+def load_state_dict(data_path: str) -> Dict[str, torch.Tensor]:
+    """
+    Map a converted weights file and return tensors backed by the mapping.
+
+    The mapping is copy-on-write: pages are shared with the page cache (and
+    other processes) until a tensor is written to, which inference never does.
+    """
+    with open(data_path + ".json", "r") as f:
+        index = json.load(f)
+    if index.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported weights format {index.get('format')} in {data_path}")
+
+    buffer = np.memmap(data_path, dtype=np.uint8, mode="c")
+    state_dict = {}
+    for key, entry in index["tensors"].items():
+        dtype = entry["dtype"]
+        np_dtype = np.int16 if dtype == "bfloat16" else np.dtype(dtype)
+        array = buffer[entry["offset"]:entry["offset"] + entry["nbytes"]].view(np_dtype)
+        tensor = torch.from_numpy(array).reshape(entry["shape"])
+        if dtype == "bfloat16":
+            tensor = tensor.view(torch.bfloat16)
+        state_dict[key] = tensor
+    return state_dict
+
+
+def find_converted(weights_path: str) -> Optional[str]:
+    """
+    Path of an up to date converted copy of weights_path, or None.
+
+    A conversion is stale when the original file's size no longer matches
+    the one recorded at conversion time.
+    """
+    data_path, index_path = mmap_paths(weights_path)
+    if not (os.path.exists(data_path) and os.path.exists(index_path)):
+        return None
+    try:
+        with open(index_path, "r") as f:
+            source = json.load(f).get("source")
+        if source and os.path.exists(weights_path) and source["size"] != os.path.getsize(weights_path):
+            print(f"Ignoring stale converted weights {data_path}", flush=True)
+            return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable converted weights {data_path}: {e}", flush=True)
+        return None
+    return data_path
+
+
+def load_weights(weights_path: str, map_location="cpu") -> Dict[str, torch.Tensor]:
+    """
+    Load a state dict, from its memory-mapped conversion when one exists.
+
+    Falls back to torch.load on the original file otherwise.
+    """
+    converted = find_converted(weights_path)
+    if converted:
+        return load_state_dict(converted)
+    return torch.load(weights_path, map_location=map_location)
+
+
+def convert(weights_path: str):
+    """Convert a single .pth/.pt state dict file."""
+    data_path, _ = mmap_paths(weights_path)
+    start_time = time.time()
+    state_dict = torch.load(weights_path, map_location="cpu")
+    save_state_dict(state_dict, data_path, source_path=weights_path)
+    print(f"Converted {os.path.basename(weights_path)} -> {data_path} "
+          f"({os.path.getsize(data_path) / 2**20:.0f} MiB) in {time.time() - start_time:.2f} seconds", flush=True)
+
+
+def run():
+    """Convert every registry model (backbones, heads, adapters) found in models/."""
+    import model_registry
+
+    print("STATUS: BEGIN", flush=True)
+    weights_files = (
+        list(model_registry.BACKBONE_WEIGHTS.values())
+        + [weights_file for weights_file, _, _ in model_registry.HEADS.values()]
+        + [weights_file for _, weights_file in model_registry.ADAPTERS.values()]
+    )
+    total = len(weights_files)
+    for i, weights_file in enumerate(weights_files):
+        weights_path = os.path.join(model_registry.MODELS_DIR, weights_file)
+        if not os.path.exists(weights_path):
+            print(f"Skipping missing weights file {weights_path}", flush=True)
+        else:
+            convert(weights_path)
+        print(f"PROCESS: {i + 1}/{total}", flush=True)
+    print("STATUS: DONE", flush=True)